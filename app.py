@@ -1,556 +1,962 @@
-import openpyxl
-from apscheduler.schedulers.background import BackgroundScheduler
-import os
-import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from switch_driver import H3CManager
-import database as db
-import traceback
-
-app = Flask(__name__)
-app.secret_key = 'super_secret_key_for_h3c_admin_tool_2026'
-
-# 🚫 关键端口保护关键词 (不区分大小写)
-# 只要端口描述包含这些词，系统将拒绝修改
-PROTECTED_KEYWORDS = ['Uplink', 'Trunk', 'Core', 'Connect', 'To', 'hexin', 'huiju', 'link']
-
-# 备份文件存放目录
-BACKUP_ROOT = 'backups'
-if not os.path.exists(BACKUP_ROOT):
-    os.makedirs(BACKUP_ROOT)
-
-# === 登录管理器配置 ===
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login' 
-
-class User(UserMixin):
-    def __init__(self, id, username):
-        self.id = id
-        self.username = username
-
-@login_manager.user_loader
-def load_user(user_id):
-    user_data = db.get_user_by_id(user_id)
-    if user_data:
-        return User(id=user_data['id'], username=user_data['username'])
-    return None
-
-# === 辅助函数 ===
-def get_manager(data):
-    port = int(data.get('port', 22)) 
-    return H3CManager(data['ip'], data['user'], data['pass'], port)
-
-# === 页面路由 ===
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-        user_data = db.verify_user(username, password)
-        if user_data:
-            user = User(id=user_data['id'], username=user_data['username'])
-            login_user(user)
-            return redirect(url_for('index'))
-        else:
-            return render_template('login.html', error="❌ 用户名或密码错误")
-    return render_template('login.html')
-
-@app.route('/logout')
-@login_required
-def logout():
-    logout_user()
-    return redirect(url_for('login'))
-
-@app.route('/')
-@login_required 
-def index():
-    return render_template('index.html', username=current_user.username)
-
-# === 资产管理 API ===
-
-@app.route('/api/switches', methods=['GET'])
-@login_required
-def list_switches():
-    switches = db.get_all_switches()
-    return jsonify({'status': 'success', 'data': switches})
-
-# === 📡 资产管理：单台添加设备 (带重复IP校验) ===
-@app.route('/api/switches/add', methods=['POST'])
-@login_required
-def api_add_switch():
-    try:
-        data = request.json
-        # 🛡️ 校验重复 IP
-        existing = db.get_all_switches()
-        if any(s['ip'] == data['ip'] for s in existing):
-            return jsonify({'status': 'error', 'msg': f"添加失败：IP 地址 {data['ip']} 已存在，请勿重复录入！"})
-        
-        vendor = data.get('vendor', 'h3c').lower()
-        db.add_switch(data['name'], data['ip'], data['port'], data['user'], data['pass'], vendor)
-        return jsonify({'status': 'success'})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-# === 📂 资产管理：Excel 批量导入设备接口 (带重复IP跳过机制) ===
-@app.route('/api/switches/batch_import', methods=['POST'])
-@login_required
-def batch_import_switches():
-    if 'file' not in request.files:
-        return jsonify({'status': 'error', 'msg': '未找到文件'})
-    file = request.files['file']
-    
-    try:
-        import openpyxl
-        wb = openpyxl.load_workbook(file, data_only=True)
-        sheet = wb.active
-        headers = [str(cell.value).strip() if cell.value is not None else "" for cell in sheet[1]]
-        
-        required_cols = ['设备名称', 'IP地址', '端口', '用户名', '密码', '厂商']
-        col_indices = {}
-        for req in required_cols:
-            if req in headers:
-                col_indices[req] = headers.index(req)
-            else:
-                return jsonify({'status': 'error', 'msg': f"资产表格缺少必填列头：【{req}】"})
-
-        # 🛡️ 获取当前数据库里所有的 IP 集合，用于排重
-        existing_switches = db.get_all_switches()
-        existing_ips = {s['ip'] for s in existing_switches}
-
-        success_count = 0
-        skip_count = 0 # 记录跳过的重复设备数
-
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            ip = row[col_indices['IP地址']]
-            if not ip: continue
-            ip = str(ip).strip()
-            
-            # 🛡️ 如果 IP 已经存在，直接跳过这一行，不报错打断进程
-            if ip in existing_ips:
-                skip_count += 1
-                continue
-
-            name = str(row[col_indices['设备名称']] or f"Switch_{ip}").strip()
-            port = int(row[col_indices['端口']] or 22)
-            user = str(row[col_indices['用户名']]).strip()
-            pwd = str(row[col_indices['密码']]).strip()
-            vendor = str(row[col_indices['厂商']] or 'h3c').strip().lower()
-
-            db.add_switch(name, ip, port, user, pwd, vendor)
-            
-            # 🛡️ 将新加入的 IP 录入集合，防止 Excel 内部有两行一模一样的重复 IP
-            existing_ips.add(ip) 
-            success_count += 1
-            
-        msg = f"成功导入 {success_count} 台设备！"
-        if skip_count > 0:
-            msg += f" (自动拦截并跳过了 {skip_count} 条重复的 IP)"
-            
-        return jsonify({'status': 'success', 'msg': msg})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': f"导入失败: {str(e)}"})
-
-@app.route('/api/switches/delete', methods=['POST'])
-@login_required
-def del_switch_api():
-    try:
-        db.delete_switch(request.json['id'])
-        return jsonify({'status': 'success'})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/api/change_password', methods=['POST'])
-@login_required
-def change_pass_api():
-    try:
-        new_pass = request.json.get('new_password')
-        if not new_pass: return jsonify({'status': 'error', 'msg': '密码不能为空'})
-        db.change_password(current_user.username, new_pass)
-        return jsonify({'status': 'success'})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-# ===开放数据接口提供给前端网页调用===
-@app.route('/api/audit_logs', methods=['GET'])
-@login_required
-def api_audit_logs():
-    try:
-        # 默认拉取最新的 100 条记录
-        logs = db.get_audit_logs(limit=100)
-        return jsonify({'status': 'success', 'data': logs})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-# 开放api接口给数据库做前面板数据
-@app.route('/api/dashboard_stats', methods=['GET'])
-@login_required
-def api_dashboard_stats():
-    try:
-        stats = db.get_dashboard_stats()
-        return jsonify({'status': 'success', 'data': stats})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-# === 批量备份功能 ===
-@app.route('/batch_backup', methods=['POST'])
-@login_required
-def batch_backup():
-    # 1. 获取所有设备
-    switches = db.get_all_switches()
-    if not switches:
-        return jsonify({'status': 'error', 'msg': '数据库中没有设备，请先添加！'})
-
-    # 2. 创建当天的备份文件夹
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    today_dir = os.path.join(BACKUP_ROOT, today)
-    if not os.path.exists(today_dir):
-        os.makedirs(today_dir)
-
-    log_messages = [f"🚀 开始执行批量备份，共 {len(switches)} 台设备..."]
-    success_count = 0
-    fail_count = 0
-
-    # 3. 循环备份
-    for sw in switches:
-        # 为了防止文件名非法，清理一下名称
-        safe_name = sw['name'].replace('/', '_').replace('\\', '_').replace(' ', '_')
-        target_ip = sw['ip']
-        
-        log_messages.append(f"🔄 正在连接: {sw['name']} ({target_ip})...")
-        
-        try:
-            # 连接设备
-            mgr = H3CManager(target_ip, sw['username'], sw['password'], sw['port'])
-            # 抓取配置
-            config_text = mgr.get_full_config()
-            
-            # 保存文件: backups/2026-02-12/核心交换机_192.168.1.1.cfg
-            filename = f"{safe_name}_{target_ip}.cfg"
-            filepath = os.path.join(today_dir, filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(config_text)
-                
-            success_count += 1
-            log_messages.append(f"<span class='status-permit'>✅ 备份成功</span>: 已保存至 {filename}")
-            
-        except Exception as e:
-            fail_count += 1
-            error_msg = str(e)
-            if "Authentication failed" in error_msg: error_msg = "认证失败(密码错误)"
-            elif "timed out" in error_msg: error_msg = "连接超时"
-            log_messages.append(f"<span class='status-deny'>❌ 备份失败</span>: {error_msg}")
-
-    # 4. 总结
-    final_msg = f"<br>🏁 <b>任务结束</b><br>成功: {success_count} 台<br>失败: {fail_count} 台<br>📁 文件保存在: {today_dir}"
-    full_log = "<br>".join(log_messages) + final_msg
-    
-    return jsonify({'status': 'success', 'log': full_log})
-
-# === 业务路由 ===
-
-@app.route('/test_connection', methods=['POST'])
-@login_required
-def test_connection():
-    try:
-        mgr = get_manager(request.json)
-        info = mgr.get_device_info()
-        return jsonify({'status': 'success', 'log': info.replace('\n', '<br>')})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/get_interfaces', methods=['POST'])
-@login_required
-def get_interfaces():
-    try:
-        mgr = get_manager(request.json)
-        interfaces = mgr.get_interface_list()
-        return jsonify({'status': 'success', 'data': interfaces})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/get_port_info', methods=['POST'])
-@login_required
-def get_port_info():
-    try:
-        mgr = get_manager(request.json)
-        info, raw = mgr.get_port_info(request.json['interface'])
-        return jsonify({'status': 'success', 'data': info, 'log': f"读取成功。<br>RAW:<br>{raw.replace(chr(10), '<br>')}"})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-# === 升级版：绑定接口 (带审计日志) ===
-@app.route('/bind_port', methods=['POST'])
-@login_required
-def bind_port():
-    d = request.json
-    client_ip = request.remote_addr
-    device_ip = d.get('ip', 'Unknown')
-    mode = d.get('mode', 'access')
-    details = f"端口:{d.get('interface')} | IP:{d.get('bind_ip')} | MAC:{d.get('mac')} | 模式:{mode} | VLAN:{d.get('vlan')}"
-
-    try:
-        mgr = get_manager(d)
-        
-        info, _ = mgr.get_port_info(d['interface'])
-        desc = info.get('description', '')
-        for kw in PROTECTED_KEYWORDS:
-            if kw.lower() in desc.lower():
-                # 记录越权操作失败
-                db.log_operation(current_user.username, client_ip, device_ip, "端口绑定", f"{details} | 触发保护端口拦截", "失败")
-                return jsonify({'status': 'error', 'msg': f"⛔ 拒绝操作！<br>该端口描述包含保护关键词 '{kw}'。"})
-        
-        log = mgr.configure_port_binding(d['interface'], d['vlan'], d['bind_ip'], d['mac'], mode)
-        
-        # 🔥 记录成功日志
-        db.log_operation(current_user.username, client_ip, device_ip, "端口绑定", details, "成功")
-        return jsonify({'status': 'success', 'log': log.replace('\n', '<br>')})
-    except Exception as e:
-        # 🔥 记录失败日志
-        db.log_operation(current_user.username, client_ip, device_ip, "端口绑定", f"{details} | 报错: {str(e)}", "失败")
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-# === 升级版：解绑接口 (带审计日志) ===
-@app.route('/del_port_binding', methods=['POST'])
-@login_required
-def del_port_binding():
-    d = request.json
-    client_ip = request.remote_addr
-    device_ip = d.get('ip', 'Unknown')
-    mode = d.get('mode', 'access')
-    vlan = d.get('vlan', '')
-    details = f"端口:{d.get('interface')} | IP:{d.get('del_ip')} | MAC:{d.get('del_mac')} | 模式:{mode} | VLAN:{vlan}"
-
-    try:
-        mgr = get_manager(d)
-
-        info, _ = mgr.get_port_info(d['interface'])
-        desc = info.get('description', '')
-        for kw in PROTECTED_KEYWORDS:
-            if kw.lower() in desc.lower():
-                db.log_operation(current_user.username, client_ip, device_ip, "解除绑定", f"{details} | 触发保护端口拦截", "失败")
-                return jsonify({'status': 'error', 'msg': f"⛔ 拒绝操作！<br>该端口描述包含保护关键词 '{kw}'。"})
-
-        log = mgr.delete_port_binding(d['interface'], d['del_ip'], d['del_mac'], mode, vlan)
-        
-        # 🔥 记录成功日志
-        db.log_operation(current_user.username, client_ip, device_ip, "解除绑定", details, "成功")
-        return jsonify({'status': 'success', 'log': log.replace('\n', '<br>')})
-    except Exception as e:
-        # 🔥 记录失败日志
-        db.log_operation(current_user.username, client_ip, device_ip, "解除绑定", f"{details} | 报错: {str(e)}", "失败")
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/get_acl', methods=['POST'])
-@login_required
-def get_acl():
-    try:
-        mgr = get_manager(request.json)
-        rules = mgr.get_acl_rules()
-        return jsonify({'status': 'success', 'data': rules})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/add_acl', methods=['POST'])
-@login_required
-def add_acl():
-    try:
-        d = request.json
-        mgr = get_manager(d)
-        rid = d.get('rule_id')
-        if rid == "": rid = None
-        log = mgr.add_acl_mac(d['mac'], rid)
-        return jsonify({'status': 'success', 'log': log.replace('\n', '<br>')})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/del_acl', methods=['POST'])
-@login_required
-def del_acl():
-    try:
-        d = request.json
-        mgr = get_manager(d)
-        log = mgr.delete_acl_rule(d['rule_id'])
-        return jsonify({'status': 'success', 'log': log.replace('\n', '<br>')})
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/save_config', methods=['POST'])
-@login_required
-def save_config():
-    client_ip = request.remote_addr
-    device_ip = request.json.get('ip', 'Unknown')
-    try:
-        mgr = get_manager(request.json)
-        log = mgr.save_config_to_device()
-        
-        db.log_operation(current_user.username, client_ip, device_ip, "保存配置", "执行 save force", "成功")
-        return jsonify({'status': 'success', 'log': log.replace('\n', '<br>')})
-    except Exception as e:
-        db.log_operation(current_user.username, client_ip, device_ip, "保存配置", f"报错: {str(e)}", "失败")
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-
-# === 📊 Excel 批量导入解析接口 ===
-@app.route('/api/parse_excel', methods=['POST'])
-@login_required
-def parse_excel():
-    if 'file' not in request.files:
-        return jsonify({'status': 'error', 'msg': '未找到上传的文件'})
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'status': 'error', 'msg': '文件名为空'})
-
-    try:
-        # 读取 Excel (data_only=True 确保读取的是值而不是公式)
-        wb = openpyxl.load_workbook(file, data_only=True)
-        sheet = wb.active
-        
-        # 1. 获取表头并校验
-        headers = [str(cell.value).strip() if cell.value else "" for cell in sheet[1]]
-        required_cols = ['交换机IP', '端口', 'VLAN', '绑定IP', '绑定MAC', '模式']
-        
-        col_indices = {}
-        for req in required_cols:
-            if req in headers:
-                col_indices[req] = headers.index(req)
-            else:
-                return jsonify({'status': 'error', 'msg': f"Excel 缺少必填的列头：【{req}】"})
-
-        # 2. 逐行提取数据
-        data = []
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            switch_ip = row[col_indices['交换机IP']]
-            if not switch_ip: continue # 如果交换机IP为空，视为结束或空行，直接跳过
-            
-            data.append({
-                'switch_ip': str(switch_ip).strip(),
-                'interface': str(row[col_indices['端口']]).strip(),
-                'vlan': str(row[col_indices['VLAN']]).strip(),
-                'bind_ip': str(row[col_indices['绑定IP']]).strip(),
-                'mac': str(row[col_indices['绑定MAC']]).strip(),
-                'mode': str(row[col_indices['模式']]).strip().lower()
-            })
-            
-        return jsonify({'status': 'success', 'data': data})
-        
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': f"读取 Excel 异常: {str(e)}"})
-
-# === 📊 Excel 批量自动化引擎专用接口 ===
-@app.route('/api/execute_excel_row', methods=['POST'])
-@login_required
-def execute_excel_row():
-    try:
-        d = request.json
-        client_ip = request.remote_addr
-        switch_ip = d.get('switch_ip')
-        interface = d.get('interface')
-        vlan = d.get('vlan')
-        bind_ip = d.get('bind_ip')
-        mac = d.get('mac')
-        mode = d.get('mode', 'access')
-
-        # 1. 自动从数据库获取该交换机的账号密码 (免去手动输入)
-        switches = db.get_all_switches()
-        target_sw = next((s for s in switches if s['ip'] == switch_ip), None)
-        if not target_sw:
-            return jsonify({'status': 'error', 'msg': f"资产管理库未登记该IP({switch_ip})，无法获取密码"})
-
-        # 2. 组装连接参数
-        d['ip'] = switch_ip
-        d['user'] = target_sw['username']
-        d['pass'] = target_sw['password']
-        d['port'] = target_sw['port']
-
-        mgr = get_manager(d)
-
-        # 3. 执行前安全拦截：保护核心上联口
-        info, _ = mgr.get_port_info(interface)
-        desc = info.get('description', '')
-        for kw in PROTECTED_KEYWORDS:
-            if kw.lower() in desc.lower():
-                details = f"[Excel批量] 端口:{interface} | IP:{bind_ip} | MAC:{mac} | 模式:{mode}"
-                db.log_operation(current_user.username, client_ip, switch_ip, "批量端口绑定", f"{details} | 触发保护端口拦截", "失败")
-                return jsonify({'status': 'error', 'msg': f"触发保护端口拦截({kw})"})
-
-# 4. 执行底层下发指令，并捕获回显
-        raw_log = mgr.configure_port_binding(interface, vlan, bind_ip, mac, mode)
-
-        # 💡 核心修复：安全处理底层函数的奇葩返回值，防止 jsonify 崩溃
-        if isinstance(raw_log, bytes):
-            log_output = raw_log.decode('utf-8', errors='ignore')
-        elif raw_log is None:
-            log_output = "> [System] 配置指令已成功发送 (底层函数未返回详细回显)"
-        else:
-            log_output = str(raw_log)
-            
-        # 🛡️ 过滤危险字符：防止交换机的 <H3C> 提示符被网页当成 HTML 标签隐藏掉
-        log_output = log_output.replace('<', '&lt;').replace('>', '&gt;')
-
-        # 5. 记录成功的审计日志
-        details = f"[Excel批量] 端口:{interface} | IP:{bind_ip} | MAC:{mac} | 模式:{mode} | VLAN:{vlan}"
-        db.log_operation(current_user.username, client_ip, switch_ip, "批量端口绑定", details, "成功")
-
-        return jsonify({'status': 'success', 'log': log_output})        
-    except Exception as e:
-        # 记录失败日志
-        details = f"[Excel批量] 端口:{interface} | IP:{bind_ip} | MAC:{mac}"
-        db.log_operation(current_user.username, client_ip, switch_ip, "批量端口绑定", f"{details} | 报错: {str(e)}", "失败")
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-# === ⏰ 凌晨幽灵：定时自动备份任务 ===
-def auto_backup_task():
-    print(f"\n🌙 [{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [系统调度] 开始执行凌晨自动备份...")
-    switches = db.get_all_switches()
-    if not switches:
-        print("🌙 [系统调度] 数据库中没有设备，跳过备份。")
-        return
-
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    today_dir = os.path.join(BACKUP_ROOT, today)
-    if not os.path.exists(today_dir):
-        os.makedirs(today_dir)
-
-    success_count = 0
-    fail_count = 0
-
-    for sw in switches:
-        safe_name = sw['name'].replace('/', '_').replace('\\', '_').replace(' ', '_')
-        target_ip = sw['ip']
-        try:
-            mgr = H3CManager(target_ip, sw['username'], sw['password'], sw['port'])
-            config_text = mgr.get_full_config()
-            filename = f"{safe_name}_{target_ip}.cfg"
-            filepath = os.path.join(today_dir, filename)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(config_text)
-            success_count += 1
-            print(f"  ✅ {target_ip} 备份成功")
-        except Exception as e:
-            fail_count += 1
-            print(f"  ❌ {target_ip} 备份失败: {e}")
-
-    # 🔥 核心联动：记录到我们刚写好的审计日志中！(操作人写死为 System)
-    details = f"任务结束。共 {len(switches)} 台。成功: {success_count}, 失败: {fail_count}。路径: {today_dir}"
-    status = "成功" if fail_count == 0 else ("部分失败" if success_count > 0 else "全部失败")
-    db.log_operation("System(系统)", "Localhost", "ALL_SWITCHES", "定时自动备份", details, status)
-    print(f"🌙 [系统调度] 备份任务执行完毕！{details}\n")
-
-
-# 🚀 初始化并启动后台调度器
-scheduler = BackgroundScheduler(timezone="Asia/Shanghai") # 强制指定中国时区，防止服务器时间乱套
-
-# 设定每天凌晨 2:00 准时执行备份任务
-scheduler.add_job(func=auto_backup_task, trigger="cron", hour=2, minute=00)
-
-scheduler.start()
-# ============================================
-
-
-
-if __name__ == '__main__':
+import openpyxl
+from apscheduler.schedulers.background import BackgroundScheduler
+import os
+import datetime
+import json
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response
+from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from switch_driver import H3CManager, ProtectedPortError, locate_cached_bindings
+from device_scheduler import SCHEDULER, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from comware_parser import short_iface_name, format_mac
+from ssh_pool import POOL
+from device_cache import DEVICE_CACHE, READ_FLIGHTS
+from backup_engine import run_fleet_backup, BACKUP_MAX_WORKERS, safe_device_name
+from backup_store import load_config
+from config_diff import diff_device, build_change_report
+from locator_engine import run_fleet_harvest, LOCATOR_MAX_WORKERS, LOCATOR_HARVEST_MINUTES
+from async_driver import FLEET_BACKEND, fleet_workers
+from health_poller import poll_fleet, HEALTH_POLL_SECONDS, HEALTH_MAX_SSH
+from job_manager import JOBS
+from audit_writer import AUDIT
+from audit_archive import archive_old_logs, search_archive, retention_cutoff
+import database as db
+import traceback
+import threading
+import re
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+app = Flask(__name__)
+app.secret_key = 'super_secret_key_for_h3c_admin_tool_2026'
+
+# 🚫 关键端口保护关键词 (不区分大小写)
+# 只要端口描述包含这些词，系统将拒绝修改
+PROTECTED_KEYWORDS = ['Uplink', 'Trunk', 'Core', 'Connect', 'To', 'hexin', 'huiju', 'link']
+
+# 备份文件存放目录
+BACKUP_ROOT = 'backups'
+if not os.path.exists(BACKUP_ROOT):
+    os.makedirs(BACKUP_ROOT)
+
+# === 登录管理器配置 ===
+login_manager = LoginManager()
+login_manager.init_app(app)
+login_manager.login_view = 'login' 
+
+class User(UserMixin):
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_data = db.get_user_by_id(user_id)
+    if user_data:
+        return User(id=user_data['id'], username=user_data['username'])
+    return None
+
+# === 辅助函数 ===
+def get_manager(data, priority=PRIORITY_INTERACTIVE):
+    port = int(data.get('port', 22)) 
+    # 页面操作默认按交互优先级排队，同一用户的请求之间轮转
+    return H3CManager(data['ip'], data['user'], data['pass'], port, priority=priority, owner=current_user.username)
+
+def cache_info(mgr):
+    # 🧊 随读接口一起返回缓存命中情况、是否与并发的相同读取合并，以及全局命中/未命中计数
+    return {'hit': mgr.last_cache_hit, 'age': mgr.last_cache_age, 'shared': mgr.last_shared, 'stats': DEVICE_CACHE.stats()}
+
+def queue_wait(mgr):
+    # 🚦 本次请求在设备调度器里排队等待会话名额的秒数
+    return round(mgr.queue_wait, 3)
+
+# === 页面路由 ===
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        user_data = db.verify_user(username, password)
+        if user_data:
+            user = User(id=user_data['id'], username=user_data['username'])
+            login_user(user)
+            return redirect(url_for('index'))
+        else:
+            return render_template('login.html', error="❌ 用户名或密码错误")
+    return render_template('login.html')
+
+@app.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('login'))
+
+@app.route('/')
+@login_required 
+def index():
+    return render_template('index.html', username=current_user.username)
+
+# === 资产管理 API ===
+
+@app.route('/api/switches', methods=['GET'])
+@login_required
+def list_switches():
+    # 在线状态 / 延时 / 型号取自巡检缓存，列表请求本身不连设备
+    switches = db.get_switches_with_health()
+    return jsonify({'status': 'success', 'data': switches})
+
+# === 📡 资产管理：立即巡检一轮 (每台都 SSH 登录核对，走后台任务，不占请求线程) ===
+HEALTH_JOB_KEY = 'health_refresh'
+
+def fleet_health_job(switches):
+    def run(job):
+        job.emit({'type': 'start', 'total': len(switches), 'workers': HEALTH_MAX_SSH})
+        summary = poll_fleet(switches, force_ssh=True)
+        for change in summary['changes']:
+            job.emit(dict(change, type='change'))
+        fail = summary['ssh_fail'] + summary['down']
+        text = f"共 {summary['total']} 台。在线: {summary['up']}, SSH 异常: {summary['ssh_fail']}, 不可达: {summary['down']}。耗时: {summary['duration']}s"
+        status = 'success' if fail == 0 else ('partial' if summary['up'] > 0 else 'failed')
+        return status, summary['up'], fail, text
+    return run
+
+@app.route('/api/switches/health/refresh', methods=['POST'])
+@login_required
+def api_refresh_health():
+    switches = db.get_all_switches()
+    if not switches:
+        return jsonify({'status': 'error', 'msg': '数据库中没有设备，请先添加！'})
+    job, created = JOBS.submit('在线巡检', current_user.username, fleet_health_job(switches),
+                               total=len(switches), dedupe_key=HEALTH_JOB_KEY)
+    return jsonify({'status': 'success', 'job_id': job.id, 'created': created})
+
+# === 📡 资产管理：单台添加设备 (带重复IP校验) ===
+@app.route('/api/switches/add', methods=['POST'])
+@login_required
+def api_add_switch():
+    try:
+        data = request.json
+        # 🛡️ 校验重复 IP
+        existing = db.get_all_switches()
+        if any(s['ip'] == data['ip'] for s in existing):
+            return jsonify({'status': 'error', 'msg': f"添加失败：IP 地址 {data['ip']} 已存在，请勿重复录入！"})
+        
+        vendor = data.get('vendor', 'h3c').lower()
+        db.add_switch(data['name'], data['ip'], data['port'], data['user'], data['pass'], vendor)
+        return jsonify({'status': 'success'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+# === 📂 资产管理：Excel 批量导入设备接口 (带重复IP跳过机制) ===
+@app.route('/api/switches/batch_import', methods=['POST'])
+@login_required
+def batch_import_switches():
+    if 'file' not in request.files:
+        return jsonify({'status': 'error', 'msg': '未找到文件'})
+    file = request.files['file']
+    
+    try:
+        import openpyxl
+        wb = openpyxl.load_workbook(file, data_only=True)
+        sheet = wb.active
+        headers = [str(cell.value).strip() if cell.value is not None else "" for cell in sheet[1]]
+        
+        required_cols = ['设备名称', 'IP地址', '端口', '用户名', '密码', '厂商']
+        col_indices = {}
+        for req in required_cols:
+            if req in headers:
+                col_indices[req] = headers.index(req)
+            else:
+                return jsonify({'status': 'error', 'msg': f"资产表格缺少必填列头：【{req}】"})
+
+        # 🛡️ 获取当前数据库里所有的 IP 集合，用于排重
+        existing_switches = db.get_all_switches()
+        existing_ips = {s['ip'] for s in existing_switches}
+
+        success_count = 0
+        skip_count = 0 # 记录跳过的重复设备数
+
+        for row in sheet.iter_rows(min_row=2, values_only=True):
+            ip = row[col_indices['IP地址']]
+            if not ip: continue
+            ip = str(ip).strip()
+            
+            # 🛡️ 如果 IP 已经存在，直接跳过这一行，不报错打断进程
+            if ip in existing_ips:
+                skip_count += 1
+                continue
+
+            name = str(row[col_indices['设备名称']] or f"Switch_{ip}").strip()
+            port = int(row[col_indices['端口']] or 22)
+            user = str(row[col_indices['用户名']]).strip()
+            pwd = str(row[col_indices['密码']]).strip()
+            vendor = str(row[col_indices['厂商']] or 'h3c').strip().lower()
+
+            db.add_switch(name, ip, port, user, pwd, vendor)
+            
+            # 🛡️ 将新加入的 IP 录入集合，防止 Excel 内部有两行一模一样的重复 IP
+            existing_ips.add(ip) 
+            success_count += 1
+            
+        msg = f"成功导入 {success_count} 台设备！"
+        if skip_count > 0:
+            msg += f" (自动拦截并跳过了 {skip_count} 条重复的 IP)"
+            
+        return jsonify({'status': 'success', 'msg': msg})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': f"导入失败: {str(e)}"})
+
+@app.route('/api/switches/delete', methods=['POST'])
+@login_required
+def del_switch_api():
+    try:
+        db.delete_switch(request.json['id'])
+        return jsonify({'status': 'success'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/api/change_password', methods=['POST'])
+@login_required
+def change_pass_api():
+    try:
+        new_pass = request.json.get('new_password')
+        if not new_pass: return jsonify({'status': 'error', 'msg': '密码不能为空'})
+        db.change_password(current_user.username, new_pass)
+        return jsonify({'status': 'success'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+# ===开放数据接口提供给前端网页调用===
+AUDIT_PAGE_MAX = 500   # 审计日志单页最大条数
+
+@app.route('/api/audit_logs', methods=['GET'])
+@login_required
+def api_audit_logs():
+    try:
+        # 按 id 游标翻页：cursor 为上一页返回的 next_cursor，筛选条件全部走索引
+        args = request.args
+        # limit 非数字时按默认 100 条，并限制在 1~AUDIT_PAGE_MAX：limit=0 会让 next_cursor 永远不变，前端翻页死循环
+        raw_limit = args.get('limit', '100').strip()
+        limit = max(1, min(int(raw_limit) if raw_limit.lstrip('-').isdigit() else 100, AUDIT_PAGE_MAX))
+        cursor = args.get('cursor', '')
+        AUDIT.flush()   # 先把队列里刚提交的日志落库，保证查询能看到
+        filters = {k: args.get(k, '').strip() or None
+                   for k in ('username', 'device_ip', 'action', 'status', 'start', 'end')}
+        before_id = int(cursor) if cursor.isdigit() else None
+        keyword = args.get('q', '').strip() or None
+        logs = db.get_audit_logs(limit=limit + 1, before_id=before_id, keyword=keyword, **filters)
+        # 🗜️ 数据库里的热数据翻到底后，按需继续从归档文件读取更早的记录 (勾选“含归档”或起始日期早于保留期)
+        if len(logs) <= limit and (args.get('archive') == '1' or (filters['start'] and filters['start'] < retention_cutoff())):
+            archive_before = logs[-1]['id'] if logs else before_id
+            logs += search_archive(limit=limit + 1 - len(logs), before_id=archive_before, keyword=keyword, **filters)
+        next_cursor = logs[limit - 1]['id'] if len(logs) > limit else None
+        return jsonify({'status': 'success', 'data': logs[:limit], 'next_cursor': next_cursor})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+# === 📈 运行指标：SSH 连接池 / 设备缓存等内部状态 ===
+@app.route('/api/metrics', methods=['GET'])
+@login_required
+def api_metrics():
+    return jsonify({'status': 'success', 'data': {'ssh_pool': POOL.stats(), 'device_cache': DEVICE_CACHE.stats(),
+                                                    'audit_writer': AUDIT.stats(), 'fleet_backend': FLEET_BACKEND,
+                                                    'device_scheduler': SCHEDULER.stats(), 'read_coalescing': READ_FLIGHTS.stats()}})
+
+# 开放api接口给数据库做前面板数据
+@app.route('/api/dashboard_stats', methods=['GET'])
+@login_required
+def api_dashboard_stats():
+    try:
+        AUDIT.flush()
+        stats = db.get_dashboard_stats()
+        return jsonify({'status': 'success', 'data': stats})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+# === 批量备份功能 (后台任务 + 实时事件流) ===
+BACKUP_JOB_KEY = 'fleet_backup'
+
+def fleet_backup_job(switches):
+    """生成全网备份任务函数：每台设备完成即推送一条事件"""
+    def run(job):
+        job.emit({'type': 'start', 'total': len(switches), 'workers': fleet_workers(BACKUP_MAX_WORKERS, len(switches))})
+        summary = run_fleet_backup(switches, BACKUP_ROOT, on_result=lambda r: job.emit(dict(r, type='device')))
+        text = (f"共 {summary['total']} 台。成功: {summary['success']}, 失败: {summary['fail']}, 配置有变化: {summary['changed']}。"
+                f"耗时: {summary['duration']}s。新增备份对象: {summary['new_blobs']} 个。"
+                f"未变更(跳过传输): {summary['skipped']} 台，节省传输 {summary['avoided_bytes'] / 1024:.1f} KB / 约 {summary['avoided_seconds']}s")
+        status = 'success' if summary['fail'] == 0 else ('partial' if summary['success'] > 0 else 'failed')
+        return status, summary['success'], summary['fail'], text
+    return run
+
+@app.route('/batch_backup', methods=['POST'])
+@login_required
+def batch_backup():
+    switches = db.get_all_switches()
+    if not switches:
+        return jsonify({'status': 'error', 'msg': '数据库中没有设备，请先添加！'})
+
+    # 提交后立即返回 job_id；已有备份在跑时直接复用，多人点击不会重复登录设备
+    job, created = JOBS.submit('批量备份', current_user.username, fleet_backup_job(switches),
+                               total=len(switches), dedupe_key=BACKUP_JOB_KEY)
+    msg = "备份任务已提交" if created else "已有备份任务正在执行，已为您接入其实时进度"
+    return jsonify({'status': 'success', 'job_id': job.id, 'created': created, 'msg': msg})
+
+# === 📦 备份仓库：按设备查看历史版本、按日期取回配置 ===
+@app.route('/api/backups', methods=['GET'])
+@login_required
+def api_backups():
+    ip = request.args.get('ip', '').strip()
+    if not ip:
+        return jsonify({'status': 'error', 'msg': '请提供设备 ip'})
+    return jsonify({'status': 'success', 'data': db.get_backup_history(ip)})
+
+@app.route('/api/backups/<ip>/<day>', methods=['GET'])
+@login_required
+def api_backup_download(ip, day):
+    entry = db.get_backup_entry(ip, day)
+    if not entry:
+        return jsonify({'status': 'error', 'msg': f'{ip} 在 {day} 没有备份'})
+    config_text = load_config(ip, day, BACKUP_ROOT)
+    filename = f"{safe_device_name(entry['device_name'] or ip)}_{ip}_{day}.cfg"
+    return Response(config_text, mimetype='text/plain',
+                    headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"})
+
+# === 🔀 两份备份之间的配置差异 (默认对比最近两份) ===
+@app.route('/api/backups/diff', methods=['GET'])
+@login_required
+def api_backup_diff():
+    ip = request.args.get('ip', '').strip()
+    old_day, new_day = request.args.get('from', ''), request.args.get('to', '')
+    if not old_day or not new_day:
+        history = db.get_backup_history(ip, limit=2)
+        if len(history) < 2:
+            return jsonify({'status': 'error', 'msg': '该设备的备份不足两份，无法对比'})
+        new_day, old_day = new_day or history[0]['day'], old_day or history[1]['day']
+    diff = diff_device(ip, old_day, new_day, BACKUP_ROOT)
+    if diff is None:
+        return jsonify({'status': 'error', 'msg': '指定日期没有备份'})
+    return jsonify({'status': 'success', 'data': dict(diff, ip=ip, old_day=old_day, new_day=new_day)})
+
+@app.route('/api/change_report', methods=['GET'])
+@login_required
+def api_change_report():
+    report = db.get_change_report(request.args.get('day') or None)
+    if not report:
+        return jsonify({'status': 'error', 'msg': '还没有生成过变更报告'})
+    return jsonify({'status': 'success', 'data': json.loads(report)})
+
+# === 🧵 后台任务查询与实时事件流 (SSE) ===
+@app.route('/api/jobs', methods=['GET'])
+@login_required
+def api_jobs():
+    return jsonify({'status': 'success', 'data': db.get_recent_jobs()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def api_job_detail(job_id):
+    job = db.get_job(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'msg': '任务不存在'})
+    return jsonify({'status': 'success', 'data': job})
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+@login_required
+def api_job_stream(job_id):
+    if not db.get_job(job_id):
+        return jsonify({'status': 'error', 'msg': '任务不存在'})
+    # 断线重连时浏览器会带上 Last-Event-ID，从断点继续推送，不会重跑任何设备操作
+    after = request.headers.get('Last-Event-ID') or request.args.get('after') or 0
+    after = int(after) if str(after).isdigit() else 0
+
+    def generate():
+        for seq, event_json in JOBS.iter_events(job_id, after):
+            if seq is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {seq}\ndata: {event_json}\n\n"
+        yield "event: close\ndata: {}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# === 业务路由 ===
+
+@app.route('/test_connection', methods=['POST'])
+@login_required
+def test_connection():
+    try:
+        mgr = get_manager(request.json)
+        info = mgr.get_device_info()
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'log': info.replace('\n', '<br>')})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/get_interfaces', methods=['POST'])
+@login_required
+def get_interfaces():
+    try:
+        mgr = get_manager(request.json)
+        interfaces = mgr.get_interface_list(use_cache=not request.json.get('refresh'))
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'data': interfaces, 'cache': cache_info(mgr)})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/get_port_info', methods=['POST'])
+@login_required
+def get_port_info():
+    try:
+        mgr = get_manager(request.json)
+        info, raw = mgr.get_port_info(request.json['interface'], use_cache=not request.json.get('refresh'))
+        source = f"读取成功 (缓存 {mgr.last_cache_age}s 前)" if mgr.last_cache_hit else "读取成功。"
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'data': info, 'cache': cache_info(mgr),
+                        'log': f"{source}<br>RAW:<br>{raw.replace(chr(10), '<br>')}"})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+# === 🗂️ 全网查找 IP / MAC 绑定位置 (只查已缓存的各设备绑定表索引，不登录设备) ===
+@app.route('/api/bindings/locate', methods=['GET'])
+@login_required
+def api_locate_cached_bindings():
+    ip = request.args.get('ip', '').strip()
+    mac = request.args.get('mac', '').strip()
+    if not ip and not mac:
+        return jsonify({'status': 'error', 'msg': '请提供 ip 或 mac 参数'})
+    return jsonify({'status': 'success', 'data': locate_cached_bindings(ip or None, mac or None)})
+
+# === 🔎 全网 IP/MAC 定位 (查询定时采集入库的索引，毫秒级返回) ===
+LOCATOR_JOB_KEY = 'locator_harvest'
+
+def fleet_harvest_job(switches):
+    def run(job):
+        job.emit({'type': 'start', 'total': len(switches), 'workers': fleet_workers(LOCATOR_MAX_WORKERS, len(switches))})
+        summary = run_fleet_harvest(switches, on_result=lambda r: job.emit(dict(r, type='device')))
+        text = f"共 {summary['total']} 台。成功: {summary['success']}, 失败: {summary['fail']}, 数据有变化: {summary['changed']}。耗时: {summary['duration']}s"
+        status = 'success' if summary['fail'] == 0 else ('partial' if summary['success'] > 0 else 'failed')
+        return status, summary['success'], summary['fail'], text
+    return run
+
+@app.route('/api/locate', methods=['GET'])
+@login_required
+def api_locate():
+    q = request.args.get('q', '').strip()
+    if re.match(r'^\d{1,3}(\.\d{1,3}){3}$', q):
+        rows = db.search_locator(ip=q)
+    else:
+        mac = format_mac(q)
+        if not re.match(r'^[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}$', mac):
+            return jsonify({'status': 'error', 'msg': '请输入完整的 IP 地址或 MAC 地址'})
+        rows = db.search_locator(mac=mac)
+    return jsonify({'status': 'success', 'data': rows, 'index': db.get_locator_status()})
+
+@app.route('/api/locate/harvest', methods=['POST'])
+@login_required
+def api_locate_harvest():
+    switches = db.get_all_switches()
+    if not switches:
+        return jsonify({'status': 'error', 'msg': '数据库中没有设备，请先添加！'})
+    job, created = JOBS.submit('定位索引采集', current_user.username, fleet_harvest_job(switches),
+                               total=len(switches), dedupe_key=LOCATOR_JOB_KEY)
+    return jsonify({'status': 'success', 'job_id': job.id, 'created': created})
+
+# === 升级版：绑定接口 (带审计日志) ===
+@app.route('/bind_port', methods=['POST'])
+@login_required
+def bind_port():
+    d = request.json
+    client_ip = request.remote_addr
+    device_ip = d.get('ip', 'Unknown')
+    mode = d.get('mode', 'access')
+    details = f"端口:{d.get('interface')} | IP:{d.get('bind_ip')} | MAC:{d.get('mac')} | 模式:{mode} | VLAN:{d.get('vlan')}"
+
+    try:
+        mgr = get_manager(d)
+        # 🗂️ 下发前查已缓存的绑定表索引：IP / MAC 已绑在其他端口时给出提示 (只查缓存，不为提示多拉一次整表)
+        duplicates = [e for e in mgr.find_bindings(d['bind_ip'], d['mac'], cached_only=True) if e['interface'] != short_iface_name(d['interface'])]
+        # 保护端口校验与下发在同一个 SSH 会话内完成
+        log = mgr.configure_port_binding(d['interface'], d['vlan'], d['bind_ip'], d['mac'], mode,
+                                         protected_keywords=PROTECTED_KEYWORDS)
+        if duplicates:
+            log += "\n⚠️ 注意：该 IP/MAC 在本设备上已存在其他绑定: " + \
+                   ", ".join(f"{e['interface']} {e['ip']} {e['mac']}" for e in duplicates)
+        
+        # 🔥 记录成功日志
+        AUDIT.log(current_user.username, client_ip, device_ip, "端口绑定", details, "成功")
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'log': log.replace('\n', '<br>')})
+    except ProtectedPortError as e:
+        # 记录越权操作失败
+        AUDIT.log(current_user.username, client_ip, device_ip, "端口绑定", f"{details} | 触发保护端口拦截", "失败")
+        return jsonify({'status': 'error', 'msg': f"⛔ 拒绝操作！<br>该端口描述包含保护关键词 '{e.keyword}'。"})
+    except Exception as e:
+        # 🔥 记录失败日志
+        AUDIT.log(current_user.username, client_ip, device_ip, "端口绑定", f"{details} | 报错: {str(e)}", "失败")
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+# === 升级版：解绑接口 (带审计日志) ===
+@app.route('/del_port_binding', methods=['POST'])
+@login_required
+def del_port_binding():
+    d = request.json
+    client_ip = request.remote_addr
+    device_ip = d.get('ip', 'Unknown')
+    mode = d.get('mode', 'access')
+    vlan = d.get('vlan', '')
+    details = f"端口:{d.get('interface')} | IP:{d.get('del_ip')} | MAC:{d.get('del_mac')} | 模式:{mode} | VLAN:{vlan}"
+
+    try:
+        mgr = get_manager(d)
+        log = mgr.delete_port_binding(d['interface'], d['del_ip'], d['del_mac'], mode, vlan,
+                                      protected_keywords=PROTECTED_KEYWORDS)
+        
+        # 🔥 记录成功日志
+        AUDIT.log(current_user.username, client_ip, device_ip, "解除绑定", details, "成功")
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'log': log.replace('\n', '<br>')})
+    except ProtectedPortError as e:
+        AUDIT.log(current_user.username, client_ip, device_ip, "解除绑定", f"{details} | 触发保护端口拦截", "失败")
+        return jsonify({'status': 'error', 'msg': f"⛔ 拒绝操作！<br>该端口描述包含保护关键词 '{e.keyword}'。"})
+    except Exception as e:
+        # 🔥 记录失败日志
+        AUDIT.log(current_user.username, client_ip, device_ip, "解除绑定", f"{details} | 报错: {str(e)}", "失败")
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/get_acl', methods=['POST'])
+@login_required
+def get_acl():
+    try:
+        mgr = get_manager(request.json)
+        rules = mgr.get_acl_rules(acl_number=acl_number_of(request.json), use_cache=not request.json.get('refresh'))
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'data': rules, 'cache': cache_info(mgr)})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/add_acl', methods=['POST'])
+@login_required
+def add_acl():
+    try:
+        d = request.json
+        mgr = get_manager(d)
+        rid = d.get('rule_id')
+        if rid == "": rid = None
+        log = mgr.add_acl_mac(d['mac'], rid, acl_number=acl_number_of(d))
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'log': log.replace('\n', '<br>')})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/del_acl', methods=['POST'])
+@login_required
+def del_acl():
+    try:
+        d = request.json
+        mgr = get_manager(d)
+        log = mgr.delete_acl_rule(d['rule_id'], acl_number=acl_number_of(d))
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'log': log.replace('\n', '<br>')})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+# === 🧾 ACL 批量增删：add / delete 两个列表一次提交，同一会话内比对现有规则、一次下发、一次保存 ===
+def acl_number_of(data):
+    return int(data.get('acl_number') or 4000)
+
+def acl_items(add, delete):
+    # add: MAC 或 {'mac', 'rule_id'}；delete: 规则 ID / MAC 或 {'rule_id' | 'mac'}
+    items = []
+    for action, entries in (('add', add or []), ('delete', delete or [])):
+        for entry in entries:
+            if not isinstance(entry, dict):
+                text = str(entry).strip()
+                entry = {'rule_id': text} if action == 'delete' and text.isdigit() else {'mac': text}
+            items.append({'index': len(items), 'action': action, 'mac': entry.get('mac'), 'rule_id': entry.get('rule_id')})
+    return items
+
+@app.route('/api/acl/batch', methods=['POST'])
+@login_required
+def acl_batch():
+    d = request.json
+    client_ip = request.remote_addr
+    device_ip = d.get('ip', 'Unknown')
+    try:
+        acl_number = acl_number_of(d)
+        items = acl_items(d.get('add'), d.get('delete'))
+        if not items:
+            return jsonify({'status': 'error', 'msg': '没有需要变更的条目'})
+        mgr = get_manager(d)
+        results, raw = mgr.apply_acl_plan(acl_number, items)
+        data = [dict(item, **results[item['index']]) for item in items]
+        counts = {k: sum(1 for r in data if r['status'] == k) for k in ('success', 'skipped', 'error')}
+        details = f"ACL {acl_number} | 添加 {len(d.get('add') or [])} 条, 删除 {len(d.get('delete') or [])} 条 | " \
+                  f"生效 {counts['success']}, 跳过 {counts['skipped']}, 失败 {counts['error']}"
+        AUDIT.log(current_user.username, client_ip, device_ip, "ACL批量变更", details,
+                  "成功" if counts['error'] == 0 else "部分失败")
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'data': data, 'counts': counts,
+                        'log': raw.replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br>')})
+    except Exception as e:
+        AUDIT.log(current_user.username, client_ip, device_ip, "ACL批量变更", f"报错: {str(e)}", "失败")
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/save_config', methods=['POST'])
+@login_required
+def save_config():
+    client_ip = request.remote_addr
+    device_ip = request.json.get('ip', 'Unknown')
+    try:
+        mgr = get_manager(request.json)
+        log = mgr.save_config_to_device()
+        
+        AUDIT.log(current_user.username, client_ip, device_ip, "保存配置", "执行 save force", "成功")
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'log': log.replace('\n', '<br>')})
+    except Exception as e:
+        AUDIT.log(current_user.username, client_ip, device_ip, "保存配置", f"报错: {str(e)}", "失败")
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+
+# === 📊 Excel 批量导入解析接口 ===
+@app.route('/api/parse_excel', methods=['POST'])
+@login_required
+def parse_excel():
+    if 'file' not in request.files:
+        return jsonify({'status': 'error', 'msg': '未找到上传的文件'})
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'status': 'error', 'msg': '文件名为空'})
+
+    try:
+        # 读取 Excel (data_only=True 确保读取的是值而不是公式)
+        wb = openpyxl.load_workbook(file, data_only=True)
+        sheet = wb.active
+        
+        # 1. 获取表头并校验
+        headers = [str(cell.value).strip() if cell.value else "" for cell in sheet[1]]
+        required_cols = ['交换机IP', '端口', 'VLAN', '绑定IP', '绑定MAC', '模式']
+        
+        col_indices = {}
+        for req in required_cols:
+            if req in headers:
+                col_indices[req] = headers.index(req)
+            else:
+                return jsonify({'status': 'error', 'msg': f"Excel 缺少必填的列头：【{req}】"})
+
+        # 2. 逐行提取数据
+        data = []
+        for row in sheet.iter_rows(min_row=2, values_only=True):
+            switch_ip = row[col_indices['交换机IP']]
+            if not switch_ip: continue # 如果交换机IP为空，视为结束或空行，直接跳过
+            
+            data.append({
+                'switch_ip': str(switch_ip).strip(),
+                'interface': str(row[col_indices['端口']]).strip(),
+                'vlan': str(row[col_indices['VLAN']]).strip(),
+                'bind_ip': str(row[col_indices['绑定IP']]).strip(),
+                'mac': str(row[col_indices['绑定MAC']]).strip(),
+                'mode': str(row[col_indices['模式']]).strip().lower()
+            })
+            
+        return jsonify({'status': 'success', 'data': data})
+        
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': f"读取 Excel 异常: {str(e)}"})
+
+# === 📊 Excel 批量自动化引擎专用接口 ===
+@app.route('/api/execute_excel_row', methods=['POST'])
+@login_required
+def execute_excel_row():
+    try:
+        d = request.json
+        client_ip = request.remote_addr
+        switch_ip = d.get('switch_ip')
+        interface = d.get('interface')
+        vlan = d.get('vlan')
+        bind_ip = d.get('bind_ip')
+        mac = d.get('mac')
+        mode = d.get('mode', 'access')
+
+        # 1. 自动从数据库获取该交换机的账号密码 (免去手动输入)
+        switches = db.get_all_switches()
+        target_sw = next((s for s in switches if s['ip'] == switch_ip), None)
+        if not target_sw:
+            return jsonify({'status': 'error', 'msg': f"资产管理库未登记该IP({switch_ip})，无法获取密码"})
+
+        # 2. 组装连接参数
+        d['ip'] = switch_ip
+        d['user'] = target_sw['username']
+        d['pass'] = target_sw['password']
+        d['port'] = target_sw['port']
+
+        mgr = get_manager(d, priority=PRIORITY_BULK)
+
+        # 3. 执行前安全拦截 (保护核心上联口) + 下发指令，同一会话完成，并捕获回显
+        try:
+            raw_log = mgr.configure_port_binding(interface, vlan, bind_ip, mac, mode,
+                                                 protected_keywords=PROTECTED_KEYWORDS)
+        except ProtectedPortError as e:
+            details = f"[Excel批量] 端口:{interface} | IP:{bind_ip} | MAC:{mac} | 模式:{mode}"
+            AUDIT.log(current_user.username, client_ip, switch_ip, "批量端口绑定", f"{details} | 触发保护端口拦截", "失败")
+            return jsonify({'status': 'error', 'msg': f"触发保护端口拦截({e.keyword})"})
+
+        # 💡 核心修复：安全处理底层函数的奇葩返回值，防止 jsonify 崩溃
+        if isinstance(raw_log, bytes):
+            log_output = raw_log.decode('utf-8', errors='ignore')
+        elif raw_log is None:
+            log_output = "> [System] 配置指令已成功发送 (底层函数未返回详细回显)"
+        else:
+            log_output = str(raw_log)
+            
+        # 🛡️ 过滤危险字符：防止交换机的 <H3C> 提示符被网页当成 HTML 标签隐藏掉
+        log_output = log_output.replace('<', '&lt;').replace('>', '&gt;')
+
+        # 4. 记录成功的审计日志
+        details = f"[Excel批量] 端口:{interface} | IP:{bind_ip} | MAC:{mac} | 模式:{mode} | VLAN:{vlan}"
+        AUDIT.log(current_user.username, client_ip, switch_ip, "批量端口绑定", details, "成功")
+
+        return jsonify({'status': 'success', 'queue_wait': queue_wait(mgr), 'log': log_output})        
+    except Exception as e:
+        # 记录失败日志
+        details = f"[Excel批量] 端口:{interface} | IP:{bind_ip} | MAC:{mac}"
+        AUDIT.log(current_user.username, client_ip, switch_ip, "批量端口绑定", f"{details} | 报错: {str(e)}", "失败")
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+# === 📊 Excel 批量计划执行：整表一次提交，按交换机分组并发下发 ===
+EXCEL_MAX_SWITCHES = 10   # 同时下发的交换机数上限
+
+def excel_plan_job(rows, username, client_ip):
+    def run(job):
+        switches = {s['ip']: s for s in db.get_all_switches()}
+        groups = {}
+        for index, row in enumerate(rows):
+            groups.setdefault(str(row.get('switch_ip', '')).strip(), []).append(dict(row, index=index))
+        job.emit({'type': 'start', 'total': len(rows), 'switches': len(groups)})
+
+        counts = {'success': 0, 'fail': 0}
+        lock = threading.Lock()
+
+        def finish_row(item, result):
+            details = f"[Excel批量] 端口:{item.get('interface')} | IP:{item.get('bind_ip')} | MAC:{item.get('mac')} | 模式:{item.get('mode')} | VLAN:{item.get('vlan')}"
+            if result['status'] == 'success':
+                AUDIT.log(username, client_ip, item.get('switch_ip'), "批量端口绑定", details, "成功")
+            elif result['status'] == 'blocked':
+                AUDIT.log(username, client_ip, item.get('switch_ip'), "批量端口绑定", f"{details} | 触发保护端口拦截", "失败")
+            else:
+                AUDIT.log(username, client_ip, item.get('switch_ip'), "批量端口绑定", f"{details} | 报错: {result['msg']}", "失败")
+            with lock:
+                counts['success' if result['status'] == 'success' else 'fail'] += 1
+            log = result.get('log', '').replace('<', '&lt;').replace('>', '&gt;')
+            job.emit({'type': 'row', 'index': item['index'], 'status': result['status'], 'msg': result['msg'], 'log': log})
+
+        def run_switch(switch_ip, items):
+            sw = switches.get(switch_ip)
+            if not sw:
+                for item in items:
+                    finish_row(item, {'status': 'error', 'msg': f"资产管理库未登记该IP({switch_ip})，无法获取密码"})
+                return
+            try:
+                mgr = H3CManager(switch_ip, sw['username'], sw['password'], sw['port'], priority=PRIORITY_BULK, owner=username)
+                results, raw = mgr.apply_binding_plan(items, PROTECTED_KEYWORDS)
+                # 🛡️ 过滤危险字符：防止交换机的 <H3C> 提示符被网页当成 HTML 标签隐藏掉
+                job.emit({'type': 'switch', 'switch_ip': switch_ip, 'log': raw.replace('<', '&lt;').replace('>', '&gt;')})
+            except Exception as e:
+                results = {item['index']: {'status': 'error', 'msg': str(e)} for item in items}
+            for item in items:
+                finish_row(item, results[item['index']])
+
+        with ThreadPoolExecutor(max_workers=max(1, min(EXCEL_MAX_SWITCHES, len(groups))), thread_name_prefix='excel') as pool:
+            list(pool.map(lambda kv: run_switch(*kv), groups.items()))
+
+        summary = f"共 {len(rows)} 行，涉及 {len(groups)} 台交换机。成功: {counts['success']}, 失败: {counts['fail']}"
+        status = 'success' if counts['fail'] == 0 else ('partial' if counts['success'] > 0 else 'failed')
+        return status, counts['success'], counts['fail'], summary
+    return run
+
+@app.route('/api/execute_excel_plan', methods=['POST'])
+@login_required
+def execute_excel_plan():
+    rows = (request.json or {}).get('rows') or []
+    if not rows:
+        return jsonify({'status': 'error', 'msg': '没有可执行的数据！'})
+    job, _ = JOBS.submit('Excel批量部署', current_user.username,
+                         excel_plan_job(rows, current_user.username, request.remote_addr),
+                         total=len(rows), interactive=True)
+    return jsonify({'status': 'success', 'job_id': job.id})
+
+# === 🧾 Excel 批量 ACL：按 (交换机, ACL 编号) 分组，每组一次登录、一次下发、一次保存 ===
+ACL_EXCEL_COLUMNS = ['交换机IP', 'ACL编号', '操作', 'MAC']
+ACL_EXCEL_ACTIONS = {'添加': 'add', '新增': 'add', 'add': 'add', '删除': 'delete', 'delete': 'delete', 'del': 'delete'}
+
+def excel_cell(value):
+    # 🛡️ 修复 Excel 幽灵浮点数 (4000.0 / 5.0)
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+@app.route('/api/parse_acl_excel', methods=['POST'])
+@login_required
+def parse_acl_excel():
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'status': 'error', 'msg': '未找到上传的文件'})
+    try:
+        sheet = openpyxl.load_workbook(request.files['file'], data_only=True).active
+        headers = [str(cell.value).strip() if cell.value else "" for cell in sheet[1]]
+        missing = [col for col in ACL_EXCEL_COLUMNS if col not in headers]
+        if missing:
+            return jsonify({'status': 'error', 'msg': f"Excel 缺少必填的列头：【{missing[0]}】"})
+        col = {name: headers.index(name) for name in ACL_EXCEL_COLUMNS + ['规则ID'] if name in headers}
+
+        data = []
+        for row in sheet.iter_rows(min_row=2, values_only=True):
+            switch_ip = excel_cell(row[col['交换机IP']])
+            if not switch_ip: continue
+            action = excel_cell(row[col['操作']])
+            data.append({
+                'switch_ip': switch_ip,
+                'acl_number': excel_cell(row[col['ACL编号']]) or '4000',
+                'action': ACL_EXCEL_ACTIONS.get(action.lower(), action),
+                'mac': excel_cell(row[col['MAC']]),
+                'rule_id': excel_cell(row[col['规则ID']]) if '规则ID' in col else '',
+            })
+        return jsonify({'status': 'success', 'data': data})
+    except Exception as e:
+        return jsonify({'status': 'error', 'msg': f"读取 Excel 异常: {str(e)}"})
+
+def acl_plan_job(rows, username, client_ip):
+    def run(job):
+        switches = {s['ip']: s for s in db.get_all_switches()}
+        groups = {}
+        for index, row in enumerate(rows):
+            key = (str(row.get('switch_ip', '')).strip(), str(row.get('acl_number') or '4000').strip())
+            groups.setdefault(key, []).append(dict(row, index=index))
+        job.emit({'type': 'start', 'total': len(rows), 'switches': len({ip for ip, _ in groups})})
+
+        counts = {'success': 0, 'skipped': 0, 'fail': 0}
+        lock = threading.Lock()
+
+        def finish_row(item, result):
+            status = result['status']
+            if status != 'skipped':
+                details = f"[Excel批量] ACL:{item.get('acl_number')} | 操作:{item.get('action')} | MAC:{item.get('mac')} | 规则ID:{item.get('rule_id')}"
+                AUDIT.log(username, client_ip, item.get('switch_ip'), "批量ACL变更",
+                          details if status == 'success' else f"{details} | 报错: {result['msg']}",
+                          "成功" if status == 'success' else "失败")
+            with lock:
+                counts[status if status in ('success', 'skipped') else 'fail'] += 1
+            log = result.get('log', '').replace('<', '&lt;').replace('>', '&gt;')
+            job.emit({'type': 'row', 'index': item['index'], 'status': status, 'msg': result['msg'], 'log': log})
+
+        def run_group(key, items):
+            switch_ip, acl_number = key
+            sw = switches.get(switch_ip)
+            if not sw:
+                for item in items:
+                    finish_row(item, {'status': 'error', 'msg': f"资产管理库未登记该IP({switch_ip})，无法获取密码"})
+                return
+            try:
+                mgr = H3CManager(switch_ip, sw['username'], sw['password'], sw['port'], priority=PRIORITY_BULK, owner=username)
+                results, raw = mgr.apply_acl_plan(int(acl_number), items)
+                job.emit({'type': 'switch', 'switch_ip': f"{switch_ip} (ACL {acl_number})",
+                          'log': raw.replace('<', '&lt;').replace('>', '&gt;')})
+            except Exception as e:
+                results = {item['index']: {'status': 'error', 'msg': str(e)} for item in items}
+            for item in items:
+                finish_row(item, results[item['index']])
+
+        with ThreadPoolExecutor(max_workers=max(1, min(EXCEL_MAX_SWITCHES, len(groups))), thread_name_prefix='acl') as pool:
+            list(pool.map(lambda kv: run_group(*kv), groups.items()))
+
+        done = counts['success'] + counts['skipped']
+        summary = f"共 {len(rows)} 行。生效: {counts['success']}, 无需变更: {counts['skipped']}, 失败: {counts['fail']}"
+        status = 'success' if counts['fail'] == 0 else ('partial' if done > 0 else 'failed')
+        return status, done, counts['fail'], summary
+    return run
+
+@app.route('/api/execute_acl_plan', methods=['POST'])
+@login_required
+def execute_acl_plan():
+    rows = (request.json or {}).get('rows') or []
+    if not rows:
+        return jsonify({'status': 'error', 'msg': '没有可执行的数据！'})
+    job, _ = JOBS.submit('Excel批量ACL', current_user.username,
+                         acl_plan_job(rows, current_user.username, request.remote_addr),
+                         total=len(rows), interactive=True)
+    return jsonify({'status': 'success', 'job_id': job.id})
+
+# === ⏰ 凌晨幽灵：定时自动备份任务 ===
+def auto_backup_task():
+    print(f"\n🌙 [{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [系统调度] 开始执行凌晨自动备份...")
+    switches = db.get_all_switches()
+    if not switches:
+        print("🌙 [系统调度] 数据库中没有设备，跳过备份。")
+        return
+
+    # 走统一的后台任务引擎：白天有人手动触发的备份还没跑完时直接等待并复用其结果
+    job, created = JOBS.submit('定时自动备份', 'System(系统)', fleet_backup_job(switches),
+                               total=len(switches), dedupe_key=BACKUP_JOB_KEY)
+    if not created:
+        print(f"🌙 [系统调度] 已有备份任务 {job.id} 正在执行，等待其完成...")
+    JOBS.wait(job.id)
+    result = db.get_job(job.id)
+
+    # 🔥 核心联动：记录到我们刚写好的审计日志中！(操作人写死为 System)
+    details = f"任务结束。{result['summary']}"
+    status = {'success': "成功", 'partial': "部分失败"}.get(result['status'], "全部失败")
+    AUDIT.log("System(系统)", "Localhost", "ALL_SWITCHES", "定时自动备份", details, status)
+    print(f"🌙 [系统调度] 备份任务执行完毕！{details}\n")
+
+    # 🔀 紧接着生成“昨夜变更”报告：只解析配置有变化的设备
+    try:
+        report = build_change_report(datetime.datetime.now().strftime('%Y-%m-%d'), BACKUP_ROOT)
+        print(f"🌙 [系统调度] 变更报告已生成：{report['changed']} 台有变化，{report['unchanged']} 台无变化，耗时 {report['duration']}s")
+    except Exception as e:
+        print(f"🌙 [系统调度] 生成变更报告失败: {e}")
+
+
+# === 🔎 定时采集全网绑定表 / MAC 表，刷新定位索引 ===
+def auto_harvest_task():
+    switches = db.get_all_switches()
+    if switches:
+        JOBS.submit('定位索引采集', 'System(系统)', fleet_harvest_job(switches),
+                    total=len(switches), dedupe_key=LOCATOR_JOB_KEY)
+
+
+# === 📡 定时巡检全网在线状态 (TCP 探测为主，状态变化时才 SSH 核对) ===
+def auto_health_task():
+    # 页面上的 "立即巡检" 正在跑时跳过本轮，不排队等待
+    summary = poll_fleet(wait=False)
+    if summary is None:
+        return
+    for change in summary['changes']:
+        print(f"📡 [巡检] {change['name']} ({change['ip']}) 状态变化: {change['from'] or '未巡检'} -> {change['to']}")
+
+
+# === 🗜️ 每天归档超期审计日志 ===
+def auto_archive_task():
+    AUDIT.flush()
+    result = archive_old_logs()
+    if result['archived']:
+        AUDIT.log("System(系统)", "Localhost", "-", "审计日志归档",
+                  f"归档 {result['archived']} 条早于 {result['cutoff']} 的日志，月份: {', '.join(result['months'])}", "成功")
+
+
+# 🚀 初始化并启动后台调度器
+scheduler = BackgroundScheduler(timezone="Asia/Shanghai") # 强制指定中国时区，防止服务器时间乱套
+
+# 设定每天凌晨 2:00 准时执行备份任务
+scheduler.add_job(func=auto_backup_task, trigger="cron", hour=2, minute=00)
+
+# 每分钟回收一次空闲超时的 SSH 长连接，避免长期占用交换机 VTY 线路
+scheduler.add_job(func=POOL.reap_idle, trigger="interval", seconds=60)
+
+# 定期采集全网 IP/MAC 定位索引 (只替换内容有变化的设备)
+scheduler.add_job(func=auto_harvest_task, trigger="interval", minutes=LOCATOR_HARVEST_MINUTES)
+
+# 定时巡检在线状态；启动时先跑一轮，资产列表马上就有状态可看
+scheduler.add_job(func=auto_health_task, trigger="interval", seconds=HEALTH_POLL_SECONDS,
+                  next_run_time=datetime.datetime.now(scheduler.timezone))
+
+# 每天凌晨 3:30 (备份之后) 归档超期审计日志
+scheduler.add_job(func=auto_archive_task, trigger="cron", hour=3, minute=30)
+
+scheduler.start()
+# ============================================
+
+
+
+if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
@@ -0,0 +1,277 @@
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from device_cache import DEVICE_CACHE
+from device_scheduler import SCHEDULER, PRIORITY_BULK
+from ssh_pool import POOL
+from comware_parser import short_iface_name, parse_acl, parse_mac_address_table, parse_startup_file
+from switch_driver import (build_device_identity, build_device_info, build_interface_list, build_port_info, build_binding_index,
+                           build_config_state, prompt_pattern, BINDING_INDEX_TTL, CONFIG_STREAM_TAIL,
+                           CONFIG_STREAM_TIMEOUT)
+
+try:
+    import asyncssh
+except ImportError:          # 未安装 asyncssh 时全网任务自动回退到线程池 + netmiko
+    asyncssh = None
+
+# === ⚡ 异步驱动：一个事件循环并发驱动数百台设备的只读操作 (全网备份 / 定位采集 / 健康检查) ===
+# 与 H3CManager 的读方法一一对应、结果一致 (共用 switch_driver 里的结果组装函数)，读缓存也共用 DEVICE_CACHE
+
+ASYNC_AVAILABLE = asyncssh is not None
+FLEET_BACKEND = 'async' if ASYNC_AVAILABLE else 'thread'   # 全网任务默认使用的驱动
+ASYNC_MAX_SESSIONS = 100         # 同时在线的异步 SSH 会话数上限
+ASYNC_CONNECT_TIMEOUT = 30       # 登录超时 (秒)
+ASYNC_COMMAND_TIMEOUT = 60       # 普通命令等待回到提示符的超时 (秒)
+ASYNC_READ_CHUNK = 64 * 1024     # 单次读取的字符数上限
+ASYNC_WRITE_BATCH = 256 * 1024   # 流式写盘时攒够多少字符交给 FLEET_IO 线程一次
+
+_ANY_PROMPT_RE = re.compile(r'[<\[]([^\r\n<>\[\]]+)[>\]]\s*$')
+
+# 协商层面的失败 (老设备只支持旧算法等)：这类设备回退到 netmiko 重试
+FALLBACK_ERRORS = (asyncssh.KeyExchangeFailed, asyncssh.ProtocolNotSupported, asyncssh.ProtocolError) \
+    if ASYNC_AVAILABLE else ()
+
+
+# 全网任务里的落库 / 压缩写盘 / 进度回调都是阻塞调用 (SQLite 忙等最长 10 秒)，放在事件循环里会卡住所有设备的读取：
+# 统一交给一个专用线程按提交顺序执行，落库本身也就串行了，不会彼此抢写锁
+FLEET_IO = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fleet-io')
+
+
+def offload(func, *args):
+    """在 FLEET_IO 线程里执行 func(*args)，返回可 await 的结果"""
+    return asyncio.wrap_future(FLEET_IO.submit(func, *args))
+
+
+class OffloadWriter:
+    """包装一个 write(text) 接口 (如 ObjectWriter)：事件循环里只攒字符串，攒够 ASYNC_WRITE_BATCH 交给 FLEET_IO 线程写一次
+    FLEET_IO 只有一个线程、按提交顺序执行，同一份配置的各块不会乱序；写入出错在 flush 时抛出"""
+    def __init__(self, write):
+        self._write = write
+        self._buffer = []
+        self._size = 0
+        self._pending = []
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= ASYNC_WRITE_BATCH:
+            self._submit()
+
+    def _submit(self):
+        if self._buffer:
+            self._pending.append(FLEET_IO.submit(self._write, ''.join(self._buffer)))
+            self._buffer, self._size = [], 0
+
+    async def flush(self):
+        """交出剩余的内容并等全部写完"""
+        self._submit()
+        pending, self._pending = self._pending, []
+        for future in pending:
+            await asyncio.wrap_future(future)
+
+
+class AsyncH3CManager:
+    """async with AsyncH3CManager(...) as mgr: 一个对象一条 SSH 会话，第一次真正需要读设备时才登录"""
+
+    def __init__(self, ip, username, password, port=22, priority=PRIORITY_BULK, owner=None):
+        self.ip = ip
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.device_key = (ip, int(port))
+        self.hostname = None
+        self.last_cache_hit = False
+        self.last_cache_age = 0
+        self.priority = priority
+        self.owner = owner
+        self.queue_wait = 0.0
+        self._ticket = None           # 设备调度器发的会话名额，登录前领取，close 时归还
+        self._conn = None
+        self._process = None
+        self._prompt_re = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _connect(self):
+        if self._ticket is None:
+            self._ticket = await SCHEDULER.acquire_async(self.device_key, self.priority, self.owner)
+            self.queue_wait += self._ticket.wait_seconds
+        # 连接池里的空闲 netmiko 会话也占着 VTY：登录前先断开多出来的，"在用名额 + 空闲会话" 不超过单台设备上限
+        keep = SCHEDULER.max_per_device - SCHEDULER.active_sessions(self.device_key)
+        if POOL.idle_sessions(self.device_key) > keep:
+            await asyncio.get_running_loop().run_in_executor(None, POOL.evict_idle, self.device_key, keep)
+        try:
+            self._conn = await asyncio.wait_for(
+                asyncssh.connect(self.ip, port=self.port, username=self.username, password=self.password,
+                                 known_hosts=None, public_key_auth=False,
+                                 preferred_auth='password,keyboard-interactive'),
+                ASYNC_CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"连接 {self.ip} timed out") from None
+        # Comware 只支持交互式 shell：申请终端后按提示符判断每条命令结束
+        self._process = await self._conn.create_process(term_type='vt100', term_size=(511, 24),
+                                                        encoding='utf-8', errors='replace')
+        banner = []
+        await self._read_until(_ANY_PROMPT_RE, banner.append, ASYNC_CONNECT_TIMEOUT)
+        self.hostname = _ANY_PROMPT_RE.search(''.join(banner)[-CONFIG_STREAM_TAIL:]).group(1).strip()
+        self._prompt_re = prompt_pattern(self.hostname)
+        await self._command("screen-length disable")
+
+    async def reset(self):
+        """丢弃当前 SSH 会话但保留调度名额，下一条命令重新登录"""
+        conn, self._conn, self._process = self._conn, None, None
+        if conn is not None:
+            conn.close()
+            try:
+                await conn.wait_closed()
+            except Exception:
+                pass
+
+    async def close(self):
+        try:
+            if self._conn is not None:
+                self._conn.close()
+                await self._conn.wait_closed()
+                self._conn = None
+        finally:
+            if self._ticket is not None:
+                SCHEDULER.release(self._ticket)
+                self._ticket = None
+
+    async def _read_until(self, pattern, write, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        tail, received = '', 0
+        while True:
+            remaining = deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                chunk = await asyncio.wait_for(self._process.stdout.read(ASYNC_READ_CHUNK), remaining)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{self.ip} 等待命令回显 timed out") from None
+            if not chunk:
+                raise EOFError(f"{self.ip} 的 SSH 通道被设备关闭")
+            write(chunk)
+            received += len(chunk)
+            tail = (tail + chunk)[-CONFIG_STREAM_TAIL:]
+            if pattern.search(tail):
+                return received
+
+    async def _command(self, command, write=None, timeout=ASYNC_COMMAND_TIMEOUT):
+        """发送命令并读到提示符；给了 write 就边读边交出去 (返回字符数)，否则返回与 netmiko send_command 相同格式的回显"""
+        if self._conn is None:
+            await self._connect()
+        self._process.stdin.write(command + "\n")
+        if write is not None:
+            return await self._read_until(self._prompt_re, write, timeout)
+        parts = []
+        await self._read_until(self._prompt_re, parts.append, timeout)
+        # 去掉第一行命令回显和最后一行提示符，换行统一为 \n
+        lines = ''.join(parts).replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        return '\n'.join(lines[1:-1])
+
+    async def send_command(self, command):
+        async with self._lock:
+            return await self._command(command)
+
+    async def _cached(self, kind, arg, loader, use_cache=True, ttl=None):
+        key = (self.device_key, kind, arg)
+        if use_cache:
+            hit, value, age = DEVICE_CACHE.get(key)
+            if hit:
+                self.last_cache_hit, self.last_cache_age = True, round(age, 1)
+                return value
+        generation = DEVICE_CACHE.generation(self.device_key)
+        value = await loader()
+        DEVICE_CACHE.set(key, value, generation, ttl)
+        self.last_cache_hit, self.last_cache_age = False, 0
+        return value
+
+    # === 📖 与 H3CManager 对应的读方法 ===
+    async def get_device_info(self):
+        return build_device_info(await self.get_device_identity())
+
+    async def get_device_identity(self):
+        version_out = await self.send_command("display version")
+        return build_device_identity(f"<{self.hostname}>", version_out)
+
+    async def get_interface_list(self, use_cache=True):
+        async def load():
+            brief_out = await self.send_command("display interface brief")
+            config_out = await self.send_command("display current-configuration interface")
+            return build_interface_list(brief_out, config_out)
+        return await self._cached('interfaces', None, load, use_cache)
+
+    async def get_port_info(self, interface_name, use_cache=True):
+        async def load():
+            output_iface = await self.send_command(f"display current-configuration interface {interface_name}")
+            return build_port_info(interface_name, output_iface, await self.get_binding_index())
+        return await self._cached('port_info', short_iface_name(interface_name), load, use_cache)
+
+    async def get_binding_index(self, use_cache=True):
+        async def load():
+            return build_binding_index(await self.send_command("display ip source binding"))
+        return await self._cached('bindings', None, load, use_cache, ttl=BINDING_INDEX_TTL)
+
+    async def get_mac_table(self):
+        return parse_mac_address_table(await self.send_command("display mac-address"))
+
+    async def get_acl_rules(self, acl_number=4000, use_cache=True):
+        async def load():
+            return parse_acl(await self.send_command(f"display acl {acl_number}"))
+        return await self._cached('acl', str(acl_number), load, use_cache)
+
+    async def get_full_config(self, read_timeout=None):
+        parts = []
+        await self.stream_full_config(parts.append, read_timeout)
+        lines = ''.join(parts).replace('\r\n', '\n').split('\n')
+        return '\n'.join(lines[1:-1])
+
+    async def stream_full_config(self, write, read_timeout=None):
+        """与 H3CManager.stream_full_config 相同：每读到一块就调用 write(text)，回显行和提示符行由调用方过滤"""
+        async with self._lock:
+            return await self._command("display current-configuration", write, read_timeout or CONFIG_STREAM_TIMEOUT)
+
+    async def probe_config_state(self):
+        startup_file = parse_startup_file(await self.send_command("display startup"))
+        if not startup_file:
+            return None
+        dir_out = await self.send_command(f"dir {startup_file}")
+        diff_out = await self.send_command("display current-configuration diff")
+        return build_config_state(startup_file, dir_out, diff_out)
+
+
+def fleet_workers(thread_workers, total):
+    """全网任务的实际并发数 (用于进度事件展示)"""
+    limit = ASYNC_MAX_SESSIONS if FLEET_BACKEND == 'async' else thread_workers
+    return max(1, min(limit, total))
+
+
+def run_fleet(switches, worker, max_sessions=ASYNC_MAX_SESSIONS, on_result=None):
+    """在一个新的事件循环里并发处理全部设备：worker(sw) 为协程函数，同时处理的设备数不超过 max_sessions
+    每完成一台回调一次 on_result(result) (在 FLEET_IO 线程里执行，回调里落库不会卡住事件循环)，返回按完成顺序排列的结果列表"""
+    async def main():
+        semaphore = asyncio.Semaphore(max_sessions)
+        results = []
+
+        async def one(sw):
+            async with semaphore:
+                result = await worker(sw)
+            results.append(result)
+            if on_result:
+                await offload(on_result, result)
+
+        await asyncio.gather(*(one(sw) for sw in switches))
+        return results
+
+    return asyncio.run(main())
@@ -0,0 +1,92 @@
+import os
+import re
+import gzip
+import json
+import datetime
+import database as db
+
+# === 🗜️ 审计日志归档：超期记录按月写入 gzip JSONL，数据库只保留热数据 ===
+
+AUDIT_RETENTION_DAYS = 180            # 数据库中保留最近多少天的审计日志
+AUDIT_ARCHIVE_ROOT = 'audit_archive'  # 归档目录: audit_archive/audit_2026-01.jsonl.gz
+ARCHIVE_CHUNK = 5000                  # 每批归档 / 删除的行数
+
+_ARCHIVE_NAME_RE = re.compile(r'^audit_(\d{4}-\d{2})\.jsonl\.gz$')
+
+
+def archive_path(month, archive_root=AUDIT_ARCHIVE_ROOT):
+    return os.path.join(archive_root, f"audit_{month}.jsonl.gz")
+
+
+def retention_cutoff(retention_days=AUDIT_RETENTION_DAYS):
+    day = datetime.date.today() - datetime.timedelta(days=retention_days)
+    return day.strftime('%Y-%m-%d') + ' 00:00:00'
+
+
+def archive_old_logs(retention_days=AUDIT_RETENTION_DAYS, archive_root=AUDIT_ARCHIVE_ROOT):
+    """把早于保留期的日志追加到对应月份的归档文件，每批落盘后立刻删除该批，最后增量 vacuum"""
+    os.makedirs(archive_root, exist_ok=True)
+    cutoff = retention_cutoff(retention_days)
+    archived, months, last_id = 0, set(), 0
+    while True:
+        rows = db.get_audit_logs_before(cutoff, last_id, ARCHIVE_CHUNK)
+        if not rows:
+            break
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['timestamp'][:7], []).append(row)
+        for month, items in by_month.items():
+            # gzip 追加会生成多成员文件，读取时 gzip 模块会自动连续解压
+            with gzip.open(archive_path(month, archive_root), 'at', encoding='utf-8') as f:
+                for row in items:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            months.add(month)
+        last_id = rows[-1]['id']
+        archived += db.delete_audit_logs_before(cutoff, last_id)
+    if archived:
+        db.incremental_vacuum()
+    return {'archived': archived, 'months': sorted(months), 'cutoff': cutoff}
+
+
+def list_archive_months(archive_root=AUDIT_ARCHIVE_ROOT):
+    """已有归档的月份，新的在前"""
+    if not os.path.isdir(archive_root):
+        return []
+    months = [m.group(1) for m in map(_ARCHIVE_NAME_RE.match, os.listdir(archive_root)) if m]
+    return sorted(months, reverse=True)
+
+
+def _match(row, filters, keyword):
+    for column, value in filters.items():
+        if value and row.get(column) != value:
+            return False
+    if keyword and keyword.lower() not in (row.get('details') or '').lower():
+        return False
+    return True
+
+
+def search_archive(limit=100, before_id=None, username=None, device_ip=None, action=None, status=None,
+                   start=None, end=None, keyword=None, archive_root=AUDIT_ARCHIVE_ROOT):
+    """与 db.get_audit_logs 相同的筛选语义；按月从新到旧逐个解压，凑够 limit 条就停止，不读多余的文件"""
+    end = end + ' 23:59:59' if end and len(end) == 10 else end
+    filters = {'username': username, 'device_ip': device_ip, 'action': action, 'status': status}
+    results = []
+    for month in list_archive_months(archive_root):
+        if (start and month < start[:7]) or (end and month > end[:7]):
+            continue
+        with gzip.open(archive_path(month, archive_root), 'rt', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        seen = set()
+        for row in reversed(rows):
+            if row['id'] in seen or (before_id and row['id'] >= before_id):
+                continue
+            seen.add(row['id'])   # 归档中途中断重跑时同一条可能写入两次
+            if start and row['timestamp'] < start:
+                continue
+            if end and row['timestamp'] > end:
+                continue
+            if _match(row, filters, keyword):
+                results.append(dict(row, archived=True))
+                if len(results) >= limit:
+                    return results
+    return results
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import atexit
+import datetime
+import threading
+import database as db
+
+# === 📝 异步审计日志写入器：请求线程只负责入队，后台单线程按批次合并为一个事务落盘 ===
+
+AUDIT_FLUSH_INTERVAL = 0.2      # 最长攒批时间 (秒)
+AUDIT_BATCH_SIZE = 200          # 单批最多条数
+AUDIT_RETRY_DELAY = 1.0         # 写库失败后的重试间隔 (秒)
+AUDIT_SPOOL_FILE = 'audit_spool.jsonl'   # 退出时仍写不进数据库的日志暂存在这里，下次启动自动补写
+
+
+class AuditWriter:
+    def __init__(self, flush_interval=AUDIT_FLUSH_INTERVAL, batch_size=AUDIT_BATCH_SIZE, spool_file=AUDIT_SPOOL_FILE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.spool_file = spool_file
+        self._queue = queue.Queue()
+        self._pending = []            # 已出队但还没写成功的日志
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._unwritten = 0           # 已入队但尚未落库的条数
+        self._stopping = False
+        self._stats = {'written': 0, 'batches': 0, 'failures': 0, 'rejected': 0,
+                       'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0}
+        self._load_spool()
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, username, client_ip, device_ip, action, details, status):
+        """入队即返回；时间戳在入队时确定，与实际落库时间无关"""
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # 入队前规整字段：NOT NULL 列为空时填 '-'，其余统一转成字符串，避免一条坏数据在落库时才出错
+        required = tuple('-' if v is None else str(v) for v in (username, client_ip, device_ip, action, status))
+        row = (timestamp,) + required[:4] + (None if details is None else str(details), required[4])
+        with self._lock:
+            self._unwritten += 1
+        self._queue.put(row)
+
+    def flush(self, timeout=5):
+        """等待已入队的日志全部落库 (查询审计日志前调用，保证刚做的操作立刻可见)"""
+        deadline = time.time() + timeout
+        with self._idle:
+            while self._unwritten > 0:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            batch = self._pending
+            if not batch:
+                try:
+                    batch.append(self._queue.get(timeout=1))
+                except queue.Empty:
+                    if self._stopping:
+                        return
+                    continue
+            # 攒批：凑满 batch_size 或等满 flush_interval 就写一次
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._pending = batch
+            if self._write(batch):
+                self._pending = []
+            elif self._stopping:
+                return
+            else:
+                time.sleep(AUDIT_RETRY_DELAY)
+
+    def _write(self, batch):
+        """写入一批日志：全部处理完返回 True；遇到临时故障返回 False，batch 中只留下还没处理的行，稍后重试"""
+        started = time.time()
+        try:
+            db.write_audit_batch(batch)
+        except sqlite3.OperationalError as e:
+            # 写锁等待超时、磁盘暂时不可写等临时故障：整批稍后重试
+            self._stats['failures'] += 1
+            print(f"写入审计日志失败 (将重试 {len(batch)} 条): {e}")
+            return False
+        except Exception as e:
+            # 数据本身有问题 (违反约束 / 类型不支持)：重试多少次都不会成功，改为逐条写入，把坏数据隔离出去
+            print(f"审计日志整批写入失败，改为逐条写入 ({len(batch)} 条): {e}")
+            return self._write_each(batch)
+        self._done(len(batch), elapsed=(time.time() - started) * 1000)
+        return True
+
+    def _write_each(self, batch):
+        while batch:
+            row = batch[0]
+            try:
+                try:
+                    db.write_audit_batch([row])
+                    rejected = 0
+                except sqlite3.OperationalError:
+                    raise
+                except Exception as e:
+                    db.write_audit_dead_letter(row, e)
+                    rejected = 1
+                    print(f"⚠️ 审计日志无法写入，已转入死信表 audit_dead_letter: {e}")
+            except sqlite3.OperationalError as e:
+                self._stats['failures'] += 1
+                print(f"写入审计日志失败 (将重试 {len(batch)} 条): {e}")
+                return False
+            batch.pop(0)
+            self._done(1, rejected)
+        return True
+
+    def _done(self, count, rejected=0, elapsed=None):
+        with self._idle:
+            self._unwritten -= count
+            self._stats['written'] += count - rejected
+            self._stats['rejected'] += rejected
+            if elapsed is not None:
+                self._stats['batches'] += 1
+                self._stats['last_flush_ms'] = round(elapsed, 2)
+                self._stats['max_flush_ms'] = round(max(self._stats['max_flush_ms'], elapsed), 2)
+                self._stats['total_flush_ms'] += elapsed
+            self._idle.notify_all()
+
+    def close(self, timeout=10):
+        """进程退出前调用：尽量写完队列；仍写不进数据库的日志落到暂存文件，不丢任何一条"""
+        if self._stopping:
+            return
+        self.flush(timeout)
+        self._stopping = True
+        self._thread.join(timeout=2)
+        leftover = list(self._pending)
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover and (self._thread.is_alive() or not self._write(leftover)):
+            with open(self.spool_file, 'a', encoding='utf-8') as f:
+                for row in leftover:
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            print(f"⚠️ 审计日志有 {len(leftover)} 条未能写入数据库，已暂存到 {self.spool_file}")
+
+    def _load_spool(self):
+        if not os.path.exists(self.spool_file):
+            return
+        with open(self.spool_file, encoding='utf-8') as f:
+            rows = [tuple(json.loads(line)) for line in f if line.strip()]
+        total = len(rows)
+        self._unwritten += total
+        if self._write(rows):
+            # 补写成功后才删除暂存文件
+            os.remove(self.spool_file)
+            print(f"📝 已补写上次未落库的 {total} 条审计日志")
+            return
+        # 只把还没写进去的行留在暂存文件里，下次启动再补
+        self._unwritten -= len(rows)
+        with open(self.spool_file, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        print(f"补写暂存审计日志失败，保留 {len(rows)} 条在 {self.spool_file} 待下次启动")
+
+    def stats(self):
+        with self._lock:
+            data = {k: v for k, v in self._stats.items() if k != 'total_flush_ms'}
+            data['queue_depth'] = self._unwritten
+            data['avg_flush_ms'] = round(self._stats['total_flush_ms'] / self._stats['batches'], 2) if self._stats['batches'] else 0.0
+        return data
+
+
+AUDIT = AuditWriter()
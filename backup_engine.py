@@ -0,0 +1,166 @@
+import time
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from switch_driver import H3CManager
+from device_scheduler import PRIORITY_BULK
+from async_driver import AsyncH3CManager, run_fleet, offload, OffloadWriter, FLEET_IO, FLEET_BACKEND, FALLBACK_ERRORS
+from backup_store import store_config_stream, reuse_snapshot, ObjectWriter, save_object
+import database as db
+
+# === 🗄️ 全网并发备份引擎 (手动一键备份 / 凌晨定时备份共用) ===
+
+BACKUP_MAX_WORKERS = 10        # 同时备份的设备数上限
+BACKUP_DEVICE_TIMEOUT = 300    # 单台设备拉取配置的超时秒数
+BACKUP_OWNER = '全网备份'        # 在设备调度器里排队时的提交者名称
+
+
+def safe_device_name(name):
+    # 为了防止文件名非法，清理一下名称
+    return name.replace('/', '_').replace('\\', '_').replace(' ', '_')
+
+
+def friendly_error(e):
+    error_msg = str(e)
+    if "Authentication failed" in error_msg or "Permission denied" in error_msg: error_msg = "认证失败(密码错误)"
+    elif "timed out" in error_msg: error_msg = "连接超时"
+    return error_msg
+
+
+def _probe(mgr):
+    # 探测只是优化：任何异常都回退到完整备份，真正的连接错误留给完整抓取去报告
+    try:
+        return mgr.probe_config_state()
+    except Exception:
+        return None
+
+
+def _new_result(sw, day):
+    filename = f"{safe_device_name(sw['name'])}_{sw['ip']}.cfg"
+    return {'name': sw['name'], 'ip': sw['ip'], 'filename': filename, 'day': day,
+            'skipped': False, 'avoided_bytes': 0, 'avoided_seconds': 0.0, 'queue_wait': 0.0}
+
+
+def _match_snapshot(sw, probe):
+    """返回 (本次要记录的指纹, 可直接复用的上一份备份)；运行配置有未保存的改动时不记指纹，下次仍走完整备份"""
+    fingerprint = probe['fingerprint'] if probe and probe['running_saved'] else None
+    previous = db.get_latest_backup(sw['ip']) if fingerprint else None
+    return fingerprint, (previous if previous and previous['probe'] == fingerprint else None)
+
+
+def _record_skipped(sw, day, previous, result):
+    reuse_snapshot(sw['ip'], sw['name'], day, previous)
+    result.update(status='success', error='', sha256=previous['sha256'], size=previous['size'],
+                  changed=False, new_blob=False, skipped=True, avoided_bytes=previous['size'],
+                  avoided_seconds=previous['transfer_seconds'] or 0.0)
+
+
+def _record_stored(stored, result):
+    result.update(status='success', error='', sha256=stored['sha256'], size=stored['size'],
+                  changed=stored['changed'], new_blob=stored['new_blob'])
+
+
+def backup_device(sw, backup_root, day, device_timeout=BACKUP_DEVICE_TIMEOUT, use_probe=True):
+    """备份单台设备，抓取完成后立即存入备份仓库 (内容没变只记一行索引)，返回该设备的结果与耗时
+    先做轻量探测：启动配置文件指纹与上次一致、且运行配置已全部保存时，跳过完整配置的传输"""
+    started = time.time()
+    result = _new_result(sw, day)
+    mgr = H3CManager(sw['ip'], sw['username'], sw['password'], sw['port'], priority=PRIORITY_BULK, owner=BACKUP_OWNER)
+    try:
+        fingerprint, previous = _match_snapshot(sw, _probe(mgr) if use_probe else None)
+        if previous:
+            _record_skipped(sw, day, previous, result)
+        else:
+            # 边读通道边规范化、压缩写盘，单台设备的内存占用与配置大小无关
+            stored = store_config_stream(sw['ip'], sw['name'],
+                                         lambda write: mgr.stream_full_config(write, read_timeout=device_timeout),
+                                         day, backup_root, probe=fingerprint, require_complete=True)
+            _record_stored(stored, result)
+    except Exception as e:
+        result.update(status='fail', error=friendly_error(e))
+    result.update(duration=round(time.time() - started, 2), queue_wait=round(mgr.queue_wait, 2))
+    return result
+
+
+async def _probe_async(mgr):
+    try:
+        return await mgr.probe_config_state()
+    except Exception:
+        # 登录都没成功就不必再试完整抓取，直接把错误报给调用方
+        if not mgr.connected:
+            raise
+        # 通道里可能还残留没读完的回显 / 提示符，直接接着抓配置会被提前截断：丢弃会话，完整抓取时重新登录 (同步版由连接池丢弃)
+        await mgr.reset()
+        return None
+
+
+async def backup_device_async(sw, backup_root, day, device_timeout=BACKUP_DEVICE_TIMEOUT, use_probe=True):
+    """backup_device 的异步版本，由 async_driver.run_fleet 在一个事件循环里并发调度
+    查库、压缩写盘、记索引都交给 FLEET_IO 线程，事件循环里只读设备"""
+    started = time.time()
+    result = _new_result(sw, day)
+    mgr = AsyncH3CManager(sw['ip'], sw['username'], sw['password'], sw['port'], owner=BACKUP_OWNER)
+    try:
+        async with mgr:
+            probe = await _probe_async(mgr) if use_probe else None
+            fingerprint, previous = await offload(_match_snapshot, sw, probe)
+            if previous:
+                await offload(_record_skipped, sw, day, previous, result)
+            else:
+                writer = await offload(ObjectWriter, backup_root, True)
+                batches = OffloadWriter(writer.write)
+                transfer_started = time.time()
+                try:
+                    await mgr.stream_full_config(batches.write, read_timeout=device_timeout)
+                    transfer_seconds = round(time.time() - transfer_started, 2)
+                    await batches.flush()
+                except BaseException:
+                    FLEET_IO.submit(writer.abort)    # 排在已提交的写入之后执行
+                    raise
+                stored = await offload(save_object, sw['ip'], sw['name'], day, writer, fingerprint, transfer_seconds)
+                _record_stored(stored, result)
+    except FALLBACK_ERRORS:
+        # 只支持旧算法的老设备：放到线程里用 netmiko 重试，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, backup_device, sw, backup_root, day, device_timeout, use_probe)
+    except Exception as e:
+        result.update(status='fail', error=friendly_error(e))
+    result.update(duration=round(time.time() - started, 2), queue_wait=round(mgr.queue_wait, 2))
+    return result
+
+
+def run_fleet_backup(switches, backup_root, max_workers=BACKUP_MAX_WORKERS,
+                     device_timeout=BACKUP_DEVICE_TIMEOUT, on_result=None, backend=None):
+    """并发备份全部设备；每完成一台回调一次 on_result(result)，总耗时取决于最慢的那台设备
+    backend='async' 时一个事件循环驱动全部会话 (默认，需要 asyncssh)，'thread' 时每台设备占一个线程"""
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+
+    started = time.time()
+    if (backend or FLEET_BACKEND) == 'async':
+        results = run_fleet(switches, lambda sw: backup_device_async(sw, backup_root, today, device_timeout),
+                            on_result=on_result)
+    else:
+        results = []
+        workers = max(1, min(max_workers, len(switches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup') as pool:
+            futures = [pool.submit(backup_device, sw, backup_root, today, device_timeout) for sw in switches]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+    success_count = sum(1 for r in results if r['status'] == 'success')
+    return {
+        'results': results,
+        'total': len(results),
+        'success': success_count,
+        'fail': len(results) - success_count,
+        'changed': sum(1 for r in results if r.get('changed')),
+        'new_blobs': sum(1 for r in results if r.get('new_blob')),
+        'skipped': sum(1 for r in results if r.get('skipped')),
+        'avoided_bytes': sum(r.get('avoided_bytes', 0) for r in results),
+        'avoided_seconds': round(sum(r.get('avoided_seconds', 0.0) for r in results), 2),
+        'day': today,
+        'duration': round(time.time() - started, 2),
+    }
@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+import time
+import gzip
+import hashlib
+import tempfile
+import database as db
+
+# === 📦 内容寻址的配置备份仓库：相同配置只存一份压缩文件，每台设备每天只记一行索引 ===
+# 文件布局: backups/objects/ab/abcdef....cfg.gz (文件名即规范化后配置的 sha256)
+
+BACKUP_OBJECTS_DIR = 'objects'
+CONFIG_END_LINE = 'return'     # 完整的 display current-configuration 以单独一行 return 结束
+
+# 每次抓取都会变化、但不代表配置变更的行 (时钟、运行时长、命令回显等)，计算摘要前去掉
+VOLATILE_LINE_PATTERNS = [
+    re.compile(r'^\s*display current-configuration'),
+    re.compile(r'^\s*[<\[][^>\]]+[>\]]\s*$'),            # 单独的提示符行 <H3C> / [H3C]
+    re.compile(r'uptime is', re.I),
+    re.compile(r'^\s*(Current time|Last configuration change|Last saved)', re.I),
+    re.compile(r'^\s*clock (datetime|timezone-time)', re.I),
+]
+
+
+class IncompleteConfigError(Exception):
+    """抓到的配置没有以 return 结束 (通道被提前截断 / 读到了残留的提示符)，不能当作有效备份保存"""
+
+
+class _LineNormalizer:
+    """逐块接收文本、按行规范化 (统一换行、去行尾空白、去易变行、去首尾空行)；只缓存一行未完成的尾巴"""
+    def __init__(self, emit):
+        self.emit = emit
+        self._carry = ''
+        self._blank = 0          # 暂存的空行数：后面还有内容才输出，保证去掉结尾空行
+        self._started = False
+        self.last_line = ''      # 最后输出的一行 (用于校验配置是否完整)
+
+    def feed(self, text):
+        text = self._carry + text
+        # 结尾的 '\r' 可能是被拆开的 '\r\n'，留到下一块再处理
+        keep = 1 if text.endswith('\r') else 0
+        lines = re.split(r'\r\n|\r|\n', text[:len(text) - keep])
+        self._carry = lines.pop() + text[len(text) - keep:]
+        for line in lines:
+            self._line(line)
+
+    def _line(self, line):
+        line = line.rstrip()
+        if any(p.search(line) for p in VOLATILE_LINE_PATTERNS):
+            return
+        if not line:
+            if self._started:
+                self._blank += 1
+            return
+        self.emit('\n' * self._blank + line + '\n')
+        self._blank, self._started = 0, True
+        self.last_line = line
+
+    def close(self):
+        if self._carry:
+            self._line(self._carry.rstrip('\r'))
+            self._carry = ''
+        if not self._started:
+            self.emit('\n')
+
+
+def normalize_config(text):
+    parts = []
+    normalizer = _LineNormalizer(parts.append)
+    normalizer.feed(text)
+    normalizer.close()
+    return ''.join(parts)
+
+
+def object_path(sha256, backup_root):
+    return os.path.join(backup_root, BACKUP_OBJECTS_DIR, sha256[:2], sha256 + '.cfg.gz')
+
+
+class ObjectWriter:
+    """流式写入一个备份对象：边规范化边算 sha256 边 gzip 压缩写临时文件，
+    结束时按摘要原子改名为对象文件 (对象已存在就丢弃临时文件)；内存占用与配置大小无关
+    require_complete=True 时配置必须以 return 结束，否则 commit 抛 IncompleteConfigError 并丢弃临时文件"""
+    def __init__(self, backup_root, require_complete=False):
+        self.backup_root = backup_root
+        self.require_complete = require_complete
+        objects_dir = os.path.join(backup_root, BACKUP_OBJECTS_DIR)
+        os.makedirs(objects_dir, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=objects_dir, suffix='.tmp')
+        self._raw = os.fdopen(fd, 'wb')
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode='wb', mtime=0)
+        self._sha = hashlib.sha256()
+        self._normalizer = _LineNormalizer(self._emit)
+        self.size = 0
+
+    def _emit(self, text):
+        data = text.encode('utf-8')
+        self._sha.update(data)
+        self._gz.write(data)
+        self.size += len(data)
+
+    def write(self, text):
+        self._normalizer.feed(text)
+
+    def commit(self):
+        """返回 (sha256, new_blob)"""
+        try:
+            self._normalizer.close()
+            if self.require_complete and self._normalizer.last_line.strip() != CONFIG_END_LINE:
+                raise IncompleteConfigError(f"配置回显不完整 (未以 {CONFIG_END_LINE} 结束)，本次备份未保存")
+            self._gz.close()
+            self._raw.close()
+            sha256 = self._sha.hexdigest()
+            path = object_path(sha256, self.backup_root)
+            if os.path.exists(path):
+                os.remove(self._tmp_path)
+                return sha256, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+            return sha256, True
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        # 抓取中途失败：关闭并删除临时文件，不留半截对象
+        for f in (self._gz, self._raw):
+            try:
+                f.close()
+            except Exception:
+                pass
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def store_config_stream(device_ip, device_name, produce, day, backup_root, probe=None, require_complete=False):
+    """produce(write) 把配置分块交给 write；写完后记一行 (设备, 日期) -> 对象 的索引
+    返回 {'sha256', 'size', 'new_blob', 'changed', 'transfer_seconds'}"""
+    writer = ObjectWriter(backup_root, require_complete)
+    started = time.time()
+    try:
+        produce(writer.write)
+    except BaseException:
+        writer.abort()
+        raise
+    return save_object(device_ip, device_name, day, writer, probe, round(time.time() - started, 2))
+
+
+def save_object(device_ip, device_name, day, writer, probe=None, transfer_seconds=None):
+    """写完的 ObjectWriter 落成对象并记索引 (异步驱动自己驱动 writer 时直接调用这里)"""
+    sha256, new_blob = writer.commit()
+    # 索引里的 changed 相对前一天；返回值的 changed 相对最近一次备份 (同一天重复备份时就是当天早些时候那份)
+    latest = db.get_latest_backup(device_ip)
+    previous_day = latest if latest is None or latest['day'] < day else db.get_latest_backup(device_ip, before_day=day)
+    db.save_backup_index(device_ip, device_name, day, sha256, writer.size,
+                         previous_day is None or previous_day['sha256'] != sha256, probe, transfer_seconds)
+    return {'sha256': sha256, 'size': writer.size, 'new_blob': new_blob,
+            'changed': latest is None or latest['sha256'] != sha256, 'transfer_seconds': transfer_seconds}
+
+
+def store_config(device_ip, device_name, config_text, day, backup_root, probe=None):
+    """已经拿到整份配置文本时使用 (如导入旧版备份)"""
+    return store_config_stream(device_ip, device_name, lambda write: write(config_text), day, backup_root, probe)
+
+
+def reuse_snapshot(device_ip, device_name, day, previous):
+    """探测确认配置未变更：当天的索引直接指向上一份备份对象，不传输、不哈希、不写文件"""
+    changed = bool(previous['changed']) if previous['day'] == day else False
+    db.save_backup_index(device_ip, device_name, day, previous['sha256'], previous['size'], changed,
+                         previous['probe'], previous['transfer_seconds'])
+
+
+def read_blob(sha256, backup_root):
+    with gzip.open(object_path(sha256, backup_root), 'rt', encoding='utf-8') as f:
+        return f.read()
+
+
+def load_config(device_ip, day, backup_root):
+    """按 (设备, 日期) 一次索引查找 + 一次解压取回配置；当天没有备份时返回 None"""
+    entry = db.get_backup_entry(device_ip, day)
+    if not entry:
+        return None
+    return read_blob(entry['sha256'], backup_root)
+
+
+def import_legacy_backups(backup_root):
+    """把旧版 backups/YYYY-MM-DD/名称_IP.cfg 文件导入仓库 (导入后原文件可以删除)"""
+    imported = 0
+    for day in sorted(os.listdir(backup_root)):
+        day_dir = os.path.join(backup_root, day)
+        if not re.match(r'^\d{4}-\d{2}-\d{2}$', day) or not os.path.isdir(day_dir):
+            continue
+        for filename in sorted(os.listdir(day_dir)):
+            if not filename.endswith('.cfg') or '_' not in filename:
+                continue
+            name, ip = filename[:-len('.cfg')].rsplit('_', 1)
+            with open(os.path.join(day_dir, filename), encoding='utf-8', errors='replace') as f:
+                store_config(ip, name, f.read(), day, backup_root)
+            imported += 1
+    return imported
+
+
+if __name__ == '__main__':
+    # python backup_store.py --import-legacy [backups]
+    if len(sys.argv) >= 2 and sys.argv[1] == '--import-legacy':
+        root = sys.argv[2] if len(sys.argv) > 2 else 'backups'
+        print(f"已导入 {import_legacy_backups(root)} 份旧版备份文件")
+    else:
+        print("用法: python backup_store.py --import-legacy [backups]")
@@ -0,0 +1,206 @@
+import re
+from functools import lru_cache
+
+# === 🧩 Comware 回显解析器：所有正则在模块加载时一次编译，按命令分表驱动 ===
+
+# 接口全名 -> 简写对照表；正则按长度倒序编译，保证 Ten-GigabitEthernet 先于 GigabitEthernet 匹配
+IFACE_ABBREVIATIONS = {
+    'Ten-GigabitEthernet': 'XGE',
+    'XGigabitEthernet': 'XGE',
+    'M-GigabitEthernet': 'MGE',
+    'GigabitEthernet': 'GE',
+    'Bridge-Aggregation': 'BAGG',
+}
+_IFACE_PREFIX_RE = re.compile('^(' + '|'.join(re.escape(k) for k in sorted(IFACE_ABBREVIATIONS, key=len, reverse=True)) + ')')
+
+# display interface brief 中需要展示的物理/聚合接口
+BRIEF_IFACE_PREFIXES = ('GE', 'XGE', 'Gigabit', 'MGE', 'Bridge', 'Ten-Gigabit', 'XGigabit')
+BRIEF_PORT_TYPES = {'A': 'Access', 'T': 'Trunk', 'H': 'Hybrid'}
+
+# display ip source binding 表格中端口列的特征前缀
+BINDING_PORT_PREFIXES = ('GE', 'XG', 'Gi', 'Te', 'BA')
+
+_MAC = r'[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}'
+_CFG_IP_RE = re.compile(r'ip-address\s+([\d\.]+)')
+_CFG_MAC_RE = re.compile(r'mac-address\s+([\w\-\.]+)')
+_CFG_VLAN_RE = re.compile(r'vlan\s+(\d+)')
+_IPV4_RE = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}$')
+_MAC_TOKEN_RE = re.compile(r'^' + _MAC + r'$')
+_ACL_RULE_RE = re.compile(r'^\s*rule\s+(\d+)\s+(permit|deny)\b(.*)$')
+_ACL_MAC_RE = re.compile(r'\bsource(?:-mac)?\s+(' + _MAC + r')')
+# MAC ADDR  VLAN ID  STATE (可能含空格，如 Config static)  PORT INDEX  AGING TIME
+_STARTUP_FILE_RE = re.compile(r'Current startup saved-configuration file:\s*(\S+)')
+# dir 输出: "   1 -rw-        8000 Oct 17 2026 10:20:31   startup.cfg"
+_DIR_ENTRY_RE = re.compile(r'^\s*\d+\s+[-a-z]+\s+(\d+)\s+(\w{3}\s+\d{1,2}\s+\d{4}\s+[\d:]+)\s+(\S+)\s*$')
+_MAC_ROW_RE = re.compile(r'^\s*(' + _MAC + r')\s+(\d+)\s+(.+?)\s+(\S+)\s+(\S+)\s*$')
+
+
+@lru_cache(maxsize=16384)
+def short_iface_name(name):
+    m = _IFACE_PREFIX_RE.match(name)
+    return IFACE_ABBREVIATIONS[m.group(1)] + name[m.end():] if m else name
+
+
+def format_mac(mac):
+    if not mac: return ""
+    clean_mac = mac.replace(":", "").replace("-", "").replace(".", "").lower()
+    if len(clean_mac) != 12: return mac
+    return f"{clean_mac[0:4]}-{clean_mac[4:8]}-{clean_mac[8:12]}"
+
+
+# --- display version ---
+def parse_version(output):
+    lines = output.splitlines()
+    for line in lines:
+        if "uptime is" in line:
+            return {'model': line.split("uptime is")[0].strip()}
+    for line in lines:
+        if "H3C" in line and "Software" not in line:
+            return {'model': line.strip()}
+    return {'model': "Unknown Model"}
+
+
+# --- display interface brief ---
+def parse_interface_brief(output):
+    """返回 {简写名: {'name', 'link', 'type', 'desc'}}，保持回显中的原始顺序"""
+    interfaces = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) >= 5 and parts[0].startswith(BRIEF_IFACE_PREFIXES):
+            short_name = short_iface_name(parts[0])
+            interfaces[short_name] = {
+                'name': short_name,
+                'link': parts[1],
+                'type': BRIEF_PORT_TYPES.get(parts[4], parts[4]),
+                'desc': '',
+            }
+    return interfaces
+
+
+# --- display current-configuration interface [X] ---
+def parse_interface_config(output):
+    """按 interface 块解析，返回 {简写名: {'name', 'description', 'vlan', 'strict_access', 'bindings'}}
+    bindings 中的 vlan 为行尾显式携带的 vlan (没有则为 None)"""
+    interfaces = {}
+    current = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith('interface '):
+            full_name = line.split(' ')[1]
+            current = {'name': full_name, 'description': '', 'vlan': '', 'strict_access': False, 'bindings': []}
+            interfaces[short_iface_name(full_name)] = current
+        elif current is None:
+            continue
+        elif line.startswith('port access vlan'):
+            parts = line.split()
+            if len(parts) >= 4: current['vlan'] = parts[3]
+        elif line.startswith('port trunk pvid vlan'):
+            parts = line.split()
+            if len(parts) >= 5: current['vlan'] = parts[4]
+        elif line.startswith('description'):
+            parts = line.split(maxsplit=1)
+            if len(parts) > 1: current['description'] = parts[1].strip()
+        elif line.startswith('ip verify source'):
+            current['strict_access'] = True
+        elif 'source binding' in line and 'ip-address' in line:
+            ip_match = _CFG_IP_RE.search(line)
+            mac_match = _CFG_MAC_RE.search(line)
+            if ip_match and mac_match:
+                vlan_inline_match = _CFG_VLAN_RE.search(line)
+                current['bindings'].append({
+                    'ip': ip_match.group(1),
+                    'mac': format_mac(mac_match.group(1)),
+                    'vlan': vlan_inline_match.group(1) if vlan_inline_match else None,
+                })
+        elif line == '#':
+            current = None
+    return interfaces
+
+
+# --- display ip source binding ---
+def parse_ip_source_binding(output):
+    """返回静态绑定表 [{'ip', 'mac', 'interface'(简写), 'vlan'}]"""
+    entries = []
+    for line in output.splitlines():
+        if 'Static' not in line:
+            continue
+        ip_val = mac_val = port_col = None
+        vlan_val = "Unknown"
+        for token in line.split():
+            if ip_val is None and _IPV4_RE.match(token):
+                ip_val = token
+            elif mac_val is None and _MAC_TOKEN_RE.match(token):
+                mac_val = token
+            elif port_col is None and token.startswith(BINDING_PORT_PREFIXES):
+                port_col = token
+            elif vlan_val == "Unknown" and token.isdigit() and len(token) <= 4:
+                vlan_val = token
+        if ip_val and mac_val:
+            entries.append({
+                'ip': ip_val,
+                'mac': format_mac(mac_val),
+                'interface': short_iface_name(port_col) if port_col else '',
+                'vlan': vlan_val,
+            })
+    return entries
+
+
+# --- display mac-address ---
+def parse_mac_address_table(output):
+    """返回 MAC 地址表 [{'mac', 'vlan', 'state', 'interface'(简写)}]"""
+    entries = []
+    for line in output.splitlines():
+        m = _MAC_ROW_RE.match(line)
+        if m:
+            entries.append({
+                'mac': format_mac(m.group(1)),
+                'vlan': m.group(2),
+                'state': m.group(3),
+                'interface': short_iface_name(m.group(4)),
+            })
+    return entries
+
+
+# --- display startup / dir <file> ---
+def parse_startup_file(output):
+    """当前启动配置文件路径 (如 flash:/startup.cfg)；未设置启动配置时返回 None"""
+    m = _STARTUP_FILE_RE.search(output)
+    return m.group(1) if m and m.group(1).upper() != 'NULL' else None
+
+
+def parse_dir_entry(output, filename):
+    """在 dir 输出中找到指定文件，返回 {'size', 'mtime'}"""
+    basename = filename.rsplit('/', 1)[-1]
+    for line in output.splitlines():
+        m = _DIR_ENTRY_RE.match(line)
+        if m and m.group(3) == basename:
+            return {'size': int(m.group(1)), 'mtime': ' '.join(m.group(2).split())}
+    return None
+
+
+# --- display acl <number> ---
+def parse_acl(output):
+    """解析 rule 行: rule 0 permit source-mac aaaa-bbbb-cccc ffff-ffff-ffff (兼容 V5 的 source 写法)"""
+    rules = []
+    for line in output.splitlines():
+        m = _ACL_RULE_RE.match(line)
+        if not m:
+            continue
+        mac_match = _ACL_MAC_RE.search(m.group(3))
+        rules.append({
+            'id': m.group(1),
+            'action': m.group(2),
+            'mac': format_mac(mac_match.group(1)) if mac_match else '',
+            'rule': m.group(3).strip(),
+        })
+    return rules
+
+
+def index_bindings(entries):
+    """把静态绑定表建成三张索引：按接口 / 按 IP / 按 MAC，每个键对应一组绑定记录"""
+    by_interface, by_ip, by_mac = {}, {}, {}
+    for entry in entries:
+        by_interface.setdefault(entry['interface'], []).append(entry)
+        by_ip.setdefault(entry['ip'], []).append(entry)
+        by_mac.setdefault(entry['mac'], []).append(entry)
+    return {'by_interface': by_interface, 'by_ip': by_ip, 'by_mac': by_mac}
@@ -1,188 +1,641 @@
-import sqlite3
-import os
-import datetime  # 新增这一行，用于获取当前时间
-from werkzeug.security import generate_password_hash, check_password_hash
-
-DB_NAME = 'net_assets.db'
-
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row  # 让结果像字典一样访问
-    return conn
-
-def init_db():
-    """初始化数据库：创建表和默认管理员"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    # 1. 创建用户表
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT UNIQUE NOT NULL,
-                  password_hash TEXT NOT NULL)''')
-    
-    # 2. 创建交换机资产表
-    c.execute('''CREATE TABLE IF NOT EXISTS switches
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  ip TEXT NOT NULL,
-                  port INTEGER DEFAULT 22,
-                  username TEXT,
-                  password TEXT,
-                  model TEXT,
-                  note TEXT)''')
-
-    # 🔥 3. 新增：创建操作审计日志表 (加入了 username 字段)
-    c.execute('''CREATE TABLE IF NOT EXISTS audit_logs
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  timestamp TEXT NOT NULL,
-                  username TEXT NOT NULL,
-                  client_ip TEXT NOT NULL,
-                  device_ip TEXT NOT NULL,
-                  action TEXT NOT NULL,
-                  details TEXT,
-                  status TEXT NOT NULL)''')
-    
-    # 4. 创建默认管理员账号: admin / admin888
-    default_user = 'admin'
-    default_pass = 'admin888'
-    
-    c.execute("SELECT * FROM users WHERE username = ?", (default_user,))
-    if not c.fetchone():
-        print(f"⚙️ 正在初始化默认管理员账号: {default_user}")
-        p_hash = generate_password_hash(default_pass)
-        c.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", 
-                  (default_user, p_hash))
-    
-    conn.commit()
-    conn.close()
-
-def init_db():
-    # ... (你原来的 init_db 代码) ...
-    pass
-
-# === 🚀 数据库平滑热升级 ===
-def upgrade_db():
-    conn = get_db()
-    cur = conn.cursor()
-    try:
-        # 尝试给现有的 switches 表增加 vendor 字段，默认值为 'h3c'
-        cur.execute("ALTER TABLE switches ADD COLUMN vendor TEXT DEFAULT 'h3c'")
-        conn.commit()
-        print("🚀 数据库升级成功：已成功添加 vendor(厂商) 字段！")
-    except Exception as e:
-        # 如果字段已经存在，会抛出异常，直接忽略即可
-        pass
-    conn.close()
-
-# 确保在文件最末尾依次调用它们
-init_db()
-upgrade_db()
-
-# === 🔥 新增：写入审计日志的通用函数 ===
-def log_operation(username, client_ip, device_ip, action, details, status):
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        cur.execute('''
-            INSERT INTO audit_logs (timestamp, username, client_ip, device_ip, action, details, status) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (timestamp, username, client_ip, device_ip, action, details, status))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"写入审计日志失败: {e}")
-
-# === 用户管理 ===
-def get_user_by_id(user_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    user = cur.fetchone()
-    conn.close()
-    return user
-
-def verify_user(username, password):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user = cur.fetchone()
-    conn.close()
-    if user and check_password_hash(user['password_hash'], password):
-        return user
-    return None
-
-def change_password(username, new_password):
-    conn = get_db()
-    cur = conn.cursor()
-    p_hash = generate_password_hash(new_password)
-    cur.execute("UPDATE users SET password_hash = ? WHERE username = ?", (p_hash, username))
-    conn.commit()
-    conn.close()
-
-# === 资产管理 ===
-def get_all_switches():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM switches ORDER BY id DESC")
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
-
-def add_switch(name, ip, port, username, password, vendor='h3c'):
-    conn = get_db()
-    cur = conn.cursor()
-    # 插入时带上 vendor
-    cur.execute("INSERT INTO switches (name, ip, port, username, password, vendor) VALUES (?, ?, ?, ?, ?, ?)",
-                (name, ip, port, username, password, vendor))
-    conn.commit()
-    conn.close()
-
-def delete_switch(switch_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM switches WHERE id=?", (switch_id,))
-    conn.commit()
-    conn.close()
-
-# 每次被引用时尝试初始化，确保表存在
-init_db()
-
-# === 操作审计日志管理 ===
-def get_audit_logs(limit=100):
-    conn = get_db()
-    cur = conn.cursor()
-    # 按 ID 倒序排列，最新的操作显示在最前面
-    cur.execute("SELECT * FROM audit_logs ORDER BY id DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
-	      
-# === 📊 数据看板统计 ===
-def get_dashboard_stats():
-    conn = get_db()
-    cur = conn.cursor()
-    
-    # 1. 设备总数
-    cur.execute("SELECT COUNT(*) FROM switches")
-    switch_count = cur.fetchone()[0]
-    
-    # 2. 今日操作次数
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    cur.execute("SELECT COUNT(*) FROM audit_logs WHERE timestamp LIKE ?", (today + '%',))
-    today_ops = cur.fetchone()[0]
-    
-    # 3. 最近一次定时自动备份的状态
-    cur.execute("SELECT status, timestamp, details FROM audit_logs WHERE action = '定时自动备份' ORDER BY id DESC LIMIT 1")
-    last_backup = cur.fetchone()
-    
-    conn.close()
-    
-    return {
-        'switch_count': switch_count,
-        'today_ops': today_ops,
-        'last_backup_status': last_backup['status'] if last_backup else '无记录',
-        'last_backup_time': last_backup['timestamp'] if last_backup else '等待今晚执行',
-        'last_backup_details': last_backup['details'] if last_backup else '系统尚未执行过自动备份'
-    }
\ No newline at end of file
+import sqlite3
+import json
+import os
+import threading
+import datetime  # 新增这一行，用于获取当前时间
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DB_NAME = 'net_assets.db'
+
+DB_BUSY_TIMEOUT = 10   # 写锁被占用时的等待秒数
+AUDIT_FTS_ENABLED = False   # 当前 SQLite 是否支持 FTS5 trigram 全文索引 (upgrade_db 中探测)
+
+# 🔌 每个线程持有一条长连接，不再每次调用都重新打开数据库文件
+_local = threading.local()
+
+def get_db():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row  # 让结果像字典一样访问
+        # WAL：读写互不阻塞；NORMAL 同步级别在 WAL 下仍保证数据库不损坏
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-8000")
+        _local.conn = conn
+    elif conn.in_transaction:
+        # 上一次调用中途出错没有提交，回滚掉，避免一直占着写锁
+        conn.rollback()
+    return conn
+
+def init_db():
+    """初始化数据库：创建表和默认管理员"""
+    conn = get_db()
+    c = conn.cursor()
+    
+    # 1. 创建用户表
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  username TEXT UNIQUE NOT NULL,
+                  password_hash TEXT NOT NULL)''')
+    
+    # 2. 创建交换机资产表
+    c.execute('''CREATE TABLE IF NOT EXISTS switches
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  name TEXT NOT NULL,
+                  ip TEXT NOT NULL,
+                  port INTEGER DEFAULT 22,
+                  username TEXT,
+                  password TEXT,
+                  model TEXT,
+                  note TEXT)''')
+
+    # 🔥 3. 新增：创建操作审计日志表 (加入了 username 字段)
+    c.execute('''CREATE TABLE IF NOT EXISTS audit_logs
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  timestamp TEXT NOT NULL,
+                  username TEXT NOT NULL,
+                  client_ip TEXT NOT NULL,
+                  device_ip TEXT NOT NULL,
+                  action TEXT NOT NULL,
+                  details TEXT,
+                  status TEXT NOT NULL)''')
+
+    # 📦 配置备份索引：(设备, 日期) -> 内容寻址的备份对象 sha256
+    c.execute('''CREATE TABLE IF NOT EXISTS backup_index
+                 (device_ip TEXT NOT NULL,
+                  day TEXT NOT NULL,
+                  device_name TEXT,
+                  sha256 TEXT NOT NULL,
+                  size INTEGER DEFAULT 0,
+                  changed INTEGER DEFAULT 1,
+                  probe TEXT,
+                  transfer_seconds REAL,
+                  stored_at TEXT NOT NULL,
+                  PRIMARY KEY (device_ip, day))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_backup_sha ON backup_index (sha256)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_backup_day ON backup_index (day)")
+    # 🔀 每晚备份后生成的全网配置变更报告 (JSON)
+    c.execute('''CREATE TABLE IF NOT EXISTS change_reports
+                 (day TEXT PRIMARY KEY,
+                  report TEXT NOT NULL,
+                  created_at TEXT NOT NULL)''')
+
+    # 📊 审计日志的增量计数器：每天的操作次数、每类动作的最近一条记录 (看板直接查这里，不扫日志表)
+    c.execute('''CREATE TABLE IF NOT EXISTS audit_daily_counts
+                 (day TEXT PRIMARY KEY,
+                  ops INTEGER NOT NULL DEFAULT 0)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS audit_last_action
+                 (action TEXT PRIMARY KEY,
+                  log_id INTEGER NOT NULL,
+                  timestamp TEXT NOT NULL,
+                  status TEXT NOT NULL,
+                  details TEXT)''')
+    # ☠️ 死信表：数据本身有问题、永远写不进 audit_logs 的审计日志原样存在这里，供人工排查
+    c.execute('''CREATE TABLE IF NOT EXISTS audit_dead_letter
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  row TEXT NOT NULL,
+                  error TEXT,
+                  created_at TEXT NOT NULL)''')
+
+    # 🧵 5. 后台任务表 (批量备份等长耗时任务) 及其事件流
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                 (id TEXT PRIMARY KEY,
+                  job_type TEXT NOT NULL,
+                  username TEXT NOT NULL,
+                  status TEXT NOT NULL,
+                  total INTEGER DEFAULT 0,
+                  success INTEGER DEFAULT 0,
+                  fail INTEGER DEFAULT 0,
+                  summary TEXT,
+                  created_at TEXT NOT NULL,
+                  finished_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS job_events
+                 (job_id TEXT NOT NULL,
+                  seq INTEGER NOT NULL,
+                  event TEXT NOT NULL,
+                  PRIMARY KEY (job_id, seq))''')
+
+    # 🔎 6. 全网 IP/MAC 定位索引：定时采集各设备的绑定表与 MAC 表，按设备整体替换
+    c.execute('''CREATE TABLE IF NOT EXISTS locator_devices
+                 (device_ip TEXT PRIMARY KEY,
+                  device_name TEXT,
+                  digest TEXT,
+                  status TEXT NOT NULL,
+                  error TEXT,
+                  entry_count INTEGER DEFAULT 0,
+                  harvested_at TEXT,
+                  changed_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS locator_entries
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  device_ip TEXT NOT NULL,
+                  interface TEXT NOT NULL,
+                  ip TEXT,
+                  mac TEXT NOT NULL,
+                  vlan TEXT,
+                  source TEXT NOT NULL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_locator_ip ON locator_entries (ip)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_locator_mac ON locator_entries (mac)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_locator_device ON locator_entries (device_ip)")
+    
+    # 📡 7. 设备在线状态缓存：后台巡检写入，资产列表直接读取，不在请求时登录设备
+    c.execute('''CREATE TABLE IF NOT EXISTS switch_health
+                 (ip TEXT PRIMARY KEY,
+                  state TEXT NOT NULL,
+                  tcp_ms REAL,
+                  ssh_ms REAL,
+                  hostname TEXT,
+                  model TEXT,
+                  error TEXT,
+                  checked_at TEXT,
+                  ssh_checked_at TEXT,
+                  changed_at TEXT)''')
+
+    # 4. 创建默认管理员账号: admin / admin888
+    default_user = 'admin'
+    default_pass = 'admin888'
+    
+    c.execute("SELECT * FROM users WHERE username = ?", (default_user,))
+    if not c.fetchone():
+        print(f"⚙️ 正在初始化默认管理员账号: {default_user}")
+        p_hash = generate_password_hash(default_pass)
+        c.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", 
+                  (default_user, p_hash))
+    
+    conn.commit()
+
+# === 🚀 数据库平滑热升级 ===
+def upgrade_db():
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        # 尝试给现有的 switches 表增加 vendor 字段，默认值为 'h3c'
+        cur.execute("ALTER TABLE switches ADD COLUMN vendor TEXT DEFAULT 'h3c'")
+        conn.commit()
+        print("🚀 数据库升级成功：已成功添加 vendor(厂商) 字段！")
+    except Exception as e:
+        # 如果字段已经存在，会抛出异常，直接忽略即可
+        pass
+
+    # 备份索引增加探测指纹 / 完整传输耗时 (用于跳过未变更设备的完整传输)
+    for column in ("probe TEXT", "transfer_seconds REAL"):
+        try:
+            cur.execute(f"ALTER TABLE backup_index ADD COLUMN {column}")
+            conn.commit()
+        except Exception:
+            pass
+
+    # 常用查询的索引：资产 IP 唯一 (历史数据里已有重复 IP 时退化为普通索引)、审计日志按时间 / 按动作倒查
+    try:
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_switches_ip ON switches (ip)")
+    except sqlite3.IntegrityError:
+        print("⚠️ switches 表中存在重复 IP，已创建普通索引，请尽快清理重复设备")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_switches_ip_dup ON switches (ip)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_logs (timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_action_id ON audit_logs (action, id)")
+    # 🗜️ 开启增量 vacuum (归档删除旧日志后可以逐步归还磁盘空间)；老库需要整体 VACUUM 一次才能生效
+    cur.execute("PRAGMA auto_vacuum")
+    if cur.fetchone()[0] != 2:
+        print("🗜️ 正在切换数据库为增量 vacuum 模式 (仅首次升级执行，数据量大时需要一点时间)...")
+        conn.commit()
+        cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cur.execute("VACUUM")
+
+    # 审计日志筛选 + 按 id 翻页用的组合索引
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_user_id ON audit_logs (username, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_device_id ON audit_logs (device_ip, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_status_id ON audit_logs (status, id)")
+
+    # 🔍 details 全文索引 (trigram 分词，端口 / IP / MAC / 中文子串都能查)；SQLite 不支持时退化为 LIKE
+    global AUDIT_FTS_ENABLED
+    try:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'audit_fts'")
+        existed = cur.fetchone() is not None
+        cur.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS audit_fts
+                       USING fts5(details, content='audit_logs', content_rowid='id', tokenize='trigram')''')
+        cur.execute('''CREATE TRIGGER IF NOT EXISTS audit_fts_ai AFTER INSERT ON audit_logs BEGIN
+                           INSERT INTO audit_fts (rowid, details) VALUES (new.id, new.details);
+                       END''')
+        cur.execute('''CREATE TRIGGER IF NOT EXISTS audit_fts_ad AFTER DELETE ON audit_logs BEGIN
+                           INSERT INTO audit_fts (audit_fts, rowid, details) VALUES ('delete', old.id, old.details);
+                       END''')
+        if not existed:
+            cur.execute("INSERT INTO audit_fts (audit_fts) VALUES ('rebuild')")
+        AUDIT_FTS_ENABLED = True
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 当前 SQLite 不支持 FTS5 trigram，审计日志关键词搜索将使用 LIKE: {e}")
+
+    # 计数器表为空而日志表已有数据 (老库首次升级)：从历史日志回填一次
+    cur.execute("SELECT COUNT(*) FROM audit_daily_counts")
+    if cur.fetchone()[0] == 0:
+        cur.execute('''INSERT INTO audit_daily_counts (day, ops)
+                       SELECT substr(timestamp, 1, 10), COUNT(*) FROM audit_logs GROUP BY substr(timestamp, 1, 10)''')
+        cur.execute('''INSERT OR REPLACE INTO audit_last_action (action, log_id, timestamp, status, details)
+                       SELECT a.action, a.id, a.timestamp, a.status, a.details FROM audit_logs a
+                       JOIN (SELECT action, MAX(id) AS id FROM audit_logs GROUP BY action) m ON m.id = a.id''')
+        if cur.rowcount > 0:
+            print("🚀 数据库升级成功：已从历史审计日志回填看板计数器！")
+    conn.commit()
+
+# 确保在文件最末尾依次调用它们
+init_db()
+upgrade_db()
+
+# === 🔥 新增：写入审计日志的通用函数 ===
+def log_operation(username, client_ip, device_ip, action, details, status):
+    try:
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        write_audit_batch([(timestamp, username, client_ip, device_ip, action, details, status)])
+    except Exception as e:
+        print(f"写入审计日志失败: {e}")
+
+def write_audit_batch(rows):
+    """在一个事务内写入多条审计日志并更新看板计数器；出错整体回滚并抛出，由调用方决定是否重试
+    rows: [(timestamp, username, client_ip, device_ip, action, details, status)]"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        for row in rows:
+            cur.execute('''
+                INSERT INTO audit_logs (timestamp, username, client_ip, device_ip, action, details, status) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', row)
+            log_id = cur.lastrowid   # 必须紧跟在 INSERT audit_logs 之后取，下面的计数器 upsert 会改写 lastrowid
+            timestamp, action, details, status = row[0], row[4], row[5], row[6]
+            # 📊 同一事务内更新看板计数器
+            cur.execute('''INSERT INTO audit_daily_counts (day, ops) VALUES (?, 1)
+                           ON CONFLICT(day) DO UPDATE SET ops = ops + 1''', (timestamp[:10],))
+            cur.execute('''INSERT OR REPLACE INTO audit_last_action (action, log_id, timestamp, status, details)
+                           VALUES (?, ?, ?, ?, ?)''', (action, log_id, timestamp, status, details))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def write_audit_dead_letter(row, error):
+    """写不进 audit_logs 的审计日志转存到死信表 (整行序列化为 JSON)"""
+    conn = get_db()
+    conn.execute("INSERT INTO audit_dead_letter (row, error, created_at) VALUES (?, ?, ?)",
+                 (json.dumps(list(row), ensure_ascii=False, default=str), str(error),
+                  datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    conn.commit()
+
+# === 用户管理 ===
+def get_user_by_id(user_id):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    user = cur.fetchone()
+    return user
+
+def verify_user(username, password):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM users WHERE username = ?", (username,))
+    user = cur.fetchone()
+    if user and check_password_hash(user['password_hash'], password):
+        return user
+    return None
+
+def change_password(username, new_password):
+    conn = get_db()
+    cur = conn.cursor()
+    p_hash = generate_password_hash(new_password)
+    cur.execute("UPDATE users SET password_hash = ? WHERE username = ?", (p_hash, username))
+    conn.commit()
+
+# === 资产管理 ===
+def get_all_switches():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM switches ORDER BY id DESC")
+    rows = cur.fetchall()
+    return [dict(row) for row in rows]
+
+def add_switch(name, ip, port, username, password, vendor='h3c'):
+    conn = get_db()
+    cur = conn.cursor()
+    # 插入时带上 vendor
+    cur.execute("INSERT INTO switches (name, ip, port, username, password, vendor) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, ip, port, username, password, vendor))
+    conn.commit()
+
+def delete_switch(switch_id):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM switches WHERE id=?", (switch_id,))
+    conn.commit()
+
+# 每次被引用时尝试初始化，确保表存在
+init_db()
+
+# === 操作审计日志管理 ===
+def get_audit_logs(limit=100, before_id=None, username=None, device_ip=None, action=None, status=None,
+                   start=None, end=None, keyword=None):
+    """按 id 倒序分页 (keyset)：before_id 为上一页最后一条的 id，每页代价只与页大小有关
+    start / end 为 'YYYY-MM-DD[ HH:MM:SS]' 字符串，闭区间"""
+    conn = get_db()
+    cur = conn.cursor()
+    where, params = [], []
+    for column, value in (('username', username), ('device_ip', device_ip), ('action', action), ('status', status)):
+        if value:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if before_id:
+        where.append("id < ?")
+        params.append(before_id)
+    if start:
+        where.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        where.append("timestamp <= ?")
+        params.append(end + ' 23:59:59' if len(end) == 10 else end)
+    if keyword:
+        if AUDIT_FTS_ENABLED and len(keyword) >= 3:
+            # 整体作为短语匹配，避免用户输入被当成 FTS 语法
+            where.append("id IN (SELECT rowid FROM audit_fts WHERE audit_fts MATCH ?)")
+            params.append('"' + keyword.replace('"', '""') + '"')
+        else:
+            where.append("details LIKE ?")
+            params.append(f"%{keyword}%")
+    sql = "SELECT * FROM audit_logs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # 按 ID 倒序排列，最新的操作显示在最前面
+    cur.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit])
+    rows = cur.fetchall()
+    return [dict(row) for row in rows]
+	      
+# === 🗜️ 审计日志归档：按 id 顺序分批取出超期记录，写入归档文件后再删除 ===
+def get_audit_logs_before(cutoff, after_id=0, limit=5000):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM audit_logs WHERE timestamp < ? AND id > ? ORDER BY id LIMIT ?", (cutoff, after_id, limit))
+    rows = cur.fetchall()
+    return [dict(row) for row in rows]
+
+def delete_audit_logs_before(cutoff, max_id):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM audit_logs WHERE timestamp < ? AND id <= ?", (cutoff, max_id))
+    deleted = cur.rowcount
+    conn.commit()
+    return deleted
+
+def get_oldest_audit_log():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT id, timestamp FROM audit_logs ORDER BY id LIMIT 1")
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+def incremental_vacuum(pages=0):
+    """归还空闲页给操作系统；pages 为 0 时归还全部"""
+    conn = get_db()
+    # 每 step 只释放一页，execute() 只会 step 一次；executescript 会一直执行到底
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});" if pages else "PRAGMA incremental_vacuum;")
+    # WAL 模式下文件截断发生在检查点，立即做一次，磁盘空间马上可见
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+# === 📊 数据看板统计 ===
+def get_dashboard_stats():
+    conn = get_db()
+    cur = conn.cursor()
+    
+    # 1. 设备总数
+    cur.execute("SELECT COUNT(*) FROM switches")
+    switch_count = cur.fetchone()[0]
+    
+    # 2. 今日操作次数 (按天累计的计数器，主键查找)
+    today = datetime.datetime.now().strftime('%Y-%m-%d')
+    cur.execute("SELECT ops FROM audit_daily_counts WHERE day = ?", (today,))
+    row = cur.fetchone()
+    today_ops = row['ops'] if row else 0
+    
+    # 3. 最近一次定时自动备份的状态
+    cur.execute("SELECT status, timestamp, details FROM audit_last_action WHERE action = '定时自动备份'")
+    last_backup = cur.fetchone()
+    
+    
+    return {
+        'switch_count': switch_count,
+        'today_ops': today_ops,
+        'last_backup_status': last_backup['status'] if last_backup else '无记录',
+        'last_backup_time': last_backup['timestamp'] if last_backup else '等待今晚执行',
+        'last_backup_details': last_backup['details'] if last_backup else '系统尚未执行过自动备份'
+    }
+
+# === 🧵 后台任务 (Job) 持久化 ===
+def create_job(job_id, job_type, username, total=0):
+    conn = get_db()
+    cur = conn.cursor()
+    created_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cur.execute("INSERT INTO jobs (id, job_type, username, status, total, created_at) VALUES (?, ?, ?, 'running', ?, ?)",
+                (job_id, job_type, username, total, created_at))
+    conn.commit()
+
+def finish_job(job_id, status, success, fail, summary):
+    conn = get_db()
+    cur = conn.cursor()
+    finished_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cur.execute("UPDATE jobs SET status = ?, success = ?, fail = ?, summary = ?, finished_at = ? WHERE id = ?",
+                (status, success, fail, summary, finished_at, job_id))
+    conn.commit()
+
+def add_job_event(job_id, seq, event_json):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)", (job_id, seq, event_json))
+    conn.commit()
+
+def get_job(job_id):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+def get_job_events(job_id, after_seq=0):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq))
+    rows = cur.fetchall()
+    return [(row['seq'], row['event']) for row in rows]
+
+def get_recent_jobs(limit=20):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+    rows = cur.fetchall()
+    return [dict(row) for row in rows]
+
+def mark_interrupted_jobs():
+    """服务重启后，上次未跑完的任务已随进程消失，统一标记为中断"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("UPDATE jobs SET status = 'interrupted' WHERE status = 'running'")
+    conn.commit()
+
+# === 🔎 全网 IP/MAC 定位索引 ===
+def get_locator_digests():
+    """返回 {device_ip: 上次采集内容的摘要}，用于判断设备数据是否变化"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT device_ip, digest FROM locator_devices")
+    rows = cur.fetchall()
+    return {row['device_ip']: row['digest'] for row in rows}
+
+def save_locator_device(device_ip, device_name, status, error='', digest=None, entries=None):
+    """记录一台设备的采集结果；entries 不为 None 时在同一事务内整体替换该设备的定位记录
+    entries: [(interface, ip, mac, vlan, source)]"""
+    conn = get_db()
+    cur = conn.cursor()
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if entries is not None:
+        cur.execute("DELETE FROM locator_entries WHERE device_ip = ?", (device_ip,))
+        cur.executemany("INSERT INTO locator_entries (device_ip, interface, ip, mac, vlan, source) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(device_ip,) + tuple(e) for e in entries])
+        cur.execute('''INSERT INTO locator_devices (device_ip, device_name, digest, status, error, entry_count, harvested_at, changed_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(device_ip) DO UPDATE SET device_name = excluded.device_name, digest = excluded.digest,
+                           status = excluded.status, error = excluded.error, entry_count = excluded.entry_count,
+                           harvested_at = excluded.harvested_at, changed_at = excluded.changed_at''',
+                    (device_ip, device_name, digest, status, error, len(entries), now, now))
+    else:
+        # 未变化或采集失败：保留旧记录，只刷新状态
+        cur.execute('''INSERT INTO locator_devices (device_ip, device_name, status, error, harvested_at)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT(device_ip) DO UPDATE SET device_name = excluded.device_name, status = excluded.status,
+                           error = excluded.error, harvested_at = excluded.harvested_at''',
+                    (device_ip, device_name, status, error, now))
+    conn.commit()
+
+def prune_locator_devices(keep_ips):
+    """删除已从资产库移除的设备的定位记录"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT device_ip FROM locator_devices")
+    stale = [row['device_ip'] for row in cur.fetchall() if row['device_ip'] not in keep_ips]
+    for device_ip in stale:
+        cur.execute("DELETE FROM locator_entries WHERE device_ip = ?", (device_ip,))
+        cur.execute("DELETE FROM locator_devices WHERE device_ip = ?", (device_ip,))
+    conn.commit()
+    return len(stale)
+
+def search_locator(ip=None, mac=None, limit=200):
+    """按 IP 或 MAC 精确查找 (走索引)，绑定表记录排在 MAC 表记录之前"""
+    conn = get_db()
+    cur = conn.cursor()
+    column, value = ('ip', ip) if ip else ('mac', mac)
+    cur.execute(f'''SELECT e.device_ip, d.device_name, e.interface, e.ip, e.mac, e.vlan, e.source, d.harvested_at, d.status
+                    FROM locator_entries e LEFT JOIN locator_devices d ON d.device_ip = e.device_ip
+                    WHERE e.{column} = ? ORDER BY e.source, e.device_ip, e.interface LIMIT ?''', (value, limit))
+    rows = cur.fetchall()
+    return [dict(row) for row in rows]
+
+def get_locator_status():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) AS devices, SUM(entry_count) AS entries, MAX(harvested_at) AS last_harvest, "
+                "SUM(CASE WHEN status != 'success' THEN 1 ELSE 0 END) AS failed FROM locator_devices")
+    row = cur.fetchone()
+    return dict(row)
+
+# === 📦 配置备份索引 ===
+def save_backup_index(device_ip, device_name, day, sha256, size, changed, probe=None, transfer_seconds=None):
+    """同一台设备同一天重复备份时覆盖当天的索引"""
+    conn = get_db()
+    cur = conn.cursor()
+    stored_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cur.execute('''INSERT OR REPLACE INTO backup_index (device_ip, day, device_name, sha256, size, changed, probe, transfer_seconds, stored_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (device_ip, day, device_name, sha256, size, int(changed), probe, transfer_seconds, stored_at))
+    conn.commit()
+
+def get_backup_entry(device_ip, day):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM backup_index WHERE device_ip = ? AND day = ?", (device_ip, day))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+def get_latest_backup(device_ip, before_day=None):
+    """设备最近一份备份 (before_day 不为空时取该日期之前的最近一份)"""
+    conn = get_db()
+    cur = conn.cursor()
+    if before_day:
+        cur.execute("SELECT * FROM backup_index WHERE device_ip = ? AND day < ? ORDER BY day DESC LIMIT 1", (device_ip, before_day))
+    else:
+        cur.execute("SELECT * FROM backup_index WHERE device_ip = ? ORDER BY day DESC LIMIT 1", (device_ip,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+def get_backup_history(device_ip, limit=90):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM backup_index WHERE device_ip = ? ORDER BY day DESC LIMIT ?", (device_ip, limit))
+    rows = cur.fetchall()
+    return [dict(row) for row in rows]
+
+def get_backups_for_day(day):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM backup_index WHERE day = ? ORDER BY device_ip", (day,))
+    rows = cur.fetchall()
+    return [dict(row) for row in rows]
+
+# === 🔀 全网配置变更报告 ===
+def save_change_report(day, report_json):
+    conn = get_db()
+    cur = conn.cursor()
+    created_at = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cur.execute("INSERT OR REPLACE INTO change_reports (day, report, created_at) VALUES (?, ?, ?)", (day, report_json, created_at))
+    conn.commit()
+
+def get_change_report(day=None):
+    """day 为空时返回最近一份报告；返回的是入库时的 JSON 文本 (未解析)，没有报告时返回 None"""
+    conn = get_db()
+    cur = conn.cursor()
+    if day:
+        cur.execute("SELECT report FROM change_reports WHERE day = ?", (day,))
+    else:
+        cur.execute("SELECT report FROM change_reports ORDER BY day DESC LIMIT 1")
+    row = cur.fetchone()
+    return row['report'] if row else None
+
+# === 📡 设备在线状态 ===
+def get_health_map():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM switch_health")
+    return {row['ip']: dict(row) for row in cur.fetchall()}
+
+def save_health_batch(rows):
+    """一轮巡检的结果在一个事务里整体写入；rows: [dict]，字段同 switch_health 表"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.executemany('''INSERT OR REPLACE INTO switch_health
+                       (ip, state, tcp_ms, ssh_ms, hostname, model, error, checked_at, ssh_checked_at, changed_at)
+                       VALUES (:ip, :state, :tcp_ms, :ssh_ms, :hostname, :model, :error, :checked_at, :ssh_checked_at, :changed_at)''',
+                    rows)
+    conn.commit()
+
+def prune_health(keep_ips):
+    """删除已从资产库移除的设备的状态记录"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT ip FROM switch_health")
+    stale = [(row['ip'],) for row in cur.fetchall() if row['ip'] not in keep_ips]
+    cur.executemany("DELETE FROM switch_health WHERE ip = ?", stale)
+    conn.commit()
+    return len(stale)
+
+def get_switches_with_health():
+    """资产列表 + 最近一次巡检结果 (尚未巡检过的设备 health_state 为 None)"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute('''SELECT s.*, h.state AS health_state, h.tcp_ms, h.ssh_ms, h.hostname, h.model AS health_model,
+                          h.error AS health_error, h.checked_at AS health_checked_at, h.changed_at AS health_changed_at
+                   FROM switches s LEFT JOIN switch_health h ON h.ip = s.ip ORDER BY s.id DESC''')
+    return [dict(row) for row in cur.fetchall()]
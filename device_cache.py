@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# === 🧊 设备状态缓存：接口列表 / 端口详情 / ACL 的解析结果 ===
+# TTL 过期 + LRU 淘汰 (按条目数和估算内存双重上限)，任何写操作都会失效对应条目
+# 缓存未命中时经 READ_FLIGHTS 合并并发的相同读取，同一时刻只有一个请求真正登录设备
+
+DEVICE_CACHE_TTL = 60                    # 缓存有效期 (秒)
+DEVICE_CACHE_MAX_ENTRIES = 2000          # 最多缓存条目数
+DEVICE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 估算内存上限
+
+
+def _estimate_size(value):
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except Exception:
+        return 1024
+
+
+class DeviceStateCache:
+    def __init__(self, ttl=DEVICE_CACHE_TTL, max_entries=DEVICE_CACHE_MAX_ENTRIES, max_bytes=DEVICE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._data = OrderedDict()   # (device, kind, arg) -> (stored_at, size, value, ttl)
+        self._bytes = 0
+        self._generations = {}       # device -> 写操作计数，防止读写并发时把旧数据写回缓存
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """返回 (命中?, 值, 缓存年龄秒数)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats['misses'] += 1
+                return False, None, None
+            stored_at, size, value, ttl = item
+            age = time.time() - stored_at
+            if age > ttl:
+                self._drop(key)
+                self._stats['misses'] += 1
+                return False, None, None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, value, age
+
+    def generation(self, device):
+        with self._lock:
+            return self._generations.get(device, 0)
+
+    def set(self, key, value, generation=None, ttl=None):
+        """generation 为读取开始前拿到的设备代数；期间发生过写操作则放弃写入。ttl 为空时使用默认有效期"""
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and self._generations.get(key[0], 0) != generation:
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.time(), size, value, ttl or self.ttl)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self._stats['evictions'] += 1
+
+    def _drop(self, key):
+        size = self._data.pop(key)[1]
+        self._bytes -= size
+
+    def invalidate(self, device, kind=None, arg=None):
+        """失效某台设备的缓存；kind / arg 为空时表示该设备的全部条目"""
+        with self._lock:
+            self._generations[device] = self._generations.get(device, 0) + 1
+            for key in [k for k in self._data
+                        if k[0] == device and (kind is None or k[1] == kind) and (arg is None or k[2] == arg)]:
+                self._drop(key)
+                self._stats['invalidations'] += 1
+
+    def entries(self, kind):
+        """返回所有设备上某类未过期条目 [(device, arg, value, age)]，不计入命中统计、不调整 LRU 顺序"""
+        now = time.time()
+        with self._lock:
+            return [(key[0], key[2], value, now - stored_at)
+                    for key, (stored_at, _, value, ttl) in self._data.items()
+                    if key[1] == kind and now - stored_at <= ttl]
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['entries'] = len(self._data)
+            data['bytes'] = self._bytes
+            lookups = data['hits'] + data['misses']
+            data['hit_rate'] = round(data['hits'] / lookups, 3) if lookups else 0.0
+        return data
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """相同的设备读取同一时刻只真正执行一次：后到的请求 (其他标签页 / 其他用户) 等待并共享先到者的解析结果，
+    不再各自登录设备执行同样的 display 命令。按线程阻塞等待，适用于 waitress / Flask 的多线程模型"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}           # key -> _Flight (正在执行中的读取)
+        self._stats = {'device_calls': 0, 'avoided_calls': 0}
+
+    def do(self, key, fn):
+        """返回 (值, 是否共享了别人的结果)；执行者抛出的异常同样抛给所有等待者"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['device_calls'] += 1
+            else:
+                self._stats['avoided_calls'] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+        try:
+            flight.value = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, False
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['in_flight'] = len(self._flights)
+        return data
+
+
+DEVICE_CACHE = DeviceStateCache()
+READ_FLIGHTS = SingleFlight()
@@ -0,0 +1,184 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# === 🚦 设备会话调度器：所有 SSH 会话 (页面操作 / Excel 批量 / 全网备份 / 采集 / 巡检) 先在这里排队领名额 ===
+# 单台设备同时在用的会话数不超过 MAX_SESSIONS_PER_DEVICE (Comware VTY 线路有限)，全网同时在用的不超过 MAX_FLEET_SESSIONS；
+# 页面上的交互操作优先于后台批量任务，同一优先级内按提交者 (用户 / 任务) 轮转，一个大任务排再多也不会饿死别人
+# ssh_pool 里的空闲会话也算在单台设备的上限里：异步驱动领到名额、登录之前会先断开多出来的空闲会话 (见 ssh_pool.evict_idle)
+
+PRIORITY_INTERACTIVE = 0       # 页面上的单台设备操作
+PRIORITY_BULK = 1              # Excel 批量下发、全网备份、定位采集、在线巡检
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+MAX_SESSIONS_PER_DEVICE = 2    # 单台设备最多同时占用的 VTY 会话数
+MAX_FLEET_SESSIONS = 128       # 全网同时在用的 SSH 会话数上限
+QUEUE_TIMEOUT = {PRIORITY_INTERACTIVE: 60, PRIORITY_BULK: 600}   # 排队等待的最长秒数
+WAIT_SAMPLES = 1000            # 每个优先级保留最近多少次排队耗时，用于计算 p95
+
+
+class _Ticket:
+    __slots__ = ('device', 'priority', 'owner', 'enqueued_at', 'wait_seconds', 'granted', 'notify')
+
+    def __init__(self, device, priority, owner, notify):
+        self.device = device
+        self.priority = priority
+        self.owner = owner
+        self.enqueued_at = time.perf_counter()
+        self.wait_seconds = 0.0
+        self.granted = False
+        self.notify = notify
+
+
+class DeviceScheduler:
+    def __init__(self, max_per_device=MAX_SESSIONS_PER_DEVICE, max_total=MAX_FLEET_SESSIONS,
+                 queue_timeout=QUEUE_TIMEOUT):
+        self.max_per_device = max_per_device
+        self.max_total = max_total
+        self.queue_timeout = dict(queue_timeout)
+        self._lock = threading.Lock()
+        self._active = {}          # device -> 在用会话数
+        self._active_total = 0
+        self._waiting = {p: OrderedDict() for p in PRIORITY_NAMES}   # priority -> {owner: deque[ticket]} (按轮转顺序)
+        self._stats = {p: {'granted': 0, 'queued': 0, 'timeouts': 0, 'wait_total': 0.0, 'wait_max': 0.0,
+                           'samples': deque(maxlen=WAIT_SAMPLES)} for p in PRIORITY_NAMES}
+
+    # === 🧮 排队与派发 (都在 self._lock 内执行) ===
+    def _enqueue(self, ticket):
+        with self._lock:
+            self._waiting[ticket.priority].setdefault(ticket.owner, deque()).append(ticket)
+            granted = self._dispatch()
+        for t in granted:
+            t.notify()
+
+    def _dispatch(self):
+        """按优先级从高到低、同优先级内按提交者轮转派发名额；某台设备满了只挡住它自己的请求，不挡别的设备"""
+        granted = []
+        for priority, owners in self._waiting.items():
+            while owners and self._active_total < self.max_total:
+                ticket = None
+                for owner, queue in owners.items():
+                    ticket = next((t for t in queue if self._active.get(t.device, 0) < self.max_per_device), None)
+                    if ticket is not None:
+                        break
+                if ticket is None:
+                    break
+                queue.remove(ticket)
+                if queue:
+                    owners.move_to_end(owner)     # 刚拿到名额的提交者排到本轮最后
+                else:
+                    del owners[owner]
+                self._grant(ticket)
+                granted.append(ticket)
+        return granted
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        ticket.wait_seconds = time.perf_counter() - ticket.enqueued_at
+        self._active[ticket.device] = self._active.get(ticket.device, 0) + 1
+        self._active_total += 1
+        stats = self._stats[ticket.priority]
+        stats['granted'] += 1
+        stats['wait_total'] += ticket.wait_seconds
+        stats['wait_max'] = max(stats['wait_max'], ticket.wait_seconds)
+        stats['samples'].append(ticket.wait_seconds)
+        if ticket.wait_seconds > 0.001:
+            stats['queued'] += 1
+
+    def _cancel(self, ticket, timed_out=True):
+        """等待超时 / 被取消：还没拿到名额就移出队列并返回 True；恰好已经拿到名额时返回 False (调用方负责归还)"""
+        with self._lock:
+            if ticket.granted:
+                return False
+            owners = self._waiting[ticket.priority]
+            owners[ticket.owner].remove(ticket)
+            if not owners[ticket.owner]:
+                del owners[ticket.owner]
+            if timed_out:
+                self._stats[ticket.priority]['timeouts'] += 1
+            return True
+
+    def _timeout_error(self, ticket):
+        return TimeoutError(f"设备 {ticket.device[0]} 的 SSH 会话排队超时 ({self.queue_timeout[ticket.priority]}s)，"
+                            f"设备或全网会话数已达上限")
+
+    # === 🎫 领取 / 归还名额 ===
+    def acquire(self, device, priority=PRIORITY_INTERACTIVE, owner=None):
+        """阻塞直到拿到名额，返回票据 (ticket.wait_seconds 为排队耗时)；超时抛 TimeoutError"""
+        event = threading.Event()
+        ticket = _Ticket(device, priority, owner or '-', event.set)
+        self._enqueue(ticket)
+        if not event.wait(self.queue_timeout[priority]) and self._cancel(ticket):
+            raise self._timeout_error(ticket)
+        return ticket
+
+    async def acquire_async(self, device, priority=PRIORITY_BULK, owner=None):
+        """acquire 的协程版本：排队期间不占线程，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            if not future.done():
+                future.set_result(None)
+
+        ticket = _Ticket(device, priority, owner or '-', lambda: loop.call_soon_threadsafe(wake))
+        self._enqueue(ticket)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout[priority])
+        except asyncio.TimeoutError:
+            if self._cancel(ticket):
+                raise self._timeout_error(ticket) from None
+        except asyncio.CancelledError:
+            if not self._cancel(ticket, timed_out=False):
+                self.release(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket):
+        with self._lock:
+            count = self._active[ticket.device] - 1
+            if count:
+                self._active[ticket.device] = count
+            else:
+                del self._active[ticket.device]
+            self._active_total -= 1
+            granted = self._dispatch()
+        for t in granted:
+            t.notify()
+
+    def active_sessions(self, device):
+        """某台设备当前已发出的名额数"""
+        with self._lock:
+            return self._active.get(device, 0)
+
+    @contextmanager
+    def slot(self, device, priority=PRIORITY_INTERACTIVE, owner=None):
+        ticket = self.acquire(device, priority, owner)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self._lock:
+            data = {'active_sessions': self._active_total, 'active_devices': len(self._active),
+                    'max_per_device': self.max_per_device, 'max_total': self.max_total}
+            for priority, name in PRIORITY_NAMES.items():
+                stats = self._stats[priority]
+                samples = sorted(stats['samples'])
+                data[name] = {
+                    'waiting': sum(len(q) for q in self._waiting[priority].values()),
+                    'granted': stats['granted'],
+                    'queued': stats['queued'],
+                    'timeouts': stats['timeouts'],
+                    'wait_avg_ms': round(stats['wait_total'] / stats['granted'] * 1000, 1) if stats['granted'] else 0.0,
+                    'wait_p95_ms': round(samples[int(0.95 * (len(samples) - 1))] * 1000, 1) if samples else 0.0,
+                    'wait_max_ms': round(stats['wait_max'] * 1000, 1),
+                }
+        return data
+
+
+# 全局共享调度器：H3CManager / AsyncH3CManager 开会话前都要经过它
+SCHEDULER = DeviceScheduler()
@@ -0,0 +1,138 @@
+import time
+import asyncio
+import datetime
+import threading
+from switch_driver import H3CManager
+from device_scheduler import PRIORITY_BULK
+from async_driver import AsyncH3CManager, ASYNC_AVAILABLE, FALLBACK_ERRORS
+from backup_engine import friendly_error
+import database as db
+
+# === 📡 全网在线巡检：先 TCP 探测 SSH 端口，只在状态变化 / 慢周期到期时才 SSH 登录核对，结果缓存到数据库 ===
+
+HEALTH_POLL_SECONDS = 60       # TCP 巡检间隔 (秒)
+HEALTH_SSH_MINUTES = 30        # 状态没有变化时，SSH 登录核对的间隔 (分钟)
+HEALTH_TCP_TIMEOUT = 3         # TCP 连接 + 读取 SSH 版本标识的超时 (秒)
+HEALTH_MAX_PROBES = 200        # 同时进行的 TCP 探测数
+HEALTH_MAX_SSH = 20            # 同时进行的 SSH 核对数 (会占用设备 VTY，不宜过多)
+HEALTH_OWNER = '在线巡检'       # 在设备调度器里排队时的提交者名称
+
+# 定时巡检与页面 "立即巡检" 共用一把锁：同一时刻只跑一轮，不会互相覆盖对方写入的快照
+HEALTH_LOCK = threading.Lock()
+
+STATE_UP = 'up'                # TCP 通 + SSH 登录正常
+STATE_SSH_FAIL = 'ssh_fail'    # TCP 通，但 SSH 登录 / 命令失败 (密码错误、VTY 占满等)
+STATE_DOWN = 'down'            # SSH 端口不通
+
+
+def _now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+async def _tcp_probe(ip, port, timeout=HEALTH_TCP_TIMEOUT):
+    """连上 SSH 端口并读到 'SSH-' 版本标识即视为可达，返回 (耗时 ms, 错误)；不做密钥交换，不占 VTY"""
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        banner = await asyncio.wait_for(reader.readline(), timeout)
+    except asyncio.TimeoutError:
+        return None, "连接超时"
+    except ConnectionRefusedError:
+        return None, "SSH 端口拒绝连接"
+    except OSError as e:
+        return None, e.strerror or str(e)
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), timeout)
+            except (OSError, asyncio.TimeoutError):
+                pass
+    if not banner.startswith(b'SSH-'):
+        return None, "端口已开放，但不是 SSH 服务"
+    return round((time.perf_counter() - started) * 1000, 1), ''
+
+
+async def _ssh_identity(sw):
+    """登录并执行 display version，返回 ({'hostname', 'model'}, 耗时 ms)"""
+    started = time.perf_counter()
+    identity = None
+    if ASYNC_AVAILABLE:
+        try:
+            async with AsyncH3CManager(sw['ip'], sw['username'], sw['password'], sw['port'], owner=HEALTH_OWNER) as mgr:
+                identity = await mgr.get_device_identity()
+        except FALLBACK_ERRORS:
+            pass
+    if identity is None:
+        mgr = H3CManager(sw['ip'], sw['username'], sw['password'], sw['port'], priority=PRIORITY_BULK, owner=HEALTH_OWNER)
+        identity = await asyncio.get_running_loop().run_in_executor(None, mgr.get_device_identity)
+    return identity, round((time.perf_counter() - started) * 1000, 1)
+
+
+def _ssh_due(previous, force):
+    if force or previous is None or previous['state'] == STATE_DOWN or not previous['ssh_checked_at']:
+        return True
+    last = datetime.datetime.strptime(previous['ssh_checked_at'], '%Y-%m-%d %H:%M:%S')
+    return datetime.datetime.now() - last >= datetime.timedelta(minutes=HEALTH_SSH_MINUTES)
+
+
+async def _check_device(sw, previous, force_ssh, tcp_slots, ssh_slots):
+    prev = previous or {}
+    row = {'ip': sw['ip'], 'state': prev.get('state'), 'tcp_ms': None, 'ssh_ms': prev.get('ssh_ms'),
+           'hostname': prev.get('hostname'), 'model': prev.get('model'), 'error': prev.get('error') or '',
+           'checked_at': _now(), 'ssh_checked_at': prev.get('ssh_checked_at'), 'ssh_checked': False}
+
+    async with tcp_slots:
+        row['tcp_ms'], tcp_error = await _tcp_probe(sw['ip'], sw['port'])
+    if row['tcp_ms'] is None:
+        # 端口不通：不再尝试登录，保留上次登录获得的设备名 / 型号
+        row.update(state=STATE_DOWN, error=tcp_error)
+    elif _ssh_due(previous, force_ssh):
+        async with ssh_slots:
+            try:
+                identity, row['ssh_ms'] = await _ssh_identity(sw)
+                row.update(state=STATE_UP, error='', **identity)
+            except Exception as e:
+                row.update(state=STATE_SSH_FAIL, error=friendly_error(e))
+        row.update(ssh_checked_at=_now(), ssh_checked=True)
+
+    row['changed_at'] = row['checked_at'] if row['state'] != prev.get('state') else prev.get('changed_at')
+    return row
+
+
+def poll_fleet(switches=None, force_ssh=False, wait=True):
+    """巡检全部设备一轮 (一个事件循环内并发)，一个事务写入结果；force_ssh=True 时每台都 SSH 核对一次
+    已有一轮在跑时：wait=True 等它结束再跑，wait=False 直接返回 None"""
+    if not HEALTH_LOCK.acquire(blocking=wait):
+        return None
+    try:
+        return _poll_fleet(switches, force_ssh)
+    finally:
+        HEALTH_LOCK.release()
+
+
+def _poll_fleet(switches, force_ssh):
+    started = time.time()
+    switches = db.get_all_switches() if switches is None else switches
+    previous = db.get_health_map()
+    db.prune_health({sw['ip'] for sw in switches})
+
+    async def run_all():
+        tcp_slots, ssh_slots = asyncio.Semaphore(HEALTH_MAX_PROBES), asyncio.Semaphore(HEALTH_MAX_SSH)
+        return await asyncio.gather(*(_check_device(sw, previous.get(sw['ip']), force_ssh, tcp_slots, ssh_slots)
+                                      for sw in switches))
+
+    rows = asyncio.run(run_all()) if switches else []
+    changes = [(sw, previous.get(sw['ip'], {}).get('state'), row['state'])
+               for sw, row in zip(switches, rows) if row['state'] != previous.get(sw['ip'], {}).get('state')]
+    db.save_health_batch([{k: v for k, v in row.items() if k != 'ssh_checked'} for row in rows])
+    return {
+        'total': len(rows),
+        'up': sum(1 for r in rows if r['state'] == STATE_UP),
+        'ssh_fail': sum(1 for r in rows if r['state'] == STATE_SSH_FAIL),
+        'down': sum(1 for r in rows if r['state'] == STATE_DOWN),
+        'ssh_checked': sum(1 for r in rows if r['ssh_checked']),
+        'changes': [{'name': sw['name'], 'ip': sw['ip'], 'from': old, 'to': new} for sw, old, new in changes],
+        'duration': round(time.time() - started, 2),
+    }
@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+import uuid
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import database as db
+
+# === 🧵 后台任务引擎：提交即返回 job_id，事件实时推送给任意多个观察者 ===
+
+JOB_MAX_WORKERS = 3           # 同时运行的全网后台任务数 (备份 / 定位采集 / 在线巡检 各按 dedupe_key 最多一个)
+JOB_INTERACTIVE_WORKERS = 2   # 同时运行的交互任务数 (Excel 批量部署 / 批量 ACL)，单独一个线程池，不被全网任务挤占
+JOB_KEEP_IN_MEMORY = 50       # 内存中保留的已结束任务数 (更早的从数据库回放)
+STREAM_HEARTBEAT = 15         # SSE 心跳间隔 (秒)
+
+
+class Job:
+    def __init__(self, job_id, job_type, username, dedupe_key=None):
+        self.id = job_id
+        self.job_type = job_type
+        self.username = username
+        self.dedupe_key = dedupe_key
+        self.status = 'running'
+        self.events = []          # [(seq, event_dict)]
+        self.cond = threading.Condition()
+        self.done = threading.Event()
+
+    def emit(self, event):
+        with self.cond:
+            seq = len(self.events) + 1
+            event = dict(event, ts=time.strftime('%H:%M:%S'))
+            self.events.append((seq, event))
+            self.cond.notify_all()
+        try:
+            db.add_job_event(self.id, seq, json.dumps(event, ensure_ascii=False))
+        except Exception as e:
+            print(f"写入任务事件失败: {e}")
+
+    def finish(self, status):
+        with self.cond:
+            self.status = status
+            self.cond.notify_all()
+        self.done.set()
+
+
+class JobManager:
+    def __init__(self, max_workers=JOB_MAX_WORKERS, interactive_workers=JOB_INTERACTIVE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._interactive_executor = ThreadPoolExecutor(max_workers=interactive_workers, thread_name_prefix='job-ui')
+        self._lock = threading.Lock()
+        self._jobs = {}           # job_id -> Job (按提交顺序)
+        db.mark_interrupted_jobs()
+
+    def submit(self, job_type, username, func, total=0, dedupe_key=None, interactive=False):
+        """提交后台任务，func(job) 负责通过 job.emit() 推送事件并返回 (status, success, fail, summary)。
+        同一 dedupe_key 的任务正在运行时直接返回已有任务，不重复消耗设备资源。
+        interactive=True 的任务 (页面上操作员发起、等着看结果的) 走单独的线程池，不排在全网备份 / 采集后面。"""
+        with self._lock:
+            if dedupe_key:
+                for job in self._jobs.values():
+                    if job.dedupe_key == dedupe_key and job.status == 'running':
+                        return job, False
+            job = Job(uuid.uuid4().hex[:12], job_type, username, dedupe_key)
+            self._jobs[job.id] = job
+            self._trim()
+        db.create_job(job.id, job_type, username, total)
+        executor = self._interactive_executor if interactive else self._executor
+        executor.submit(self._run, job, func)
+        return job, True
+
+    def _trim(self):
+        finished = [jid for jid, job in self._jobs.items() if job.status != 'running']
+        for jid in finished[:max(0, len(finished) - JOB_KEEP_IN_MEMORY)]:
+            del self._jobs[jid]
+
+    def _run(self, job, func):
+        try:
+            status, success, fail, summary = func(job)
+        except Exception as e:
+            traceback.print_exc()
+            status, success, fail, summary = 'failed', 0, 0, f"任务异常终止: {e}"
+            job.emit({'type': 'error', 'msg': summary})
+        db.finish_job(job.id, status, success, fail, summary)
+        job.emit({'type': 'end', 'status': status, 'summary': summary})
+        job.finish(status)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        job = self.get(job_id)
+        if job:
+            job.done.wait(timeout)
+
+    def iter_events(self, job_id, after_seq=0):
+        """依次产出 (seq, event_json)；任务运行中则阻塞等待新事件，期间周期性产出 (None, None) 作为心跳"""
+        job = self.get(job_id)
+        if job is None:
+            # 不在内存中 (已过期或服务重启过)：直接从数据库回放
+            for seq, event_json in db.get_job_events(job_id, after_seq):
+                yield seq, event_json
+            return
+        while True:
+            with job.cond:
+                pending = job.events[after_seq:]
+                if not pending and job.status == 'running':
+                    job.cond.wait(STREAM_HEARTBEAT)
+                    pending = job.events[after_seq:]
+                finished = job.status != 'running'
+            if not pending:
+                if finished:
+                    return
+                yield None, None
+                continue
+            for seq, event in pending:
+                yield seq, json.dumps(event, ensure_ascii=False)
+            after_seq = pending[-1][0]
+            if finished and after_seq >= len(job.events):
+                return
+
+
+JOBS = JobManager()
@@ -0,0 +1,101 @@
+import json
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from switch_driver import H3CManager
+from device_scheduler import PRIORITY_BULK
+from async_driver import AsyncH3CManager, run_fleet, offload, FLEET_BACKEND, FALLBACK_ERRORS
+from backup_engine import friendly_error
+import database as db
+
+# === 🔎 全网 IP/MAC 定位：定时并发采集绑定表与 MAC 表，落库后按索引秒查 ===
+
+LOCATOR_MAX_WORKERS = 10        # 同时采集的设备数上限
+LOCATOR_HARVEST_MINUTES = 15    # 定时采集间隔 (分钟)
+LOCATOR_OWNER = '定位采集'        # 在设备调度器里排队时的提交者名称
+
+
+def _save_harvest(sw, index, mac_table, known_digest, result):
+    entries = [(e['interface'], e['ip'], e['mac'], e['vlan'], 'binding')
+               for items in index['by_interface'].values() for e in items]
+    entries += [(e['interface'], '', e['mac'], e['vlan'], 'mac') for e in mac_table]
+    entries.sort()
+    digest = hashlib.sha1(json.dumps(entries).encode('utf-8')).hexdigest()
+
+    if digest == known_digest:
+        db.save_locator_device(sw['ip'], sw['name'], 'success')
+    else:
+        db.save_locator_device(sw['ip'], sw['name'], 'success', digest=digest, entries=entries)
+        result['changed'] = True
+    result.update(status='success', error='', entries=len(entries))
+
+
+def _harvest_failed(sw, e, result):
+    result.update(status='fail', error=friendly_error(e))
+    # 采集失败时保留上一次的定位记录，仅标记状态
+    db.save_locator_device(sw['ip'], sw['name'], 'fail', error=result['error'])
+
+
+def harvest_device(sw, known_digest=None):
+    """采集单台设备；内容摘要与上次一致时不改动数据库中的定位记录"""
+    started = time.time()
+    result = {'name': sw['name'], 'ip': sw['ip'], 'changed': False, 'entries': 0}
+    mgr = H3CManager(sw['ip'], sw['username'], sw['password'], sw['port'], priority=PRIORITY_BULK, owner=LOCATOR_OWNER)
+    try:
+        # 强制刷新绑定表索引，顺带更新内存缓存，端口查询也能直接用上
+        index = mgr.get_binding_index(use_cache=False)
+        _save_harvest(sw, index, mgr.get_mac_table(), known_digest, result)
+    except Exception as e:
+        _harvest_failed(sw, e, result)
+    result.update(duration=round(time.time() - started, 2), queue_wait=round(mgr.queue_wait, 2))
+    return result
+
+
+async def harvest_device_async(sw, known_digest=None):
+    """harvest_device 的异步版本 (绑定表索引同样写回内存缓存)；落库交给 FLEET_IO 线程，不卡事件循环"""
+    started = time.time()
+    result = {'name': sw['name'], 'ip': sw['ip'], 'changed': False, 'entries': 0}
+    mgr = AsyncH3CManager(sw['ip'], sw['username'], sw['password'], sw['port'], owner=LOCATOR_OWNER)
+    try:
+        async with mgr:
+            index = await mgr.get_binding_index(use_cache=False)
+            mac_table = await mgr.get_mac_table()
+        await offload(_save_harvest, sw, index, mac_table, known_digest, result)
+    except FALLBACK_ERRORS:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, harvest_device, sw, known_digest)
+    except Exception as e:
+        await offload(_harvest_failed, sw, e, result)
+    result.update(duration=round(time.time() - started, 2), queue_wait=round(mgr.queue_wait, 2))
+    return result
+
+
+def run_fleet_harvest(switches, max_workers=LOCATOR_MAX_WORKERS, on_result=None, backend=None):
+    """并发采集全部设备，只替换内容有变化的设备的记录 (backend 同 run_fleet_backup)"""
+    started = time.time()
+    digests = db.get_locator_digests()
+    db.prune_locator_devices({sw['ip'] for sw in switches})
+
+    if (backend or FLEET_BACKEND) == 'async':
+        results = run_fleet(switches, lambda sw: harvest_device_async(sw, digests.get(sw['ip'])), on_result=on_result)
+    else:
+        results = []
+        workers = max(1, min(max_workers, len(switches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='harvest') as pool:
+            futures = [pool.submit(harvest_device, sw, digests.get(sw['ip'])) for sw in switches]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+    success_count = sum(1 for r in results if r['status'] == 'success')
+    return {
+        'results': results,
+        'total': len(results),
+        'success': success_count,
+        'fail': len(results) - success_count,
+        'changed': sum(1 for r in results if r['changed']),
+        'duration': round(time.time() - started, 2),
+    }
@@ -1,7 +1,7 @@
-from waitress import serve
-from app import app  # 导入你的 Flask app 对象
-
-if __name__ == '__main__':
-    print("服务已启动: http://0.0.0.0:8080")
-    # threads=4 表示允许4个人同时操作，避免卡顿
-    serve(app, host='0.0.0.0', port=8080, threads=4)
\ No newline at end of file
+from waitress import serve
+from app import app  # 导入你的 Flask app 对象
+
+if __name__ == '__main__':
+    print("服务已启动: http://0.0.0.0:8080")
+    # 批量备份等长任务已移到后台线程执行；实时进度推送 (SSE) 会为每个观察者占用一个线程，适当放宽线程数
+    serve(app, host='0.0.0.0', port=8080, threads=16)
\ No newline at end of file
@@ -0,0 +1,151 @@
+import threading
+import time
+from contextlib import contextmanager
+from netmiko import ConnectHandler
+
+# === 🔌 SSH 长连接池 ===
+# 按 (ip, port, username) 复用已登录的 netmiko 会话，避免每次操作都重新握手 + 探测提示符 (3~6 秒)
+# 单台设备 / 全网同时在用的会话数由 device_scheduler 统一限制，借会话前先在那里排队
+# 空闲会话虽然不占调度名额，但仍然占着设备的 VTY 线路：不经连接池直接登录的异步驱动在登录前调用 evict_idle，
+# 先断开多出来的空闲会话，保证 "在用 + 空闲" 不超过 MAX_SESSIONS_PER_DEVICE
+
+DEFAULT_IDLE_TIMEOUT = 120            # 空闲会话超过该秒数后自动断开
+
+
+class SSHConnectionPool:
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}    # key -> [(conn, last_used), ...]
+        self._stats = {'created': 0, 'reused': 0, 'reconnected': 0, 'discarded': 0, 'expired': 0, 'evicted': 0}
+
+    @staticmethod
+    def make_key(device_info):
+        return (device_info['ip'], int(device_info.get('port', 22)), device_info['username'])
+
+    def _close(self, conn):
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        # 复用前重新探测提示符，确认会话仍然可用且已回到用户视图
+        try:
+            if not conn.is_alive():
+                return False
+            prompt = conn.find_prompt()
+            if prompt.endswith(']'):
+                conn.exit_config_mode()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self, key, device_info):
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                item = idle.pop() if idle else None
+            if item is None:
+                break
+            conn, last_used = item
+            if time.time() - last_used > self.idle_timeout:
+                self._close(conn)
+                self._bump('expired')
+                continue
+            if self._is_healthy(conn):
+                self._bump('reused')
+                return conn
+            # 会话已失效 (设备重启 / VTY 被踢)，自动重连
+            self._close(conn)
+            self._bump('reconnected')
+        conn = ConnectHandler(**device_info)
+        self._bump('created')
+        return conn
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            self._idle.setdefault(key, []).append((conn, time.time()))
+
+    def _bump(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    @contextmanager
+    def session(self, device_info):
+        """借出一个已登录的会话，用完自动归还；执行中抛异常则直接丢弃该会话"""
+        key = self.make_key(device_info)
+        conn = None
+        try:
+            conn = self._checkout(key, device_info)
+            yield conn
+        except BaseException:
+            if conn is not None:
+                self._close(conn)
+                self._bump('discarded')
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(key, conn)
+
+    def reap_idle(self):
+        """断开所有空闲超时的会话 (由后台调度器定期调用)"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for key, idle in list(self._idle.items()):
+                keep = []
+                for conn, last_used in idle:
+                    if now - last_used > self.idle_timeout:
+                        expired.append(conn)
+                    else:
+                        keep.append((conn, last_used))
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+            self._stats['expired'] += len(expired)
+        for conn in expired:
+            self._close(conn)
+        return len(expired)
+
+    def idle_sessions(self, device):
+        """某台设备 (ip, port) 在池里的空闲会话数 (不区分登录用户名)"""
+        with self._lock:
+            return sum(len(idle) for key, idle in self._idle.items() if key[:2] == device)
+
+    def evict_idle(self, device, keep=0):
+        """断开某台设备 (ip, port) 多出来的空闲会话，最多保留 keep 个 (优先断开最久没用的)，返回断开的个数"""
+        with self._lock:
+            idle = sorted(((last_used, key, conn) for key, items in self._idle.items() if key[:2] == device
+                           for conn, last_used in items), key=lambda item: item[0])
+            evicted = idle[:max(0, len(idle) - keep)]
+            for _, key, conn in evicted:
+                items = [item for item in self._idle[key] if item[0] is not conn]
+                if items:
+                    self._idle[key] = items
+                else:
+                    del self._idle[key]
+            self._stats['evicted'] += len(evicted)
+        for _, _, conn in evicted:
+            self._close(conn)
+        return len(evicted)
+
+    def close_all(self):
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn, _ in idle]
+            self._idle.clear()
+        for conn in conns:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['idle_sessions'] = sum(len(idle) for idle in self._idle.values())
+            data['devices'] = len(self._idle)
+        return data
+
+
+# 全局共享连接池：Flask 路由与定时备份任务共用
+POOL = SSHConnectionPool()
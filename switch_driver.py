@@ -1,380 +1,511 @@
-import re
-import time
-from netmiko import ConnectHandler
-
-class H3CManager:
-    def __init__(self, ip, username, password, port=22):
-        self.device_info = {
-            'device_type': 'hp_comware',
-            'ip': ip,
-            'username': username,
-            'password': password,
-            'port': port,
-            'global_delay_factor': 2, # 增加延时防止超时
-        }
-
-    def _get_connection(self):
-        return ConnectHandler(**self.device_info)
-    
-    def format_mac(self, mac):
-        if not mac: return ""
-        clean_mac = mac.replace(":", "").replace("-", "").replace(".", "").lower()
-        if len(clean_mac) != 12: return mac 
-        return f"{clean_mac[0:4]}-{clean_mac[4:8]}-{clean_mac[8:12]}"
-
-    def get_device_info(self):
-        conn = self._get_connection()
-        prompt = conn.find_prompt()
-        hostname = prompt.replace('<', '').replace('>', '').replace('[', '').replace(']', '').strip()
-        version_out = conn.send_command("display version")
-        conn.disconnect()
-        
-        model = "Unknown Model"
-        for line in version_out.split('\n'):
-            if "uptime is" in line:
-                model = line.split("uptime is")[0].strip()
-                break
-        
-        if model == "Unknown Model":
-            for line in version_out.split('\n'):
-                if "H3C" in line and "Software" not in line:
-                    model = line.strip()
-                    break
-                    
-        return f"✅ 连接成功！\n设备名称: {hostname}\n设备型号: {model}"
-
-# === 🛠️ 终极修复版：获取接口列表 (解决 XGE 描述丢失问题) ===
-    def get_interface_list(self):
-        conn = self._get_connection()
-        brief_out = conn.send_command("display interface brief")
-        config_out = conn.send_command("display current-configuration interface")
-        conn.disconnect()
-
-        interfaces = []
-        
-        # 1. 解析 brief 获取接口名、状态 (UP/DOWN)、模式 (Access/Trunk)
-        for line in brief_out.split('\n'):
-            parts = line.split()
-            if len(parts) >= 5:
-                name = parts[0]
-                if name.startswith(('GE', 'XGE', 'Gigabit', 'MGE', 'Bridge', 'Ten-Gigabit', 'XGigabit')):
-                    # 🔥 修复：先替换长的 (Ten-GigabitEthernet)，再替换短的 (GigabitEthernet)
-                    short_name = name.replace('Ten-GigabitEthernet', 'XGE')\
-                                     .replace('XGigabitEthernet', 'XGE')\
-                                     .replace('M-GigabitEthernet', 'MGE')\
-                                     .replace('GigabitEthernet', 'GE')\
-                                     .replace('Bridge-Aggregation', 'BAGG')
-                    
-                    link_status = parts[1] 
-                    port_type_raw = parts[4] 
-                    port_type = "Access" if port_type_raw == 'A' else "Trunk" if port_type_raw == 'T' else "Hybrid" if port_type_raw == 'H' else port_type_raw
-                    
-                    interfaces.append({
-                        'name': short_name, 
-                        'desc': '', 
-                        'link': link_status, 
-                        'type': port_type
-                    })
-        
-        # 2. 解析 config 获取 description
-        current_iface = None
-        for line in config_out.split('\n'):
-            line = line.strip()
-            if line.startswith('interface '):
-                full_name = line.split(' ')[1]
-                # 🔥 修复：保持正确的替换顺序
-                current_iface = full_name.replace('Ten-GigabitEthernet', 'XGE')\
-                                         .replace('XGigabitEthernet', 'XGE')\
-                                         .replace('M-GigabitEthernet', 'MGE')\
-                                         .replace('GigabitEthernet', 'GE')\
-                                         .replace('Bridge-Aggregation', 'BAGG')
-            elif line.startswith('description ') and current_iface:
-                desc_text = line.replace('description ', '').strip()
-                for iface in interfaces:
-                    if iface['name'] == current_iface:
-                        iface['desc'] = desc_text
-                        break
-        
-        # 3. 格式化输出
-        result = []
-        for iface in interfaces:
-            display_text = f"[{iface['link']}] [{iface['type']}] {iface['name']}"
-            if iface['desc']:
-                display_text += f" ({iface['desc']})"
-            result.append({'value': iface['name'], 'text': display_text})
-            
-        return result
-
-# === 🛠️ 智能特征识别版：获取端口详情 ===
-    def get_port_info(self, interface_name):
-        conn = self._get_connection()
-        output_iface = conn.send_command(f"display current-configuration interface {interface_name}")
-        output_global = conn.send_command("display ip source binding")
-        conn.disconnect()
-
-        vlan = ""
-        description = ""
-        bindings = []
-        
-        # 🔥 核心修复：预扫描接口特征。如果存在 ip verify source，证明这是 Access 严格模式
-        is_strict_access = 'ip verify source' in output_iface
-
-        # 1. 解析接口配置
-        for line in output_iface.split('\n'):
-            line = line.strip()
-            
-            # 获取端口的默认 VLAN / PVID
-            if line.startswith('port access vlan'):
-                parts = line.split()
-                if len(parts) >= 4: vlan = parts[3]
-            elif line.startswith('port trunk pvid vlan'):
-                parts = line.split()
-                if len(parts) >= 5: vlan = parts[4]
-                
-            elif line.startswith('description'):
-                parts = line.split(maxsplit=1)
-                if len(parts) > 1: description = parts[1].strip()
-            
-            # 解析接口下的绑定记录
-            if 'source binding' in line and 'ip-address' in line:
-                ip_match = re.search(r'ip-address\s+([\d\.]+)', line)
-                mac_match = re.search(r'mac-address\s+([\w\-\.]+)', line)
-                
-                # 尝试提取行尾的 vlan 参数
-                vlan_inline_match = re.search(r'vlan\s+(\d+)', line)
-
-                if ip_match and mac_match:
-                    # 无论是否有尾巴，优先使用尾巴上的 vlan，否则使用端口默认 vlan
-                    bind_vlan = vlan_inline_match.group(1) if vlan_inline_match else vlan
-                    
-                    # 🔥 核心修复：根据接口的物理特征来打标签，不再被 vlan 尾巴误导
-                    bind_mode = 'access' if is_strict_access else 'trunk'
-
-                    bindings.append({
-                        'ip': ip_match.group(1), 
-                        'mac': self.format_mac(mac_match.group(1)),
-                        'mode': bind_mode,
-                        'vlan': bind_vlan
-                    })
-
-        # 2. 兼容解析可能残留的全局配置 (防御性代码保留)
-        target_iface_short = interface_name.replace('Ten-GigabitEthernet', 'XGE')\
-                                           .replace('XGigabitEthernet', 'XGE')\
-                                           .replace('M-GigabitEthernet', 'MGE')\
-                                           .replace('GigabitEthernet', 'GE')
-
-        for line in output_global.split('\n'):
-            if 'Static' in line:
-                parts = line.split()
-                port_col = next((p for p in parts if p.startswith(('GE', 'XG', 'Gi', 'Te', 'BA'))), "")
-                port_col_short = port_col.replace('Ten-GigabitEthernet', 'XGE')\
-                                         .replace('XGigabitEthernet', 'XGE')\
-                                         .replace('M-GigabitEthernet', 'MGE')\
-                                         .replace('GigabitEthernet', 'GE')
-                
-                if port_col_short == target_iface_short:
-                    ip_val = next((p for p in parts if p.count('.') == 3), "Unknown")
-                    mac_val = next((p for p in parts if '-' in p and len(p) >= 12), "Unknown")
-                    vlan_val = next((p for p in parts if p.isdigit() and len(p) <= 4), "Unknown")
-                    
-                    if ip_val != "Unknown" and mac_val != "Unknown":
-                        if not any(b['ip'] == ip_val for b in bindings):
-                            bindings.append({
-                                'ip': ip_val,
-                                'mac': self.format_mac(mac_val),
-                                'mode': 'trunk',
-                                'vlan': vlan_val
-                            })
-
-        return {'vlan': vlan, 'bindings': bindings, 'description': description}, output_iface + "\n\n[Global Bindings]\n" + output_global# === 🛠️ 智能特征识别版：获取端口详情 ===
-    def get_port_info(self, interface_name):
-        conn = self._get_connection()
-        output_iface = conn.send_command(f"display current-configuration interface {interface_name}")
-        output_global = conn.send_command("display ip source binding")
-        conn.disconnect()
-
-        vlan = ""
-        description = ""
-        bindings = []
-        
-        # 🔥 核心修复：预扫描接口特征。如果存在 ip verify source，证明这是 Access 严格模式
-        is_strict_access = 'ip verify source' in output_iface
-
-        # 1. 解析接口配置
-        for line in output_iface.split('\n'):
-            line = line.strip()
-            
-            # 获取端口的默认 VLAN / PVID
-            if line.startswith('port access vlan'):
-                parts = line.split()
-                if len(parts) >= 4: vlan = parts[3]
-            elif line.startswith('port trunk pvid vlan'):
-                parts = line.split()
-                if len(parts) >= 5: vlan = parts[4]
-                
-            elif line.startswith('description'):
-                parts = line.split(maxsplit=1)
-                if len(parts) > 1: description = parts[1].strip()
-            
-            # 解析接口下的绑定记录
-            if 'source binding' in line and 'ip-address' in line:
-                ip_match = re.search(r'ip-address\s+([\d\.]+)', line)
-                mac_match = re.search(r'mac-address\s+([\w\-\.]+)', line)
-                
-                # 尝试提取行尾的 vlan 参数
-                vlan_inline_match = re.search(r'vlan\s+(\d+)', line)
-
-                if ip_match and mac_match:
-                    # 无论是否有尾巴，优先使用尾巴上的 vlan，否则使用端口默认 vlan
-                    bind_vlan = vlan_inline_match.group(1) if vlan_inline_match else vlan
-                    
-                    # 🔥 核心修复：根据接口的物理特征来打标签，不再被 vlan 尾巴误导
-                    bind_mode = 'access' if is_strict_access else 'trunk'
-
-                    bindings.append({
-                        'ip': ip_match.group(1), 
-                        'mac': self.format_mac(mac_match.group(1)),
-                        'mode': bind_mode,
-                        'vlan': bind_vlan
-                    })
-
-        # 2. 兼容解析可能残留的全局配置 (防御性代码保留)
-        target_iface_short = interface_name.replace('Ten-GigabitEthernet', 'XGE')\
-                                           .replace('XGigabitEthernet', 'XGE')\
-                                           .replace('M-GigabitEthernet', 'MGE')\
-                                           .replace('GigabitEthernet', 'GE')
-
-        for line in output_global.split('\n'):
-            if 'Static' in line:
-                parts = line.split()
-                port_col = next((p for p in parts if p.startswith(('GE', 'XG', 'Gi', 'Te', 'BA'))), "")
-                port_col_short = port_col.replace('Ten-GigabitEthernet', 'XGE')\
-                                         .replace('XGigabitEthernet', 'XGE')\
-                                         .replace('M-GigabitEthernet', 'MGE')\
-                                         .replace('GigabitEthernet', 'GE')
-                
-                if port_col_short == target_iface_short:
-                    ip_val = next((p for p in parts if p.count('.') == 3), "Unknown")
-                    mac_val = next((p for p in parts if '-' in p and len(p) >= 12), "Unknown")
-                    vlan_val = next((p for p in parts if p.isdigit() and len(p) <= 4), "Unknown")
-                    
-                    if ip_val != "Unknown" and mac_val != "Unknown":
-                        if not any(b['ip'] == ip_val for b in bindings):
-                            bindings.append({
-                                'ip': ip_val,
-                                'mac': self.format_mac(mac_val),
-                                'mode': 'trunk',
-                                'vlan': vlan_val
-                            })
-
-        return {'vlan': vlan, 'bindings': bindings, 'description': description}, output_iface + "\n\n[Global Bindings]\n" + output_global
-		
-# === 🛠️ 终极完美版：配置绑定 (极致安全与精简) ===
-    def configure_port_binding(self, interface_name, vlan_id, bind_ip, bind_mac, mode="access"):
-        conn = self._get_connection()
-        if mode == "access":
-            cmds = [
-                f"interface {interface_name}",
-                "stp edged-port",
-                f"port access vlan {vlan_id}",
-                "ip verify source ip-address mac-address",
-                # Access 模式：纯净绑定，不带 vlan 标。利用底层隐式 PVID 继承，既防 IP 伪造，又防 ARP 欺骗
-                f"ip source binding ip-address {bind_ip} mac-address {self.format_mac(bind_mac)}"
-            ]
-        else: 
-            # Trunk 混合模式：带 vlan 标，依赖业务 VLAN 下的 ARP Detection
-            cmds = [
-                f"interface {interface_name}",
-                f"ip source binding ip-address {bind_ip} mac-address {self.format_mac(bind_mac)} vlan {vlan_id}",
-                "quit",
-                f"vlan {vlan_id}",
-                "arp detection enable"
-            ]
-            
-        output = conn.send_config_set(cmds)
-        conn.save_config()
-        conn.disconnect()
-        return output
-
-    # === 🛠️ 终极完美版：删除绑定 (不留死角) ===
-    def delete_port_binding(self, interface_name, del_ip, del_mac, mode="access", vlan_id=None):
-        conn = self._get_connection()
-        
-        if mode == "access":
-            cmds = [
-                f"interface {interface_name}",
-                # Access 模式解绑：干净利落
-                f"undo ip source binding ip-address {del_ip} mac-address {self.format_mac(del_mac)}"
-            ]
-        else:
-            cmds = [
-                f"interface {interface_name}",
-                # Trunk 模式解绑：精准匹配 vlan 标
-                f"undo ip source binding ip-address {del_ip} mac-address {self.format_mac(del_mac)} vlan {vlan_id}"
-            ]
-            
-        output = conn.send_config_set(cmds)
-        conn.save_config()
-        conn.disconnect()
-        return output
-
-    def get_acl_rules(self, acl_number=4000):
-        conn = self._get_connection()
-        output = conn.send_command(f"display acl {acl_number}")
-        conn.disconnect()
-        
-        rules = []
-        # 解析规则: rule 0 permit source aaaa-bbbb-cccc ffff-ffff-ffff
-        for line in output.split('\n'):
-            if line.strip().startswith('rule'):
-                parts = line.split()
-                try:
-                    rule_id = parts[1]
-                    action = parts[2]
-                    mac = parts[4] # 简单假设 mac 在第5个位置
-                    rules.append({'id': rule_id, 'action': action, 'mac': self.format_mac(mac)})
-                except:
-                    pass
-        return rules
-
-    def add_acl_mac(self, mac, rule_id=None, acl_number=4000):
-        cmd = f"rule {rule_id} permit" if rule_id else "rule permit"
-        cmd += f" source {self.format_mac(mac)} ffff-ffff-ffff"
-        
-        config_cmds = [
-            f"acl mac {acl_number}",
-            cmd
-        ]
-        conn = self._get_connection()
-        output = conn.send_config_set(config_cmds)
-        conn.save_config()
-        conn.disconnect()
-        return output
-
-    def delete_acl_rule(self, rule_id, acl_number=4000):
-        config_cmds = [
-            f"acl mac {acl_number}",
-            f"undo rule {rule_id}"
-        ]
-        conn = self._get_connection()
-        output = conn.send_config_set(config_cmds)
-        conn.save_config()
-        conn.disconnect()
-        return output
-
-    def save_config_to_device(self):
-        conn = self._get_connection()
-        output = conn.save_config()
-        conn.disconnect()
-        return output
-
-    def get_full_config(self):
-        conn = self._get_connection()
-        try:
-            # netmiko 会自动处理分屏 (--More--)
-            config = conn.send_command("display current-configuration")
-            return config
-        except Exception as e:
-            raise e
-        finally:
-            conn.disconnect()
\ No newline at end of file
+import re
+import time
+import codecs
+from contextlib import contextmanager
+from ssh_pool import POOL
+from device_scheduler import SCHEDULER, PRIORITY_INTERACTIVE
+from device_cache import DEVICE_CACHE, READ_FLIGHTS
+from comware_parser import (short_iface_name, format_mac, parse_version, parse_interface_brief,
+                            parse_interface_config, parse_ip_source_binding, parse_acl, index_bindings,
+                            parse_mac_address_table, parse_startup_file, parse_dir_entry)
+
+# Comware 回显中代表命令执行失败的特征
+CONFIG_ERROR_MARKERS = ('% Unrecognized', '% Wrong parameter', '% Incomplete', '% Too many', '% Ambiguous')
+
+# 流式抓取整份配置：单次读取的字节数、无数据时的轮询间隔 (秒)、判断提示符时保留的尾部长度、默认超时 (秒)
+CONFIG_STREAM_CHUNK = 64 * 1024
+CONFIG_STREAM_POLL = 0.05
+CONFIG_STREAM_TAIL = 256
+CONFIG_STREAM_TIMEOUT = 300
+
+# 全局绑定表索引的有效期 (秒)；本系统的写操作会立即失效，这里只兜底设备上的带外修改
+BINDING_INDEX_TTL = 300
+
+# === 🧩 读操作的结果组装 (同步 / 异步两套驱动共用，只依赖命令回显) ===
+def build_device_identity(prompt, version_out):
+    hostname = prompt.replace('<', '').replace('>', '').replace('[', '').replace(']', '').strip()
+    return {'hostname': hostname, 'model': parse_version(version_out)['model']}
+
+
+def build_device_info(identity):
+    return f"✅ 连接成功！\n设备名称: {identity['hostname']}\n设备型号: {identity['model']}"
+
+
+def build_interface_list(brief_out, config_out):
+    # 1. brief 提供接口名、状态 (UP/DOWN)、模式 (Access/Trunk)；2. config 提供 description
+    interfaces = parse_interface_brief(brief_out)
+    for short_name, cfg in parse_interface_config(config_out).items():
+        if short_name in interfaces:
+            interfaces[short_name]['desc'] = cfg['description']
+
+    # 3. 格式化输出
+    result = []
+    for iface in interfaces.values():
+        display_text = f"[{iface['link']}] [{iface['type']}] {iface['name']}"
+        if iface['desc']:
+            display_text += f" ({iface['desc']})"
+        result.append({'value': iface['name'], 'text': display_text})
+    return result
+
+
+def build_port_info(interface_name, output_iface, index):
+    target_iface_short = short_iface_name(interface_name)
+    iface_cfg = parse_interface_config(output_iface).get(target_iface_short) or \
+        {'description': '', 'vlan': '', 'strict_access': False, 'bindings': []}
+    vlan = iface_cfg['vlan']
+    description = iface_cfg['description']
+
+    # 1. 接口下的绑定记录：模式按接口物理特征 (是否有 ip verify source) 判断，vlan 优先取行尾参数
+    bind_mode = 'access' if iface_cfg['strict_access'] else 'trunk'
+    bindings = [{'ip': b['ip'], 'mac': b['mac'], 'mode': bind_mode, 'vlan': b['vlan'] or vlan}
+                for b in iface_cfg['bindings']]
+
+    # 2. 兼容可能残留的全局配置 (防御性代码保留)：直接查全局绑定表索引，不再逐行扫描
+    seen_ips = {b['ip'] for b in bindings}
+    for entry in index['by_interface'].get(target_iface_short, []):
+        if entry['ip'] not in seen_ips:
+            seen_ips.add(entry['ip'])
+            bindings.append({'ip': entry['ip'], 'mac': entry['mac'], 'mode': 'trunk', 'vlan': entry['vlan']})
+
+    index_note = f"[Global Bindings] 索引共 {index['total']} 条，采集于 {time.strftime('%H:%M:%S', time.localtime(index['fetched_at']))}"
+    return {'vlan': vlan, 'bindings': bindings, 'description': description}, output_iface + "\n\n" + index_note
+
+
+def build_binding_index(output):
+    entries = parse_ip_source_binding(output)
+    index = index_bindings(entries)
+    index.update(total=len(entries), fetched_at=time.time())
+    return index
+
+
+def build_config_state(startup_file, dir_out, diff_out):
+    entry = parse_dir_entry(dir_out, startup_file)
+    if entry is None or any(m in diff_out for m in CONFIG_ERROR_MARKERS):
+        return None
+    # diff 为空说明运行配置与启动配置一致，启动配置文件的大小 + 修改时间就能代表当前配置
+    return {'fingerprint': f"{startup_file}|{entry['size']}|{entry['mtime']}",
+            'running_saved': not diff_out.strip()}
+
+
+def prompt_pattern(base_prompt):
+    """匹配输出末尾回到提示符 (<H3C> / [H3C-xxx])，用于流式读取时判断命令结束"""
+    return re.compile(r'[\r\n][<\[]' + re.escape(base_prompt) + r'[^\r\n]*[>\]]\s*$')
+
+
+# ACL 编号范围 -> 进入 ACL 视图的命令 (Comware V7)；MAC 规则只能加到二层 ACL
+ACL_VIEWS = ((2000, 2999, 'basic'), (3000, 3999, 'advanced'), (4000, 4999, 'mac'))
+_MAC_RE = re.compile(r'^[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}$')
+
+
+def acl_view_command(acl_number):
+    number = int(acl_number)
+    for low, high, kind in ACL_VIEWS:
+        if low <= number <= high:
+            return f"acl {kind} {number}"
+    raise ValueError(f"不支持的 ACL 编号 {acl_number} (基本 2000-2999 / 高级 3000-3999 / 二层 4000-4999)")
+
+
+def plan_acl_changes(acl_number, items, rules):
+    """把待增删的条目与设备上现有规则比对，返回 (命令块 [(index, [命令])], {index: 结果})
+    items: [{'index', 'action': 'add' | 'delete', 'mac', 'rule_id'}]；已存在 / 不存在的条目直接记为 skipped，不生成命令
+    条目按顺序规划：同一批里先删后加同一个 MAC 也能正确处理"""
+    ids = {r['id']: r['mac'] for r in rules}            # 规划过程中的规则状态 (rule_id -> mac)
+    original = set(ids)
+    results, blocks = {}, []
+    for item in items:
+        index, action = item['index'], str(item.get('action', '')).strip().lower()
+        rid = item.get('rule_id')
+        rule_id = '' if rid is None else str(rid).strip()    # 规则 ID 0 是合法的，不能按真假值判断
+        mac = format_mac(str(item.get('mac') or '').strip())
+        if rule_id and not rule_id.isdigit():
+            results[index] = {'status': 'error', 'msg': f"规则 ID 格式错误: {rule_id}"}
+        elif mac and not _MAC_RE.match(mac):
+            results[index] = {'status': 'error', 'msg': f"MAC 格式错误: {item.get('mac')}"}
+        elif action == 'add':
+            existing = next((rid for rid, m in ids.items() if m == mac), None) if mac else None
+            if not mac:
+                results[index] = {'status': 'error', 'msg': "添加规则需要填写 MAC"}
+            elif not 4000 <= int(acl_number) <= 4999:
+                results[index] = {'status': 'error', 'msg': "MAC 规则只能添加到二层 ACL (4000-4999)"}
+            elif existing is not None:
+                results[index] = {'status': 'skipped',
+                                  'msg': f"已存在 (rule {existing})" if existing in original else "与本批次前面的条目重复"}
+            elif rule_id in ids:
+                results[index] = {'status': 'error', 'msg': f"规则 ID {rule_id} 已被占用 ({ids[rule_id] or '非 MAC 规则'})"}
+            else:
+                cmd = f"rule {rule_id} permit" if rule_id else "rule permit"
+                blocks.append((index, [f"{cmd} source {mac} ffff-ffff-ffff"]))
+                ids[rule_id or f"auto:{mac}"] = mac
+                results[index] = {'status': 'success', 'msg': "已添加"}
+        elif action == 'delete':
+            targets = [rule_id] if rule_id else [rid for rid, m in ids.items() if mac and m == mac]
+            targets = [rid for rid in targets if rid in ids and not rid.startswith('auto:')]
+            if not rule_id and not mac:
+                results[index] = {'status': 'error', 'msg': "删除规则需要填写规则 ID 或 MAC"}
+            elif not targets:
+                results[index] = {'status': 'skipped', 'msg': "规则不存在" if rule_id else "ACL 中没有该 MAC"}
+            else:
+                blocks.append((index, [f"undo rule {rid}" for rid in targets]))
+                for rid in targets:
+                    del ids[rid]
+                results[index] = {'status': 'success', 'msg': f"已删除 rule {', '.join(targets)}"}
+        else:
+            results[index] = {'status': 'error', 'msg': f"未知操作: {item.get('action')} (应为 add / delete)"}
+    return blocks, results
+
+
+def attribute_config_errors(output, cmd_owner, results):
+    """按 send_config_set 的命令回显把设备报错归属到具体条目；cmd_owner: 命令 -> 条目 index (多条共用的命令记为 None)"""
+    owner = None
+    for line in output.split('\n'):
+        stripped = line.strip()
+        # 回显形如 "[H3C-GigabitEthernet1/0/1]ip source binding ..."，去掉提示符后查表
+        echoed = stripped.split(']', 1)[-1].strip()
+        if cmd_owner.get(echoed) is not None:
+            owner = cmd_owner[echoed]
+        if owner is not None and any(m in stripped for m in CONFIG_ERROR_MARKERS):
+            results[owner] = dict(results[owner], status='error', msg=f"设备拒绝执行: {stripped}")
+
+
+class ProtectedPortError(Exception):
+    """端口描述命中保护关键词，拒绝修改"""
+    def __init__(self, keyword):
+        self.keyword = keyword
+        super().__init__(f"该端口描述包含保护关键词 '{keyword}'")
+
+class H3CManager:
+    def __init__(self, ip, username, password, port=22, priority=PRIORITY_INTERACTIVE, owner=None):
+        self.device_info = {
+            'device_type': 'hp_comware',
+            'ip': ip,
+            'username': username,
+            'password': password,
+            'port': port,
+            'global_delay_factor': 2, # 增加延时防止超时
+        }
+        self.device_key = (ip, int(port))
+        self.last_cache_hit = False   # 最近一次读取是否命中缓存 (供接口返回给前端)
+        self.last_cache_age = 0
+        self.last_shared = False      # 最近一次读取是否与并发的相同读取合并 (没有单独登录设备)
+        self.priority = priority      # 页面操作 PRIORITY_INTERACTIVE，批量 / 后台任务 PRIORITY_BULK
+        self.owner = owner            # 排队轮转的单位：操作用户名或任务名
+        self.queue_wait = 0.0         # 本对象各次操作累计的排队秒数 (供接口返回给前端)
+
+    @contextmanager
+    def _session(self):
+        # 🚦 先在设备调度器排队领会话名额，再从全局连接池借出会话 (with 语句结束自动归还，出错自动丢弃重连)
+        with SCHEDULER.slot(self.device_key, self.priority, self.owner) as ticket:
+            self.queue_wait += ticket.wait_seconds
+            with POOL.session(self.device_info) as conn:
+                yield conn
+
+    # === 🧊 读缓存：命中直接返回解析结果，未命中才登录设备 ===
+    def _cached(self, kind, arg, loader, use_cache=True, ttl=None):
+        key = (self.device_key, kind, arg)
+        if use_cache:
+            hit, value, age = DEVICE_CACHE.get(key)
+            if hit:
+                self.last_cache_hit, self.last_cache_age = True, round(age, 1)
+                return value
+        generation = DEVICE_CACHE.generation(self.device_key)
+        value, shared = self._coalesced(key, generation, loader)
+        if not shared:
+            DEVICE_CACHE.set(key, value, generation, ttl)
+        self.last_cache_hit, self.last_cache_age = False, 0
+        return value
+
+    # === 🔗 合并并发的相同读取：同一设备同一内容正在读时，后到的请求直接等它的结果 ===
+    def _coalesced(self, key, generation, loader):
+        # 设备代数也放进 key：写操作之后发起的读取不会拿到写之前就开始的那次读取结果
+        value, self.last_shared = READ_FLIGHTS.do((key, generation), loader)
+        return value, self.last_shared
+    
+    def format_mac(self, mac):
+        return format_mac(mac)
+
+    def get_device_info(self):
+        return build_device_info(self.get_device_identity())
+
+    def get_device_identity(self):
+        """{'hostname', 'model'} (健康巡检用)"""
+        with self._session() as conn:
+            prompt = conn.find_prompt()
+            version_out = conn.send_command("display version")
+        return build_device_identity(prompt, version_out)
+
+# === 🛠️ 终极修复版：获取接口列表 (解决 XGE 描述丢失问题) ===
+    def get_interface_list(self, use_cache=True):
+        return self._cached('interfaces', None, self._fetch_interface_list, use_cache)
+
+    def _fetch_interface_list(self):
+        with self._session() as conn:
+            brief_out = conn.send_command("display interface brief")
+            config_out = conn.send_command("display current-configuration interface")
+        return build_interface_list(brief_out, config_out)
+
+# === 🛠️ 智能特征识别版：获取端口详情 ===
+    def get_port_info(self, interface_name, use_cache=True):
+        return self._cached('port_info', short_iface_name(interface_name),
+                            lambda: self._fetch_port_info(interface_name), use_cache)
+
+    def _fetch_port_info(self, interface_name):
+        with self._session() as conn:
+            output_iface = conn.send_command(f"display current-configuration interface {interface_name}")
+        return build_port_info(interface_name, output_iface, self.get_binding_index())
+
+    # === 🗂️ 全局绑定表索引：整表只解析一次，按接口 / IP / MAC 直接查表 ===
+    def get_binding_index(self, use_cache=True):
+        return self._cached('bindings', None, self._fetch_binding_index, use_cache, ttl=BINDING_INDEX_TTL)
+
+    def _fetch_binding_index(self):
+        with self._session() as conn:
+            output = conn.send_command("display ip source binding")
+        return build_binding_index(output)
+
+    def find_bindings(self, ip=None, mac=None, cached_only=False):
+        """在本设备绑定表中查找 IP 或 MAC 已存在的绑定记录 (用于重复绑定提示)
+        cached_only=True 时只查已缓存的索引，缓存未命中直接返回空列表，不为一句提示登录设备拉整张表"""
+        if cached_only:
+            hit, index, _ = DEVICE_CACHE.get((self.device_key, 'bindings', None))
+            if not hit:
+                return []
+        else:
+            index = self.get_binding_index()
+        found = list(index['by_ip'].get(ip, [])) if ip else []
+        if mac:
+            found += [e for e in index['by_mac'].get(format_mac(mac), []) if e not in found]
+        return found
+
+    def get_mac_table(self):
+        """动态学习的 MAC 地址表 (变化频繁，不缓存；并发的相同读取仍会合并)"""
+        key = (self.device_key, 'mac_table', None)
+        return self._coalesced(key, DEVICE_CACHE.generation(self.device_key), self._fetch_mac_table)[0]
+
+    def _fetch_mac_table(self):
+        with self._session() as conn:
+            output = conn.send_command("display mac-address")
+        return parse_mac_address_table(output)
+		
+# === 🛠️ 终极完美版：配置绑定 (极致安全与精简) ===
+    def configure_port_binding(self, interface_name, vlan_id, bind_ip, bind_mac, mode="access", protected_keywords=()):
+        cmds = self._binding_cmds(interface_name, vlan_id, bind_ip, bind_mac, mode)
+        with self._session() as conn:
+            self._guard_port(conn, interface_name, protected_keywords)
+            output = conn.send_config_set(cmds)
+            conn.save_config()
+        DEVICE_CACHE.invalidate(self.device_key, 'port_info', short_iface_name(interface_name))
+        DEVICE_CACHE.invalidate(self.device_key, 'bindings')
+        return output
+
+    # === 🛡️ 同一会话内的保护端口校验：只读取 description 一行，命中关键词直接抛出 ProtectedPortError ===
+    def _guard_port(self, conn, interface_name, protected_keywords):
+        if not protected_keywords:
+            return
+        output = conn.send_command(f"display current-configuration interface {interface_name} | include description")
+        desc = ""
+        for line in output.split('\n'):
+            line = line.strip()
+            if line.startswith('description'):
+                parts = line.split(maxsplit=1)
+                if len(parts) > 1: desc = parts[1].strip()
+                break
+        for kw in protected_keywords:
+            if kw.lower() in desc.lower():
+                raise ProtectedPortError(kw)
+
+    def _binding_cmds(self, interface_name, vlan_id, bind_ip, bind_mac, mode="access"):
+        if mode == "access":
+            cmds = [
+                f"interface {interface_name}",
+                "stp edged-port",
+                f"port access vlan {vlan_id}",
+                "ip verify source ip-address mac-address",
+                # Access 模式：纯净绑定，不带 vlan 标。利用底层隐式 PVID 继承，既防 IP 伪造，又防 ARP 欺骗
+                f"ip source binding ip-address {bind_ip} mac-address {self.format_mac(bind_mac)}"
+            ]
+        else: 
+            # Trunk 混合模式：带 vlan 标，依赖业务 VLAN 下的 ARP Detection
+            cmds = [
+                f"interface {interface_name}",
+                f"ip source binding ip-address {bind_ip} mac-address {self.format_mac(bind_mac)} vlan {vlan_id}",
+                "quit",
+                f"vlan {vlan_id}",
+                "arp detection enable"
+            ]
+        return cmds
+
+    # === 🛠️ 终极完美版：删除绑定 (不留死角) ===
+    def delete_port_binding(self, interface_name, del_ip, del_mac, mode="access", vlan_id=None, protected_keywords=()):
+        if mode == "access":
+            cmds = [
+                f"interface {interface_name}",
+                # Access 模式解绑：干净利落
+                f"undo ip source binding ip-address {del_ip} mac-address {self.format_mac(del_mac)}"
+            ]
+        else:
+            cmds = [
+                f"interface {interface_name}",
+                # Trunk 模式解绑：精准匹配 vlan 标
+                f"undo ip source binding ip-address {del_ip} mac-address {self.format_mac(del_mac)} vlan {vlan_id}"
+            ]
+            
+        with self._session() as conn:
+            self._guard_port(conn, interface_name, protected_keywords)
+            output = conn.send_config_set(cmds)
+            conn.save_config()
+        DEVICE_CACHE.invalidate(self.device_key, 'port_info', short_iface_name(interface_name))
+        DEVICE_CACHE.invalidate(self.device_key, 'bindings')
+        return output
+
+    # === 📊 Excel 批量计划：同一台交换机的所有行一次登录、一次读配置、一次下发、一次保存 ===
+    def apply_binding_plan(self, items, protected_keywords=()):
+        """items: [{'index', 'interface', 'vlan', 'bind_ip', 'mac', 'mode'}]，返回 ({index: 结果}, 原始回显)"""
+        results = {}
+        with self._session() as conn:
+            config_out = conn.send_command("display current-configuration interface")
+
+            # 1. 一次读取全部接口描述，供保护端口校验使用
+            descriptions = {name: cfg['description'] for name, cfg in parse_interface_config(config_out).items()}
+
+            # 2. 逐行校验，合格的行拼接成一个命令集
+            cmds = []
+            cmd_owner = {}     # 命令 -> 行号；多行共用的命令 (quit / stp edged-port 等) 记为 None
+            for item in items:
+                iface = short_iface_name(item['interface'])
+                if iface not in descriptions:
+                    results[item['index']] = {'status': 'error', 'msg': f"设备上不存在端口 {item['interface']}"}
+                    continue
+                desc = descriptions[iface]
+                hit = next((kw for kw in protected_keywords if kw.lower() in desc.lower()), None)
+                if hit:
+                    results[item['index']] = {'status': 'blocked', 'msg': f"触发保护端口拦截({hit})"}
+                    continue
+                block = self._binding_cmds(item['interface'], item['vlan'], item['bind_ip'], item['mac'], item['mode'])
+                for cmd in block:
+                    cmd_owner[cmd] = item['index'] if cmd not in cmd_owner else None
+                cmds.extend(block + ["quit"])
+                results[item['index']] = {'status': 'success', 'msg': '', 'log': "\n".join(block)}
+
+            if not cmds:
+                return results, config_out
+
+            # 3. 一次下发 + 一次保存
+            output = conn.send_config_set(cmds)
+            conn.save_config()
+        for item in items:
+            DEVICE_CACHE.invalidate(self.device_key, 'port_info', short_iface_name(item['interface']))
+        DEVICE_CACHE.invalidate(self.device_key, 'bindings')
+
+        # 4. 按命令回显把报错归属到具体行
+        attribute_config_errors(output, cmd_owner, results)
+        return results, output
+
+    def get_acl_rules(self, acl_number=4000, use_cache=True):
+        return self._cached('acl', str(acl_number), lambda: self._fetch_acl_rules(acl_number), use_cache)
+
+    def _fetch_acl_rules(self, acl_number):
+        with self._session() as conn:
+            output = conn.send_command(f"display acl {acl_number}")
+        
+        return parse_acl(output)
+
+    def add_acl_mac(self, mac, rule_id=None, acl_number=4000):
+        return self._apply_single_acl(acl_number, {'action': 'add', 'mac': mac, 'rule_id': rule_id})
+
+    def delete_acl_rule(self, rule_id, acl_number=4000):
+        return self._apply_single_acl(acl_number, {'action': 'delete', 'rule_id': rule_id})
+
+    def _apply_single_acl(self, acl_number, item):
+        results, output = self.apply_acl_plan(acl_number, [dict(item, index=0)])
+        if results[0]['status'] == 'error':
+            raise RuntimeError(results[0]['msg'])
+        return output if results[0]['status'] == 'success' else f"无需变更: {results[0]['msg']}"
+
+    # === 🧾 ACL 批量增删：一次登录、一次读取现有规则、跳过无变化的条目、一次下发、一次保存 ===
+    def apply_acl_plan(self, acl_number, items):
+        """items: [{'index', 'action': 'add' | 'delete', 'mac', 'rule_id'}]，返回 ({index: 结果}, 原始回显)
+        结果 status 为 success / skipped (已存在或本来就不存在) / error"""
+        view_cmd = acl_view_command(acl_number)
+        with self._session() as conn:
+            current = conn.send_command(f"display acl {acl_number}")
+            blocks, results = plan_acl_changes(acl_number, items, parse_acl(current))
+            if not blocks:
+                return results, current
+
+            cmds, cmd_owner = [view_cmd], {}
+            for index, block in blocks:
+                for cmd in block:
+                    cmd_owner[cmd] = index if cmd not in cmd_owner else None
+                cmds.extend(block)
+                results[index]['log'] = "\n".join(block)
+            output = conn.send_config_set(cmds)
+            conn.save_config()
+        DEVICE_CACHE.invalidate(self.device_key, 'acl', str(acl_number))
+        attribute_config_errors(output, cmd_owner, results)
+        return results, output
+
+    def save_config_to_device(self):
+        with self._session() as conn:
+            output = conn.save_config()
+        return output
+
+    # === 🔍 备份前的轻量探测：启动配置文件指纹 + 运行配置是否已全部保存 ===
+    def probe_config_state(self):
+        """返回 {'fingerprint', 'running_saved'}；设备不支持相关命令时返回 None (调用方走完整备份)"""
+        with self._session() as conn:
+            startup_file = parse_startup_file(conn.send_command("display startup"))
+            if not startup_file:
+                return None
+            dir_out = conn.send_command(f"dir {startup_file}")
+            diff_out = conn.send_command("display current-configuration diff")
+        return build_config_state(startup_file, dir_out, diff_out)
+
+    def get_full_config(self, read_timeout=None):
+        kwargs = {'read_timeout': read_timeout} if read_timeout else {}
+        with self._session() as conn:
+            # netmiko 会自动处理分屏 (--More--)
+            config = conn.send_command("display current-configuration", **kwargs)
+        return config
+
+    # === 🌊 流式抓取整份配置：边读通道边交给 write，内存里不拼接整份配置 ===
+    def stream_full_config(self, write, read_timeout=None):
+        """每从通道读到一块 (最多 CONFIG_STREAM_CHUNK 字节) 就调用一次 write(text)，直到回到提示符；返回收到的字符数
+        命令回显行和结尾的提示符行也会交出去，由备份仓库的规范化统一过滤"""
+        deadline = time.time() + (read_timeout or CONFIG_STREAM_TIMEOUT)
+        with self._session() as conn:
+            prompt_re = prompt_pattern(conn.base_prompt)
+            conn.clear_buffer()
+            conn.write_channel("display current-configuration" + conn.RETURN)
+            # 绕过 netmiko 的 read_channel (它会一次读空整个接收窗口)，直接按固定块大小读 paramiko 通道；
+            # 增量解码保证被块边界切开的多字节字符不会乱码
+            channel = conn.remote_conn
+            decoder = codecs.getincrementaldecoder(conn.encoding)(errors='replace')
+            tail, received = '', 0
+            while True:
+                chunk = decoder.decode(channel.recv(CONFIG_STREAM_CHUNK)) if channel.recv_ready() else ''
+                if not chunk:
+                    if channel.closed:
+                        raise EOFError("读取配置过程中 SSH 通道被设备关闭")
+                    if time.time() > deadline:
+                        raise TimeoutError("读取 display current-configuration timed out")
+                    time.sleep(CONFIG_STREAM_POLL)
+                    continue
+                write(chunk)
+                received += len(chunk)
+                # 只保留最后一小段用来判断是否已经回到提示符
+                tail = (tail + chunk)[-CONFIG_STREAM_TAIL:]
+                if prompt_re.search(tail):
+                    return received
+
+
+def locate_cached_bindings(ip=None, mac=None):
+    """全网查找 IP / MAC 绑定在哪台设备的哪个端口：只查各设备已缓存的绑定表索引，不登录任何设备"""
+    mac = format_mac(mac) if mac else None
+    matches = []
+    for (device_ip, device_port), _, index, age in DEVICE_CACHE.entries('bindings'):
+        found = list(index['by_ip'].get(ip, [])) if ip else []
+        if mac:
+            found += [e for e in index['by_mac'].get(mac, []) if e not in found]
+        for entry in found:
+            matches.append(dict(entry, device_ip=device_ip, device_port=device_port, age=round(age, 1)))
+    return matches
\ No newline at end of file
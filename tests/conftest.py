@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+# database 导入时就会在当前目录建库：先切到临时目录，不在仓库里留下 net_assets.db / 备份目录
+os.chdir(tempfile.mkdtemp(prefix='netops-test-'))
+
+import database as db
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """每个用例一个独立的临时数据库 (线程连接也重新建立)"""
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / 'net_assets.db'))
+    monkeypatch.setattr(db, '_local', threading.local())
+    db.init_db()
+    db.upgrade_db()
+    yield db
+    conn = getattr(db._local, 'conn', None)
+    if conn is not None:
+        conn.close()
@@ -0,0 +1,31 @@
+from switch_driver import plan_acl_changes
+
+RULES = [{'id': '0', 'mac': '00e0-4c68-0001'}, {'id': '5', 'mac': '00e0-4c68-0002'}]
+
+
+def _item(index, action, mac=None, rule_id=None):
+    return {'index': index, 'action': action, 'mac': mac, 'rule_id': rule_id}
+
+
+def test_delete_rule_zero_by_int_id():
+    blocks, results = plan_acl_changes(4000, [_item(0, 'delete', rule_id=0)], RULES)
+    assert blocks == [(0, ['undo rule 0'])]
+    assert results[0]['status'] == 'success'
+
+
+def test_add_with_rule_id_zero_is_checked_against_existing():
+    _, results = plan_acl_changes(4000, [_item(0, 'add', mac='00e0-4c68-00ff', rule_id=0)], RULES)
+    assert results[0]['status'] == 'error' and '规则 ID 0 已被占用' in results[0]['msg']
+    blocks, results = plan_acl_changes(4000, [_item(0, 'add', mac='00e0-4c68-00ff', rule_id=0)], RULES[1:])
+    assert blocks == [(0, ['rule 0 permit source 00e0-4c68-00ff ffff-ffff-ffff'])]
+
+
+def test_batch_order_and_duplicates():
+    items = [_item(0, 'delete', mac='00e0-4c68-0002'), _item(1, 'add', mac='00E0.4C68.0002'),
+             _item(2, 'add', mac='00e0-4c68-0002'), _item(3, 'add', mac='00e0-4c68-0001'),
+             _item(4, 'delete'), _item(5, 'delete', rule_id='x1')]
+    blocks, results = plan_acl_changes(4000, items, RULES)
+    assert [i for i, _ in blocks] == [0, 1]
+    assert [results[i]['status'] for i in range(6)] == ['success', 'success', 'skipped', 'skipped', 'error', 'error']
+    assert results[2]['msg'] == "与本批次前面的条目重复"
+    assert results[3]['msg'] == "已存在 (rule 0)"
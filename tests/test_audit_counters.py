@@ -0,0 +1,37 @@
+def _row(action, status='成功', day='2026-10-17', details='-'):
+    return (f'{day} 10:00:00', 'admin', '127.0.0.1', '10.0.0.1', action, details, status)
+
+
+def test_last_action_points_at_inserted_log(fresh_db):
+    fresh_db.write_audit_batch([_row('端口绑定'), _row('保存配置'), _row('端口绑定', details='second')])
+    conn = fresh_db.get_db()
+    for last in conn.execute("SELECT action, log_id, details FROM audit_last_action"):
+        log = conn.execute("SELECT action, details FROM audit_logs WHERE id = ?", (last['log_id'],)).fetchone()
+        assert log is not None
+        assert (log['action'], log['details']) == (last['action'], last['details'])
+    bind = conn.execute("SELECT log_id FROM audit_last_action WHERE action = '端口绑定'").fetchone()
+    assert bind['log_id'] == conn.execute("SELECT MAX(id) FROM audit_logs WHERE action = '端口绑定'").fetchone()[0]
+
+
+def test_last_action_after_existing_day_counter(fresh_db):
+    # 当天计数器已存在时 upsert 走 UPDATE 分支，lastrowid 不能被它带偏
+    fresh_db.write_audit_batch([_row('保存配置')])
+    fresh_db.log_operation('admin', '127.0.0.1', '10.0.0.2', '解除绑定', 'x', '成功')
+    conn = fresh_db.get_db()
+    log_id = conn.execute("SELECT log_id FROM audit_last_action WHERE action = '解除绑定'").fetchone()[0]
+    assert conn.execute("SELECT device_ip FROM audit_logs WHERE id = ?", (log_id,)).fetchone()[0] == '10.0.0.2'
+
+
+def test_daily_counts(fresh_db):
+    fresh_db.write_audit_batch([_row('a'), _row('b'), _row('c', day='2026-10-16')])
+    conn = fresh_db.get_db()
+    counts = dict(conn.execute("SELECT day, ops FROM audit_daily_counts").fetchall())
+    assert counts == {'2026-10-17': 2, '2026-10-16': 1}
+
+
+def test_last_action_on_first_log_of_new_day(fresh_db):
+    # 新的一天第一条日志会 INSERT 计数器行，其 rowid 与日志 id 不同
+    fresh_db.write_audit_batch([_row('a', day='2026-10-16'), _row('b', day='2026-10-16'), _row('c')])
+    conn = fresh_db.get_db()
+    log_id = conn.execute("SELECT log_id FROM audit_last_action WHERE action = 'c'").fetchone()[0]
+    assert log_id == 3
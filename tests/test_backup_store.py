@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from backup_store import ObjectWriter, IncompleteConfigError, normalize_config, object_path
+
+CONFIG = "display current-configuration\r\n#\r\n sysname SW-01\r\n#\r\ninterface GigabitEthernet1/0/1\r\n#\r\nreturn\r\n<SW-01>"
+
+
+def _tmp_files(root):
+    return [f for _, _, files in os.walk(root) for f in files if f.endswith('.tmp')]
+
+
+def test_normalize_config_drops_echo_and_prompt():
+    assert normalize_config(CONFIG) == "#\n sysname SW-01\n#\ninterface GigabitEthernet1/0/1\n#\nreturn\n"
+
+
+def test_complete_config_is_stored(tmp_path):
+    writer = ObjectWriter(str(tmp_path), require_complete=True)
+    for i in range(0, len(CONFIG), 7):       # 分块写入，块边界落在行中间
+        writer.write(CONFIG[i:i + 7])
+    sha256, new_blob = writer.commit()
+    assert new_blob and os.path.exists(object_path(sha256, str(tmp_path)))
+
+
+def test_truncated_config_is_rejected(tmp_path):
+    writer = ObjectWriter(str(tmp_path), require_complete=True)
+    writer.write(CONFIG.split('interface')[0] + "<SW-01>")
+    with pytest.raises(IncompleteConfigError):
+        writer.commit()
+    assert _tmp_files(tmp_path) == []
+    assert not any(f.endswith('.cfg.gz') for _, _, files in os.walk(tmp_path) for f in files)
+
+
+def test_incomplete_allowed_without_check(tmp_path):
+    # 导入旧版备份等场景不要求 return 结尾
+    writer = ObjectWriter(str(tmp_path))
+    writer.write(" sysname SW-01\n")
+    assert writer.commit()[1] is True
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+import comware_parser as P
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name, short', [
+    ('GigabitEthernet1/0/1', 'GE1/0/1'),
+    ('Ten-GigabitEthernet1/0/49', 'XGE1/0/49'),
+    ('XGigabitEthernet2/0/1', 'XGE2/0/1'),
+    ('M-GigabitEthernet0/0/0', 'MGE0/0/0'),
+    ('Bridge-Aggregation12', 'BAGG12'),
+    ('GE1/0/1', 'GE1/0/1'),
+    ('Vlan-interface10', 'Vlan-interface10'),
+])
+def test_short_iface_name(name, short):
+    assert P.short_iface_name(name) == short
+
+
+@pytest.mark.parametrize('raw, mac', [
+    ('00E0-4C68-0001', '00e0-4c68-0001'),
+    ('00:e0:4c:68:00:01', '00e0-4c68-0001'),
+    ('00e0.4c68.0001', '00e0-4c68-0001'),
+    ('00e04c680001', '00e0-4c68-0001'),
+    ('bad', 'bad'),
+    ('', ''),
+])
+def test_format_mac(raw, mac):
+    assert P.format_mac(raw) == mac
+
+
+def test_parse_version():
+    assert P.parse_version(fixture('display_version.txt')) == {'model': 'H3C S5130S-52S-EI'}
+    assert P.parse_version('') == {'model': 'Unknown Model'}
+
+
+def test_parse_interface_brief():
+    interfaces = P.parse_interface_brief(fixture('display_interface_brief.txt'))
+    # 路由模式下的 Vlan / NULL / InLoop 等逻辑接口不展示
+    assert list(interfaces)[:2] == ['GE1/0/1', 'GE1/0/2']
+    assert 'Vlan1' not in interfaces and 'InLoop0' not in interfaces
+    assert interfaces['GE1/0/2'] == {'name': 'GE1/0/2', 'link': 'DOWN', 'type': 'Access', 'desc': ''}
+    assert interfaces['GE1/0/4']['link'] == 'ADM'
+    assert interfaces['GE1/0/5']['type'] == 'Hybrid'
+    assert interfaces['XGE1/0/49']['type'] == 'Trunk'
+    assert len(interfaces) == 10
+
+
+def test_parse_interface_config():
+    config = P.parse_interface_config(fixture('display_current_configuration_interface.txt'))
+    ge1 = config['GE1/0/1']
+    assert ge1['name'] == 'GigabitEthernet1/0/1'
+    assert (ge1['description'], ge1['vlan'], ge1['strict_access']) == ('PC-001', '10', True)
+    assert ge1['bindings'] == [{'ip': '10.10.1.11', 'mac': '00e0-4c68-0001', 'vlan': None}]
+    assert [b['vlan'] for b in config['GE1/0/2']['bindings']] == ['11', '11']
+    assert config['GE1/0/3']['strict_access'] is False
+    assert config['XGE1/0/49']['vlan'] == '100'
+    assert config['BAGG1']['description'] == 'To_Core_BAGG'
+    assert config['GE1/0/4'] == {'name': 'GigabitEthernet1/0/4', 'description': '', 'vlan': '',
+                                 'strict_access': False, 'bindings': []}
+
+
+def test_parse_ip_source_binding():
+    entries = P.parse_ip_source_binding(fixture('display_ip_source_binding.txt'))
+    # 只取静态绑定，DHCP Snooping 表项不算
+    assert [e['ip'] for e in entries] == ['10.10.1.11', '10.10.2.12', '10.10.2.13', '10.10.1.30']
+    assert entries[0] == {'ip': '10.10.1.11', 'mac': '00e0-4c68-0001', 'interface': 'GE1/0/1', 'vlan': 'Unknown'}
+    assert entries[1]['vlan'] == '11'
+
+
+def test_parse_ip_source_binding_v5_column_order():
+    # V5 平台 MAC 在前、接口用全名：按列特征识别，不依赖列顺序
+    entries = P.parse_ip_source_binding(fixture('display_ip_source_binding_v5.txt'))
+    assert entries[2] == {'ip': '10.10.5.5', 'mac': '0023-8918-aabb', 'interface': 'XGE1/0/49', 'vlan': 'Unknown'}
+    assert entries[1]['vlan'] == '11'
+
+
+def test_index_bindings():
+    index = P.index_bindings(P.parse_ip_source_binding(fixture('display_ip_source_binding.txt')))
+    assert [e['ip'] for e in index['by_interface']['GE1/0/2']] == ['10.10.2.12', '10.10.2.13']
+    assert index['by_ip']['10.10.1.30'][0]['interface'] == 'GE1/0/3'
+    assert index['by_mac']['00e0-4c68-0001'][0]['ip'] == '10.10.1.11'
+
+
+def test_parse_acl():
+    rules = P.parse_acl(fixture('display_acl_4000.txt'))
+    assert [(r['id'], r['action'], r['mac']) for r in rules] == [
+        ('0', 'permit', '00e0-4c68-0001'), ('5', 'permit', '00e0-4c68-0002'),
+        ('10', 'deny', '3c52-82aa-0b1c'), ('15', 'permit', '')]
+    assert rules[3]['rule'] == 'cos 5'
+
+
+def test_parse_acl_v5_source_keyword():
+    rules = P.parse_acl(fixture('display_acl_4000_v5.txt'))
+    assert [(r['id'], r['action'], r['mac']) for r in rules] == [
+        ('0', 'permit', '00e0-4c68-0001'), ('5', 'deny', '0023-8918-aabb')]
+
+
+def test_parse_mac_address_table():
+    entries = P.parse_mac_address_table(fixture('display_mac_address.txt'))
+    assert len(entries) == 4
+    assert entries[2] == {'mac': '3c52-82aa-0b1c', 'vlan': '10', 'state': 'Config static', 'interface': 'GE1/0/3'}
+    assert entries[3]['interface'] == 'BAGG1'
+
+
+def test_parse_startup_and_dir():
+    assert P.parse_startup_file(fixture('display_startup.txt')) == 'flash:/startup.cfg'
+    assert P.parse_startup_file(' Current startup saved-configuration file: NULL') is None
+    assert P.parse_dir_entry(fixture('dir_startup.txt'), 'flash:/startup.cfg') == \
+        {'size': 8241, 'mtime': 'Oct 17 2026 10:20:31'}
+    assert P.parse_dir_entry(fixture('dir_startup.txt'), 'flash:/other.cfg') is None
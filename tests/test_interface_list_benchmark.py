@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from fake_comware import FakeSwitchState
+from switch_driver import build_interface_list
+
+# === ⏱️ 接口列表 (brief + description 关联) 微基准：48 / 480 / 4800 端口，对比逐行扫描的旧实现 ===
+
+
+def legacy_interface_list(brief_out, config_out):
+    """旧实现：五次链式 replace 规整接口名，每条 description 都在整个接口列表里线性查找 (仅作基准对照)"""
+    def normalize(name):
+        return name.replace('Ten-GigabitEthernet', 'XGE').replace('XGigabitEthernet', 'XGE')\
+                   .replace('M-GigabitEthernet', 'MGE').replace('GigabitEthernet', 'GE')\
+                   .replace('Bridge-Aggregation', 'BAGG')
+
+    interfaces = []
+    for line in brief_out.split('\n'):
+        parts = line.split()
+        if len(parts) >= 5 and parts[0].startswith(('GE', 'XGE', 'Gigabit', 'MGE', 'Bridge', 'Ten-Gigabit', 'XGigabit')):
+            port_type = {'A': 'Access', 'T': 'Trunk', 'H': 'Hybrid'}.get(parts[4], parts[4])
+            interfaces.append({'name': normalize(parts[0]), 'desc': '', 'link': parts[1], 'type': port_type})
+    current_iface = None
+    for line in config_out.split('\n'):
+        line = line.strip()
+        if line.startswith('interface '):
+            current_iface = normalize(line.split(' ')[1])
+        elif line.startswith('description ') and current_iface:
+            desc_text = line.replace('description ', '').strip()
+            for iface in interfaces:
+                if iface['name'] == current_iface:
+                    iface['desc'] = desc_text
+                    break
+    result = []
+    for iface in interfaces:
+        display_text = f"[{iface['link']}] [{iface['type']}] {iface['name']}"
+        if iface['desc']:
+            display_text += f" ({iface['desc']})"
+        result.append({'value': iface['name'], 'text': display_text})
+    return result
+
+
+@pytest.fixture(scope='module', params=[48, 480, 4800], ids=lambda n: f'{n}ports')
+def outputs(request):
+    state = FakeSwitchState(f'BENCH-{request.param}', port_count=request.param)
+    return request.param, state.render_brief(), state.render_iface_config()
+
+
+@pytest.mark.parametrize('impl', [legacy_interface_list, build_interface_list], ids=['legacy', 'indexed'])
+def test_bench_interface_list(benchmark, outputs, impl):
+    ports, brief_out, config_out = outputs
+    benchmark.group = f'interface_list-{ports}ports'
+    result = benchmark(impl, brief_out, config_out)
+    assert result == legacy_interface_list(brief_out, config_out)
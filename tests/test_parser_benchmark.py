@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import comware_parser as P
+from fake_comware import FakeSwitchState
+
+# === ⏱️ 解析吞吐基准：在模拟设备生成的大回显上测每秒解析行数 (pytest --benchmark-only 单独运行) ===
+
+PORT_COUNTS = [48, 480, 4800]
+
+
+@pytest.fixture(scope='module', params=PORT_COUNTS, ids=lambda n: f'{n}ports')
+def corpus(request):
+    state = FakeSwitchState(f'BENCH-{request.param}', port_count=request.param, acl_rules=request.param)
+    return {
+        'brief': state.render_brief(),
+        'config': state.render_iface_config(),
+        'binding': state.render_source_binding(),
+        'acl': state.render_acl(4000),
+        'mac': state.render_mac_table(),
+    }
+
+
+def _throughput(benchmark, parser, output):
+    result = benchmark(parser, output)
+    lines = output.count('\n') + 1
+    benchmark.extra_info['lines'] = lines
+    benchmark.extra_info['lines_per_second'] = round(lines / benchmark.stats.stats.mean)
+    return result
+
+
+def test_bench_interface_brief(benchmark, corpus):
+    assert _throughput(benchmark, P.parse_interface_brief, corpus['brief'])
+
+
+def test_bench_interface_config(benchmark, corpus):
+    assert _throughput(benchmark, P.parse_interface_config, corpus['config'])
+
+
+def test_bench_ip_source_binding(benchmark, corpus):
+    assert _throughput(benchmark, P.parse_ip_source_binding, corpus['binding'])
+
+
+def test_bench_acl(benchmark, corpus):
+    assert _throughput(benchmark, P.parse_acl, corpus['acl'])
+
+
+def test_bench_mac_address_table(benchmark, corpus):
+    assert _throughput(benchmark, P.parse_mac_address_table, corpus['mac'])
@@ -0,0 +1,27 @@
+import time
+
+from ssh_pool import SSHConnectionPool
+
+
+class FakeConn:
+    def __init__(self):
+        self.closed = False
+
+    def disconnect(self):
+        self.closed = True
+
+
+def test_evict_idle_closes_oldest_sessions_of_the_device():
+    pool = SSHConnectionPool()
+    old, new, other_user, other_device = FakeConn(), FakeConn(), FakeConn(), FakeConn()
+    now = time.time()
+    pool._idle = {('10.0.0.1', 22, 'admin'): [(old, now - 60), (new, now)],
+                  ('10.0.0.1', 22, 'ops'): [(other_user, now - 30)],
+                  ('10.0.0.2', 22, 'admin'): [(other_device, now - 90)]}
+
+    assert pool.idle_sessions(('10.0.0.1', 22)) == 3
+    assert pool.evict_idle(('10.0.0.1', 22), keep=1) == 2     # 不区分用户名，留下最近用过的一个
+    assert old.closed and other_user.closed and not new.closed and not other_device.closed
+    assert pool.idle_sessions(('10.0.0.1', 22)) == 1
+    assert pool.evict_idle(('10.0.0.1', 22), keep=1) == 0
+    assert pool.stats()['evicted'] == 2 and pool.stats()['idle_sessions'] == 2
@@ -0,0 +1,88 @@
+"""数据库访问基准：经 Flask 路由顺序请求 /api/switches 与 /api/dashboard_stats，输出每秒请求数 (req/s)，
+对比 "每个线程一条长连接 (WAL)" 与 "每次调用重新连接" 两种方式
+
+用法：
+    python tools/bench_db.py
+    python tools/bench_db.py --requests 2000 --switches 500 --logs 50000
+
+数据库建在临时目录里；"每次调用重新连接" 通过替换 database.get_db 模拟旧版行为 (每次 sqlite3.connect，不设 PRAGMA)。
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN_USER, ADMIN_PASS = 'admin', 'admin888'
+PATHS = ('/api/switches', '/api/dashboard_stats')
+
+
+def seed(db, switches, logs):
+    for i in range(switches):
+        db.add_switch(f"SW-{i + 1:04d}", f"10.{i // 250}.{i % 250}.1", 22, 'admin', 'admin')
+    start = datetime.datetime.now() - datetime.timedelta(days=30)
+    rows = []
+    for i in range(logs):
+        ts = (start + datetime.timedelta(seconds=i * 30)).strftime('%Y-%m-%d %H:%M:%S')
+        rows.append((ts, 'admin', '127.0.0.1', f"10.0.{i % 250}.1", ('端口绑定', '解除绑定', '保存配置')[i % 3], '-', '成功'))
+        if len(rows) == 5000:
+            db.write_audit_batch(rows)
+            rows = []
+    if rows:
+        db.write_audit_batch(rows)
+
+
+def connect_per_call(db):
+    """旧版行为：每次调用都新开一条连接，用完即丢"""
+    def get_db():
+        conn = sqlite3.connect(db.DB_NAME)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return get_db
+
+
+def measure(client, path, requests):
+    client.get(path)   # 预热
+    started = time.perf_counter()
+    for _ in range(requests):
+        resp = client.get(path)
+        assert resp.status_code == 200, resp.status_code
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/switches 与 /api/dashboard_stats 每秒请求数")
+    parser.add_argument('--requests', type=int, default=1000, help="每个接口顺序请求的次数")
+    parser.add_argument('--switches', type=int, default=200, help="资产表中的设备数")
+    parser.add_argument('--logs', type=int, default=20000, help="审计日志条数")
+    args = parser.parse_args()
+
+    # 先切到临时目录再导入 app：数据库、备份目录、审计暂存文件都落在这里
+    os.chdir(tempfile.mkdtemp(prefix='h3c_db_bench_'))
+    import app as app_module
+    import database as db
+    app_module.scheduler.shutdown(wait=False)
+    seed(db, args.switches, args.logs)
+
+    client = app_module.app.test_client()
+    client.post('/login', data={'username': ADMIN_USER, 'password': ADMIN_PASS})
+    persistent = db.get_db
+    results = {}
+    for label, get_db in (('每次重新连接', connect_per_call(db)), ('线程长连接 + WAL', persistent)):
+        db.get_db = get_db
+        results[label] = {path: measure(client, path, args.requests) for path in PATHS}
+    db.get_db = persistent
+
+    print(f"\n设备 {args.switches} 台，审计日志 {args.logs} 条，每个接口顺序请求 {args.requests} 次")
+    for path in PATHS:
+        before, after = results['每次重新连接'][path], results['线程长连接 + WAL'][path]
+        print(f"{path:<24} {before:8.0f} -> {after:8.0f} req/s  ({after / before:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""保护端口校验基准：比较 "先 get_port_info 读描述、再单独下发" 的旧流程与 "同一会话内校验并下发" 的新流程，
+对一台模拟交换机各绑定若干次，统计单次绑定的耗时、登录次数与设备上执行的命令数
+
+用法：
+    python tools/bench_guarded_bind.py                     # 连接池关闭 / 开启各跑一遍
+    python tools/bench_guarded_bind.py --binds 5 --login-delay 3
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_comware import FakeComwareSwitch
+from ssh_pool import POOL
+from switch_driver import H3CManager, ProtectedPortError
+
+# 与 app.py 中的默认保护关键词一致
+PROTECTED_KEYWORDS = ['Uplink', 'Trunk', 'Core', 'Connect', 'To', 'hexin', 'huiju', 'link']
+
+
+def legacy_bind(mgr, iface, ip, mac):
+    """旧流程：get_port_info 只为读端口描述 (含整张绑定表)，校验通过后再开一次会话下发"""
+    info, _ = mgr.get_port_info(iface, use_cache=False)
+    for kw in PROTECTED_KEYWORDS:
+        if kw.lower() in info['description'].lower():
+            raise ProtectedPortError(kw)
+    return mgr.configure_port_binding(iface, '10', ip, mac)
+
+
+def guarded_bind(mgr, iface, ip, mac):
+    """新流程：同一会话内只读 description 一行，校验通过直接下发"""
+    return mgr.configure_port_binding(iface, '10', ip, mac, protected_keywords=PROTECTED_KEYWORDS)
+
+
+def run(sw, bind, binds):
+    mgr = H3CManager(sw.host, sw.username, sw.password, port=sw.port)
+    interfaces = [name for name, iface in sw.state.interfaces.items() if iface['type'] == 'A']
+    logins, commands = sw.logins, sw.commands
+    timings = []
+    for i in range(binds):
+        started = time.perf_counter()
+        bind(mgr, interfaces[i % len(interfaces)], f"10.98.0.{i + 1}", f"00e0-fd00-{i + 1:04x}")
+        timings.append(time.perf_counter() - started)
+    return sum(timings) / len(timings), (sw.logins - logins) / binds, (sw.commands - commands) / binds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="保护端口校验：旧的两次会话流程 vs 同会话校验")
+    parser.add_argument('--binds', type=int, default=3, help="每种流程绑定的次数")
+    parser.add_argument('--login-delay', type=float, default=1.0, help="模拟登录握手的额外延时 (秒)")
+    parser.add_argument('--latency', type=float, default=0.0, help="每条命令的模拟处理延时 (秒)")
+    args = parser.parse_args()
+
+    sw = FakeComwareSwitch(0, hostname='BENCH-GUARD', latency=args.latency, login_delay=args.login_delay).start()
+    default_idle = POOL.idle_timeout
+    try:
+        for enabled in (False, True):
+            POOL.close_all()
+            POOL.idle_timeout = default_idle if enabled else 0
+            print(f"\n=== {'连接池开启' if enabled else '连接池关闭'} ===")
+            for label, bind in (('旧流程 (get_port_info + 下发)', legacy_bind), ('同会话校验', guarded_bind)):
+                avg, logins, commands = run(sw, bind, args.binds)
+                print(f"{label:<24} 单次绑定 {avg:6.2f}s  登录 {logins:.1f} 次  设备命令 {commands:.1f} 条")
+    finally:
+        POOL.close_all()
+        sw.stop()
+
+
+if __name__ == '__main__':
+    main()
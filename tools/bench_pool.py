@@ -0,0 +1,79 @@
+"""连接池基准：对一台模拟交换机重复执行页面上最常见的一组操作 "端口列表 → 端口详情 → 端口绑定"，
+比较 SSH 连接池开启 / 关闭时每一步的耗时与登录次数
+
+用法：
+    python tools/bench_pool.py                               # 默认每次登录额外 1 秒握手延时，跑 3 轮
+    python tools/bench_pool.py --rounds 5 --login-delay 3     # 模拟现网 3~6 秒的握手 + 提示符探测
+
+读操作一律绕过设备缓存 (use_cache=False)，只比较会话复用本身带来的差异。
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_comware import FakeComwareSwitch
+from load_test import percentile
+from ssh_pool import POOL
+from switch_driver import H3CManager
+
+STEPS = ('端口列表', '端口详情', '端口绑定')
+
+
+def run_sequence(sw, rounds):
+    mgr = H3CManager(sw.host, sw.username, sw.password, port=sw.port)
+    interfaces = [name for name, iface in sw.state.interfaces.items() if iface['type'] == 'A']
+    timings = {step: [] for step in STEPS}
+    logins_before = sw.logins
+    for i in range(rounds):
+        iface = interfaces[i % len(interfaces)]
+        for step, call in zip(STEPS, (
+                lambda: mgr.get_interface_list(use_cache=False),
+                lambda: mgr.get_port_info(iface, use_cache=False),
+                lambda: mgr.configure_port_binding(iface, '10', f"10.99.0.{i + 1}", f"00e0-fc00-{i + 1:04x}"))):
+            started = time.perf_counter()
+            call()
+            timings[step].append(time.perf_counter() - started)
+    return timings, sw.logins - logins_before
+
+
+def report(label, timings, logins, rounds):
+    total = [sum(t) for t in zip(*timings.values())]
+    print(f"\n=== {label} ===")
+    for step, values in timings.items():
+        print(f"{step:<8} 平均 {sum(values) / len(values):7.2f}s  p50 {percentile(values, 0.5):7.2f}s")
+    print(f"整组操作 平均 {sum(total) / len(total):7.2f}s  登录 {logins} 次 / {rounds} 轮")
+    return sum(total) / len(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSH 连接池开启 / 关闭对比")
+    parser.add_argument('--rounds', type=int, default=3, help="整组操作重复次数")
+    parser.add_argument('--login-delay', type=float, default=1.0, help="模拟登录握手的额外延时 (秒)")
+    parser.add_argument('--latency', type=float, default=0.0, help="每条命令的模拟处理延时 (秒)")
+    args = parser.parse_args()
+
+    sw = FakeComwareSwitch(0, hostname='BENCH-POOL', latency=args.latency, login_delay=args.login_delay).start()
+    default_idle = POOL.idle_timeout
+    results = {}
+    try:
+        for enabled in (False, True):
+            # 关闭连接池 = 空闲超时设为 0：每次借出时旧会话都已过期，只能重新登录 (与 load_test.py 一致)
+            POOL.close_all()
+            POOL.idle_timeout = default_idle if enabled else 0
+            label = '连接池开启' if enabled else '连接池关闭'
+            timings, logins = run_sequence(sw, args.rounds)
+            results[label] = report(label, timings, logins, args.rounds)
+    finally:
+        POOL.close_all()
+        sw.stop()
+    before, after = results['连接池关闭'], results['连接池开启']
+    print(f"\n整组操作耗时: {before:.2f}s -> {after:.2f}s (减少 {(1 - after / before) * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
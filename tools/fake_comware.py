@@ -0,0 +1,506 @@
+"""H3C Comware 交换机 SSH 模拟器：用于离线压测 H3CManager / Flask 路由 / 备份任务
+
+用法：
+    python tools/fake_comware.py --count 5 --base-port 10022 --ports 48 --latency 0.05
+
+每台模拟设备的登录账号为 admin / admin (可通过参数修改)。
+"""
+import argparse
+import random
+import re
+import socket
+import threading
+import time
+import paramiko
+
+# 长名 -> 短名 (与 display interface brief / display ip source binding 的显示一致)
+_LONG_TO_SHORT = [
+    ('Ten-GigabitEthernet', 'XGE'),
+    ('M-GigabitEthernet', 'MGE'),
+    ('GigabitEthernet', 'GE'),
+    ('Bridge-Aggregation', 'BAGG'),
+]
+
+
+def _short(name):
+    for long_name, short_name in _LONG_TO_SHORT:
+        if name.startswith(long_name):
+            return short_name + name[len(long_name):]
+    return name
+
+
+def _long(name):
+    for long_name, short_name in _LONG_TO_SHORT:
+        if name.startswith(long_name):
+            return name
+    for long_name, short_name in sorted(_LONG_TO_SHORT, key=lambda x: -len(x[1])):
+        if name.upper().startswith(short_name):
+            return long_name + name[len(short_name):]
+    return name
+
+
+def _mac(i):
+    raw = f"{0x00e04c000000 + i:012x}"
+    return f"{raw[0:4]}-{raw[4:8]}-{raw[8:12]}"
+
+
+class FakeSwitchState:
+    """单台模拟设备的配置状态"""
+
+    def __init__(self, hostname, port_count=48, uplinks=4, bindings_per_port=1, acl_rules=10, seed=0):
+        rnd = random.Random(seed)
+        self.hostname = hostname
+        self.lock = threading.Lock()
+        self.interfaces = {}   # long name -> dict
+        n = 0
+        for i in range(1, port_count + 1):
+            name = f"GigabitEthernet1/0/{i}"
+            iface = {'link': 'UP' if rnd.random() > 0.3 else 'DOWN', 'type': 'A', 'desc': f"PC-{i:03d}",
+                     'vlan': str(10 + i % 4), 'verify': True, 'bindings': []}
+            for _ in range(bindings_per_port):
+                n += 1
+                iface['bindings'].append({'ip': f"10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}", 'mac': _mac(n), 'vlan': None})
+            self.interfaces[name] = iface
+        for i in range(1, uplinks + 1):
+            name = f"Ten-GigabitEthernet1/0/{port_count + i}"
+            self.interfaces[name] = {'link': 'UP', 'type': 'T', 'desc': f"Uplink_to_Core_{i}",
+                                     'vlan': '1', 'verify': False, 'bindings': []}
+        self.interfaces['Bridge-Aggregation1'] = {'link': 'UP', 'type': 'T', 'desc': 'To_Core_BAGG',
+                                                 'vlan': '1', 'verify': False, 'bindings': []}
+        self.acls = {4000: {i * 5: _mac(100000 + i) for i in range(acl_rules)}}
+        self.arp_detection_vlans = set()
+        self.saved_revision = 0
+        self.revision = 0
+        self.saved_at = time.strftime('%b %d %Y %H:%M:%S')
+
+    # --- 渲染 display 输出 ---
+    def render_version(self):
+        return (f"H3C Comware Software, Version 7.1.070, Release 6328P03\r\n"
+                f"Copyright (c) 2004-2020 New H3C Technologies Co., Ltd. All rights reserved.\r\n"
+                f"H3C S5130S-52S-EI uptime is 0 weeks, 3 days, 2 hours, 11 minutes\r\n"
+                f"Last reboot reason : User reboot\r\n")
+
+    def render_brief(self):
+        lines = ["Brief information on interfaces in bridge mode:",
+                 "Link: ADM - administratively down; Stby - standby",
+                 "Speed: (a) - auto",
+                 "Duplex: (a)/A - auto; H - half; F - full",
+                 "Type: A - access; T - trunk; H - hybrid",
+                 "Interface            Link Speed   Duplex Type PVID Description"]
+        for name, iface in self.interfaces.items():
+            desc = iface['desc'][:24]
+            lines.append(f"{_short(name):<20} {iface['link']:<4} {'1G(a)':<7} {'F(a)':<6} {iface['type']:<4} {iface['vlan']:<4} {desc}")
+        return "\r\n".join(lines)
+
+    def render_iface(self, name):
+        iface = self.interfaces[name]
+        lines = [f"interface {name}", " port link-mode bridge"]
+        if iface['desc']:
+            lines.append(f" description {iface['desc']}")
+        if iface['type'] == 'A':
+            lines.append(f" port access vlan {iface['vlan']}")
+            lines.append(" stp edged-port")
+        else:
+            lines.append(" port link-type trunk")
+            lines.append(f" port trunk permit vlan all")
+        if iface['verify']:
+            lines.append(" ip verify source ip-address mac-address")
+        for b in iface['bindings']:
+            line = f" ip source binding ip-address {b['ip']} mac-address {b['mac']}"
+            if b['vlan']:
+                line += f" vlan {b['vlan']}"
+            lines.append(line)
+        return "\r\n".join(lines)
+
+    def render_iface_config(self, only=None):
+        names = [only] if only else list(self.interfaces)
+        blocks = ["#\r\n" + self.render_iface(n) for n in names]
+        return "\r\n".join(blocks) + "\r\n#\r\nreturn"
+
+    def render_full_config(self):
+        parts = ["#", " version 7.1.070, Release 6328P03", "#", f" sysname {self.hostname}", "#",
+                 " clock timezone Beijing add 08:00:00", "#", " lldp global enable", "#"]
+        vlans = sorted({int(i['vlan']) for i in self.interfaces.values()} | set(self.arp_detection_vlans))
+        for v in vlans:
+            parts.append(f"vlan {v}")
+            if v in self.arp_detection_vlans:
+                parts.append(" arp detection enable")
+            parts.append("#")
+        for n in self.interfaces:
+            parts.append(self.render_iface(n).replace("\r\n", "\n"))
+            parts.append("#")
+        for acl, rules in self.acls.items():
+            parts.append(f"acl mac {acl}")
+            for rid, mac in sorted(rules.items()):
+                parts.append(f" rule {rid} permit source-mac {mac} ffff-ffff-ffff")
+            parts.append("#")
+        parts.append("return")
+        return "\r\n".join(p.replace("\n", "\r\n") for p in parts)
+
+    def render_source_binding(self):
+        rows = []
+        for name, iface in self.interfaces.items():
+            for b in iface['bindings']:
+                rows.append(f" {b['ip']:<15} {b['mac']:<14} {_short(name):<24} {b['vlan'] or 'N/A':<4} Static")
+        head = [f"Total entries found: {len(rows)}", " IP Address      MAC Address    Interface                VLAN Type"]
+        return "\r\n".join(head + rows)
+
+    def render_mac_table(self):
+        lines = ["MAC Address      VLAN ID    State            Port/NickName            Aging"]
+        for name, iface in self.interfaces.items():
+            for b in iface['bindings']:
+                if iface['link'] == 'UP':
+                    lines.append(f"{b['mac']:<16} {iface['vlan']:<10} {'Learned':<16} {_short(name):<24} Y")
+        return "\r\n".join(lines)
+
+    def render_acl(self, number):
+        rules = self.acls.get(number)
+        if rules is None:
+            return f"ACL {number} does not exist."
+        lines = [f"MAC ACL {number}, {len(rules)} rules,", "ACL's step is 5"]
+        for rid, mac in sorted(rules.items()):
+            lines.append(f" rule {rid} permit source-mac {mac} ffff-ffff-ffff")
+        return "\r\n".join(lines)
+
+
+class _SSHServer(paramiko.ServerInterface):
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.shell_requested = threading.Event()
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_auth_password(self, username, password):
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_requested.set()
+        return True
+
+
+class FakeComwareSwitch:
+    """一台监听本地端口的模拟 H3C 交换机"""
+
+    def __init__(self, port, hostname=None, username='admin', password='admin', port_count=48,
+                 latency=0.0, login_delay=0.0, bindings_per_port=1, acl_rules=10, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.login_delay = login_delay
+        self.state = FakeSwitchState(hostname or f"SIM-{port}", port_count=port_count,
+                                     bindings_per_port=bindings_per_port, acl_rules=acl_rules, seed=port)
+        self.host_key = _HOST_KEY
+        self.commands = 0
+        self.logins = 0
+        self._sock = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self.port = self._sock.getsockname()[1]
+        self._sock.listen(100)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle_client, args=(client,), daemon=True).start()
+
+    def _handle_client(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        server = _SSHServer(self.username, self.password)
+        try:
+            transport.start_server(server=server)
+            chan = transport.accept(30)
+            if chan is None or not server.shell_requested.wait(10):
+                return
+            if self.login_delay:
+                time.sleep(self.login_delay)
+            self.logins += 1
+            _Session(self, chan).run()
+        except Exception:
+            pass
+        finally:
+            transport.close()
+
+
+class _Session:
+    """一个 SSH 交互会话：维护视图栈并解释命令"""
+
+    def __init__(self, switch, chan):
+        self.switch = switch
+        self.state = switch.state
+        self.chan = chan
+        self.views = []          # [] = 用户视图；['system'] = 系统视图；再往后是子视图
+        self.paging = True
+        self.current = None      # 当前子视图对象 (接口名 / vlan / acl)
+
+    def prompt(self):
+        name = self.state.hostname
+        if not self.views:
+            return f"<{name}>"
+        if len(self.views) == 1:
+            return f"[{name}]"
+        return f"[{name}-{self.views[-1]}]"
+
+    def send(self, text):
+        self.chan.sendall(text.encode('utf-8'))
+
+    def run(self):
+        self.send("\r\n******************************************************************************\r\n"
+                  "* Copyright (c) 2004-2020 New H3C Technologies Co., Ltd. All rights reserved.*\r\n"
+                  "******************************************************************************\r\n\r\n")
+        self.send(self.prompt())
+        buf = ""
+        while True:
+            data = self.chan.recv(4096)
+            if not data:
+                return
+            buf += data.decode('utf-8', errors='ignore')
+            while True:
+                idx = min([i for i in (buf.find("\r"), buf.find("\n")) if i >= 0], default=-1)
+                if idx < 0:
+                    break
+                line, buf = buf[:idx], buf[idx + 1:]
+                if buf.startswith("\n") and idx >= 0:
+                    buf = buf[1:]
+                self.send(line + "\r\n")
+                if not self.handle(line.strip()):
+                    return
+                self.send(self.prompt())
+
+    def output(self, text):
+        if self.switch.latency:
+            time.sleep(self.switch.latency)
+        if not text:
+            return
+        lines = text.split("\r\n")
+        if self.paging and len(lines) > 24:
+            for i in range(0, len(lines), 24):
+                self.send("\r\n".join(lines[i:i + 24]) + "\r\n")
+                if i + 24 < len(lines):
+                    self.send("  ---- More ----")
+                    key = self.chan.recv(16)
+                    if not key or key[:1] in (b'q', b'Q'):
+                        self.send("\r\n")
+                        return
+                    self.send("\r\u001b[16D                \u001b[16D")
+        else:
+            self.send(text + "\r\n")
+
+    def handle(self, line):
+        self.switch.commands += 1
+        if not line:
+            return True
+        st = self.state
+        words = line.split()
+        cmd = words[0].lower()
+        with st.lock:
+            if line == 'screen-length disable':
+                self.paging = False
+                return True
+            if cmd == 'display' or cmd == 'dis':
+                self.output(self.display(words[1:]))
+                return True
+            if cmd == 'dir':
+                self.output(self.display(words))
+                return True
+            if line == 'save force' or line.startswith('save'):
+                st.saved_revision = st.revision
+                st.saved_at = time.strftime('%b %d %Y %H:%M:%S')
+                self.output("Validating file. Please wait...\r\n"
+                            "Saved the current configuration to mainboard device successfully.")
+                return True
+            if line == 'system-view':
+                self.views = ['system']
+                self.output("System View: return to User View with Ctrl+Z.")
+                return True
+            if line == 'return':
+                self.views = []
+                return True
+            if line == 'quit':
+                if not self.views:
+                    return False
+                self.views.pop()
+                return True
+            if not self.views:
+                self.output(" % Unrecognized command found at '^' position.")
+                return True
+            return self.configure(words)
+
+    def display(self, args):
+        text = " ".join(args)
+        if ' | ' in text:
+            text, _, flt = text.partition(' | ')
+            out = self.display(text.split())
+            words = flt.split(None, 1)
+            if len(words) == 2 and words[0] in ('include', 'inc'):
+                return "\r\n".join(l for l in out.split("\r\n") if re.search(words[1], l))
+            if len(words) == 2 and words[0] in ('exclude', 'exc'):
+                return "\r\n".join(l for l in out.split("\r\n") if not re.search(words[1], l))
+            return out
+        st = self.state
+        if text.startswith('version'):
+            return st.render_version()
+        if text.startswith('interface brief'):
+            return st.render_brief()
+        if text == 'current-configuration':
+            return st.render_full_config()
+        if text == 'current-configuration diff':
+            return "" if st.saved_revision == st.revision else "+ (running configuration differs from startup)"
+        if text.startswith('current-configuration interface'):
+            rest = args[2:]
+            if not rest:
+                return st.render_iface_config()
+            name = _long(rest[0])
+            if name not in st.interfaces:
+                return " % Wrong parameter found at '^' position."
+            return st.render_iface_config(name)
+        if text.startswith('ip source binding'):
+            return st.render_source_binding()
+        if text.startswith('mac-address'):
+            return st.render_mac_table()
+        if text.startswith('acl'):
+            num = args[-1]
+            return st.render_acl(int(num)) if num.isdigit() else " % Incomplete command found at '^' position."
+        if text == 'startup':
+            return ("MainBoard:\r\n Current startup saved-configuration file: flash:/startup.cfg\r\n"
+                    " Next startup saved-configuration file: flash:/startup.cfg")
+        if text.startswith('dir'):
+            return ("Directory of flash: \r\n"
+                    f"   1 -rw-       {8000 + st.saved_revision:>6} {st.saved_at}   startup.cfg\r\n\r\n"
+                    "1048576 KB total (524288 KB free)")
+        return " % Unrecognized command found at '^' position."
+
+    def configure(self, words):
+        st = self.state
+        line = " ".join(words)
+        head = words[0].lower()
+        st.revision += 1
+        if head == 'interface' and len(words) >= 2:
+            name = _long(words[1])
+            if name not in st.interfaces:
+                self.output(" % Wrong parameter found at '^' position.")
+                return True
+            self.views = ['system', name]
+            self.current = name
+            return True
+        if head == 'vlan' and len(words) == 2:
+            self.views = ['system', f"vlan{words[1]}"]
+            self.current = int(words[1])
+            return True
+        if head == 'acl' and len(words) >= 3:
+            num = int(words[-1])
+            st.acls.setdefault(num, {})
+            self.views = ['system', f"acl-mac-{num}"]
+            self.current = num
+            return True
+        view = self.views[-1]
+        if view.startswith('vlan') and line == 'arp detection enable':
+            st.arp_detection_vlans.add(self.current)
+            return True
+        if view.startswith('acl-mac-'):
+            rules = st.acls[self.current]
+            if head == 'rule':
+                if words[1].isdigit():
+                    rid = int(words[1])
+                else:
+                    rid = (max(rules) // 5 + 1) * 5 if rules else 0
+                mac = words[words.index('source-mac' if 'source-mac' in words else 'source') + 1]
+                rules[rid] = mac
+                return True
+            if head == 'undo' and len(words) == 3 and words[1] == 'rule':
+                if rules.pop(int(words[2]), None) is None:
+                    self.output(" The rule does not exist.")
+                return True
+        if len(self.views) == 2 and self.current in st.interfaces:
+            iface = st.interfaces[self.current]
+            if head == 'description':
+                iface['desc'] = line.split(' ', 1)[1]
+                return True
+            if line.startswith('port access vlan'):
+                iface['vlan'] = words[3]
+                return True
+            if line.startswith('ip verify source'):
+                iface['verify'] = True
+                return True
+            if line.startswith('ip source binding') or line.startswith('undo ip source binding'):
+                undo = head == 'undo'
+                w = words[1:] if undo else words
+                ip = w[w.index('ip-address') + 1]
+                mac = w[w.index('mac-address') + 1]
+                vlan = w[w.index('vlan') + 1] if 'vlan' in w else None
+                if undo:
+                    iface['bindings'] = [b for b in iface['bindings'] if not (b['ip'] == ip and b['mac'] == mac)]
+                else:
+                    iface['bindings'].append({'ip': ip, 'mac': mac, 'vlan': vlan})
+                return True
+            if line.startswith('stp') or line.startswith('port'):
+                return True
+        self.output(" % Unrecognized command found at '^' position.")
+        return True
+
+
+_HOST_KEY = paramiko.RSAKey.generate(2048)
+
+
+def start_fleet(count, base_port=0, **kwargs):
+    """启动 count 台模拟交换机；base_port=0 时由系统分配随机端口"""
+    switches = []
+    for i in range(count):
+        port = base_port + i if base_port else 0
+        switches.append(FakeComwareSwitch(port, hostname=f"SIM-{i + 1:04d}", **kwargs).start())
+    return switches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="H3C Comware SSH 模拟器")
+    parser.add_argument('--count', type=int, default=1, help="模拟设备数量")
+    parser.add_argument('--base-port', type=int, default=10022, help="起始监听端口")
+    parser.add_argument('--ports', type=int, default=48, help="每台设备的接入端口数")
+    parser.add_argument('--latency', type=float, default=0.0, help="每条命令的模拟处理延时 (秒)")
+    parser.add_argument('--login-delay', type=float, default=0.0, help="登录握手的额外延时 (秒)")
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    args = parser.parse_args()
+
+    switches = start_fleet(args.count, args.base_port, port_count=args.ports, latency=args.latency,
+                           login_delay=args.login_delay, username=args.username, password=args.password)
+    for sw in switches:
+        print(f"🟢 {sw.state.hostname} 监听于 {sw.host}:{sw.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for sw in switches:
+            sw.stop()
+
+
+if __name__ == '__main__':
+    main()
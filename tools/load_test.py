@@ -0,0 +1,256 @@
+"""端到端压测：启动 N 台模拟交换机，经 Flask 路由并发压测读接口与全网备份任务，输出吞吐与 p50 / p99 延时
+
+用法：
+    python tools/load_test.py --switches 10 --users 20 --requests 30
+    python tools/load_test.py --switches 20 --scenario backup
+    python tools/load_test.py --switches 5 --compare-pool      # 同一组请求在连接池开启 / 关闭时各跑一遍
+    python tools/load_test.py --switches 200 --scenario backup --compare-backend   # 异步驱动 / 线程池 对比
+    python tools/load_test.py --switches 200 --scenario backup --compare-backend --audit-load 2000   # 同时后台持续写审计日志
+
+数据库、备份目录都建在临时目录里，不影响正式环境；模拟设备分别监听 127.0.0.1、127.0.0.2 ... (每台设备一个 IP)。
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_comware import FakeComwareSwitch
+
+ADMIN_USER, ADMIN_PASS = 'admin', 'admin888'
+
+
+def _loopback(i):
+    return f"127.0.{i // 250}.{i % 250 + 1}"
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class ThreadPeak:
+    """后台采样本进程的线程数峰值 (线程池驱动每台设备占一个线程，异步驱动只有一个事件循环线程)"""
+    def __init__(self, interval=0.05):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+class AuditLoad:
+    """后台线程每 interval 秒批量写一次审计日志 (每批 batch 条)，模拟全网任务进行中其它请求对 SQLite 的并发写入"""
+    def __init__(self, db, batch, interval=0.05):
+        self.db = db
+        self.interval = interval
+        self.rows = 0
+        self._batch = [(time.strftime('%Y-%m-%d %H:%M:%S'), 'load', '127.0.0.1', '10.0.0.1', '端口绑定', '-', '成功')] * batch
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.db.write_audit_batch(self._batch)
+            self.rows += len(self._batch)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.rows
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        # 先切到临时目录再导入 app：数据库、备份目录、审计暂存文件都落在这里
+        self.workdir = tempfile.mkdtemp(prefix='h3c_load_')
+        os.chdir(self.workdir)
+        import app as app_module
+        import database as db
+        from ssh_pool import POOL
+        from device_cache import DEVICE_CACHE, READ_FLIGHTS
+        from device_scheduler import SCHEDULER
+        import async_driver, backup_engine, locator_engine
+        self.app, self.db, self.pool, self.cache, self.scheduler = app_module.app, db, POOL, DEVICE_CACHE, SCHEDULER
+        self.flights = READ_FLIGHTS
+        self.backend_modules = (async_driver, backup_engine, locator_engine)
+        app_module.scheduler.shutdown(wait=False)   # 压测期间不跑定时任务
+
+        self.switches = []
+        for i in range(args.switches):
+            sw = FakeComwareSwitch(0, hostname=f"SIM-{i + 1:04d}", port_count=args.ports, latency=args.latency,
+                                   login_delay=args.login_delay, host=_loopback(i)).start()
+            db.add_switch(sw.state.hostname, sw.host, sw.port, 'admin', 'admin')
+            self.switches.append(sw)
+        self.default_pool_idle = POOL.idle_timeout
+
+    def client(self):
+        c = self.app.test_client()
+        c.post('/login', data={'username': ADMIN_USER, 'password': ADMIN_PASS})
+        return c
+
+    def set_pool(self, enabled):
+        # 关闭连接池 = 空闲超时设为 0：每次借出时旧会话都已过期，只能重新登录
+        self.pool.close_all()
+        self.pool.idle_timeout = self.default_pool_idle if enabled else 0
+
+    def set_backend(self, backend):
+        # 全网任务 (备份 / 采集) 使用的驱动：async = 单事件循环 + asyncssh，thread = 线程池 + netmiko
+        for module in self.backend_modules:
+            module.FLEET_BACKEND = backend
+
+    # === 📖 读接口：端口列表 / 端口详情 / ACL / 资产列表 随机混合 ===
+    def _pick_request(self, rnd):
+        sw = rnd.choice(self.switches)
+        body = {'ip': sw.host, 'port': sw.port, 'user': 'admin', 'pass': 'admin', 'refresh': self.args.no_cache}
+        kind = rnd.choices(['get_port_info', 'get_interfaces', 'get_acl', 'api_switches'], weights=[5, 2, 1, 2])[0]
+        if kind == 'get_port_info':
+            body['interface'] = rnd.choice(list(sw.state.interfaces))
+            return kind, 'POST', '/get_port_info', body
+        if kind == 'api_switches':
+            return kind, 'GET', '/api/switches', None
+        return kind, 'POST', '/' + kind, body
+
+    def run_reads(self):
+        args = self.args
+        timings, errors = {}, {}
+        lock = threading.Lock()
+
+        def user(seed):
+            rnd = random.Random(seed)
+            c = self.client()
+            for _ in range(args.requests):
+                kind, method, path, body = self._pick_request(rnd)
+                started = time.perf_counter()
+                resp = c.post(path, json=body) if method == 'POST' else c.get(path)
+                elapsed = (time.perf_counter() - started) * 1000
+                ok = resp.status_code == 200 and resp.get_json().get('status') != 'error'
+                with lock:
+                    timings.setdefault(kind, []).append(elapsed)
+                    if not ok:
+                        errors[kind] = errors.get(kind, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            list(pool.map(user, range(args.users)))
+        wall = time.perf_counter() - started
+        return timings, errors, wall
+
+    # === 🗄️ 全网备份任务：经 /batch_backup 提交，消费事件流直到结束 ===
+    def _resave_configs(self):
+        # 模拟设备上执行了一次 save：启动配置文件指纹变化，备份不会走“未变更跳过传输”的快速路径
+        for sw in self.switches:
+            with sw.state.lock:
+                sw.state.revision += 1
+                sw.state.saved_revision = sw.state.revision
+
+    def run_fleet_job(self, path):
+        if path == '/batch_backup' and not self.args.unchanged:
+            self._resave_configs()
+        c = self.client()
+        started = time.perf_counter()
+        job = c.post(path, json={}).get_json()
+        events = []
+        for line in c.get(f"/api/jobs/{job['job_id']}/stream").get_data(as_text=True).splitlines():
+            if line.startswith('data: '):
+                events.append(json.loads(line[6:]))
+        wall = time.perf_counter() - started
+        devices = [e for e in events if e.get('type') == 'device']
+        kind = 'backup_device' if path == '/batch_backup' else 'harvest_device'
+        timings = {kind: [e['duration'] * 1000 for e in devices]}
+        errors = {kind: sum(1 for e in devices if e['status'] != 'success')}
+        summary = next((e['summary'] for e in events if e.get('type') == 'end'), '')
+        return timings, errors, wall, summary
+
+    def report(self, title, timings, errors, wall):
+        total = sum(len(v) for v in timings.values())
+        print(f"\n📊 {title}: 共 {total} 次，耗时 {wall:.2f}s，吞吐 {total / wall:.1f} 次/s")
+        print(f"{'接口':<16}{'次数':>8}{'失败':>6}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+        for kind in sorted(timings):
+            values = timings[kind]
+            print(f"{kind:<16}{len(values):>8}{errors.get(kind, 0):>6}{percentile(values, 0.5):>10.1f}"
+                  f"{percentile(values, 0.99):>10.1f}{max(values):>10.1f}")
+        print(f"连接池: {self.pool.stats()}")
+        print(f"缓存: {self.cache.stats()}")
+        print(f"读取合并: {self.flights.stats()}")
+        print(f"会话调度: {self.scheduler.stats()}")
+
+    def run(self):
+        args = self.args
+        print(f"🧪 {len(self.switches)} 台模拟设备 (每台 {args.ports} 口，命令延时 {args.latency}s)，"
+              f"{args.users} 个并发用户，工作目录 {self.workdir}")
+        pool_modes = [True, False] if args.compare_pool else [not args.no_pool]
+        backends = ['async', 'thread'] if args.compare_backend else [args.backend]
+        for enabled in pool_modes:
+            self.set_pool(enabled)
+            label = '连接池开启' if enabled else '连接池关闭'
+            if args.scenario in ('read', 'all'):
+                timings, errors, wall = self.run_reads()
+                self.report(f"读接口 ({label})", timings, errors, wall)
+            for backend in backends:
+                self.set_backend(backend)
+                for scenario, path, title in (('backup', '/batch_backup', '全网备份'),
+                                              ('harvest', '/api/locate/harvest', '定位采集')):
+                    if args.scenario not in (scenario, 'all'):
+                        continue
+                    threads = ThreadPeak()
+                    audit = AuditLoad(self.db, args.audit_load) if args.audit_load else None
+                    timings, errors, wall, summary = self.run_fleet_job(path)
+                    self.report(f"{title} ({label}, {backend} 驱动)", timings, errors, wall)
+                    print(f"峰值线程数: {threads.stop()}，任务战报: {summary}")
+                    if audit:
+                        print(f"期间后台写入审计日志 {audit.stop()} 条")
+
+    def close(self):
+        self.pool.close_all()
+        for sw in self.switches:
+            sw.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟交换机 + Flask 路由端到端压测")
+    parser.add_argument('--switches', type=int, default=5, help="模拟设备数量")
+    parser.add_argument('--ports', type=int, default=48, help="每台设备的接入端口数")
+    parser.add_argument('--latency', type=float, default=0.0, help="每条命令的模拟处理延时 (秒)")
+    parser.add_argument('--login-delay', type=float, default=0.0, help="登录握手的额外延时 (秒)")
+    parser.add_argument('--users', type=int, default=10, help="并发用户数")
+    parser.add_argument('--requests', type=int, default=20, help="每个用户发出的请求数")
+    parser.add_argument('--scenario', choices=['read', 'backup', 'harvest', 'all'], default='all')
+    parser.add_argument('--no-cache', action='store_true', help="读接口一律带 refresh，绕过设备缓存")
+    parser.add_argument('--no-pool', action='store_true', help="关闭 SSH 连接池 (每次操作重新登录)")
+    parser.add_argument('--unchanged', action='store_true', help="备份前不改动设备配置 (测量未变更跳过传输的快速路径)")
+    parser.add_argument('--backend', choices=['async', 'thread'], default='async', help="全网任务使用的驱动")
+    parser.add_argument('--compare-backend', action='store_true', help="全网任务在异步驱动 / 线程池下各跑一遍")
+    parser.add_argument('--compare-pool', action='store_true', help="连接池开启 / 关闭各跑一遍")
+    parser.add_argument('--audit-load', type=int, default=0, help="全网任务期间后台每 50ms 写一批审计日志，每批条数 (0 表示不写)")
+    args = parser.parse_args()
+
+    test = LoadTest(args)
+    try:
+        test.run()
+    finally:
+        test.close()
+
+
+if __name__ == '__main__':
+    main()